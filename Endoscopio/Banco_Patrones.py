@@ -0,0 +1,155 @@
+import numpy as np
+from Contenedor_Matriz import EscritorContenedor, abrir_contenedor
+from Planos_Bits import hadamard_binary_patterns, embed_binary_patterns
+
+try:
+    # Solo para proyectar: crear y leer el banco no necesita pantalla
+    import pygame
+    PYGAME_DISPONIBLE = True
+except ImportError:
+    PYGAME_DISPONIBLE = False
+
+'''
+Banco de patrones del DMD en un solo archivo (.fcm, Contenedor_Matriz.py), en lugar de las
+carpetas de 4096 PNG por conjunto que leía Orquesta.py (save_hadamard_patterns_to_disk).
+
+Cada patrón se guarda a 1 bit por píxel (np.packbits sobre el ancho) y solo en la región
+escalada n·scale × n·scale: 128 KB por patrón de 64×64 a 16× en vez de un PNG por archivo.
+Solo se guarda H1; H2 = 1 - H1 dentro de la región es el complemento bit a bit de los mismos
+bytes (np.invert antes de desempaquetar). La cabecera guarda el índice 'columnas' (columna j de
+H de cada fila del banco), el escalado y los offsets de la región en el lienzo del DMD.
+
+Al proyectar, el banco se abre con np.memmap: cada cuadro es desempaquetar 128 KB ya en caché
+de páginas y copiarlos a una superficie con pygame.surfarray.blit_array, sin abrir archivos ni
+decodificar PNG en el bucle de proyección.
+
+Uso:
+    crear_banco(ruta, pattern_size, columnas, DMD_size)     # una vez, por lotes vectorizados
+    banco = BancoPatrones(ruta)
+    superficie = banco.superficie(banco.fila(j), conjunto)  # conjunto 0 = H1, 1 = H2
+    screen.blit(superficie, banco.posicion((320, 0)))
+'''
+
+
+def crear_banco(ruta, pattern_size, columnas=None, DMD_size=(1280, 1024), bloque=64):
+    '''
+    Genera el banco de patrones H1 de las columnas indicadas (por defecto todas, en orden natural).
+
+    Parámetros:
+    - ruta: archivo .fcm de salida
+    - pattern_size: n (patrones n × n)
+    - columnas: índices de columna de H a guardar, en el orden de las filas del banco
+    - DMD_size: (ancho, alto) del lienzo del DMD
+    - bloque: patrones generados y empaquetados por lote
+
+    Retorna:
+    - cabecera del banco (dict)
+    '''
+    columnas = np.arange(pattern_size ** 2) if columnas is None else np.asarray(columnas, dtype=np.int64)
+    ancho, alto = DMD_size
+    scale = int(min(DMD_size) // pattern_size)
+    lado = pattern_size * scale
+    if lado % 8:
+        raise ValueError(f"El lado de la región ({lado} píxeles) debe ser múltiplo de 8 para empaquetar filas enteras")
+    parametros = {
+        'etapa': 'Banco_Patrones',
+        'pattern_size': pattern_size,
+        'DMD_size': list(DMD_size),
+        'scale': scale,
+        'offset_x': (ancho - lado) // 2,
+        'offset_y': (alto - lado) // 2,
+        'columnas': columnas.tolist(),
+    }
+    with EscritorContenedor(ruta, (len(columnas), lado, lado // 8), np.uint8, chunk=bloque, parametros=parametros) as salida:
+        for inicio in range(0, len(columnas), bloque):
+            patrones = hadamard_binary_patterns(pattern_size, columnas[inicio:inicio + bloque])
+            region = embed_binary_patterns(patrones, (lado, lado))
+            salida.escribir(inicio, np.packbits(region, axis=-1))
+    return salida.cabecera
+
+
+class BancoPatrones:
+    '''
+    Banco de patrones abierto con np.memmap (ver el docstring del módulo).
+
+    Parámetros:
+    - ruta: archivo .fcm creado con crear_banco
+    '''
+
+    def __init__(self, ruta):
+        self.datos, self.cabecera = abrir_contenedor(ruta)
+        parametros = self.cabecera['parametros']
+        if parametros.get('etapa') != 'Banco_Patrones':
+            raise ValueError(f"{ruta} no es un banco de patrones (etapa '{parametros.get('etapa')}')")
+        self.pattern_size = parametros['pattern_size']
+        self.offset = (parametros['offset_x'], parametros['offset_y'])
+        self.lado = self.datos.shape[1]
+        self.columnas = np.asarray(parametros['columnas'])
+        self._filas = {int(j): k for k, j in enumerate(self.columnas)}
+        self._superficie = None
+
+    def __len__(self):
+        return len(self.columnas)
+
+    def fila(self, columna):
+        '''Fila del banco con el patrón de la columna j de H.'''
+        try:
+            return self._filas[int(columna)]
+        except KeyError:
+            raise KeyError(f"La columna {columna} no está en el banco") from None
+
+    def patron(self, fila, conjunto=0):
+        '''Patrón binario (lado, lado) uint8 0/1 de la fila indicada; conjunto 1 = H2 (complemento).'''
+        empaquetado = self.datos[fila]
+        if conjunto:
+            empaquetado = np.invert(empaquetado)
+        return np.unpackbits(empaquetado, axis=-1)
+
+    def posicion(self, origen=(0, 0)):
+        '''Esquina de la región en pantalla, para un lienzo del DMD colocado en `origen`.'''
+        return origen[0] + self.offset[0], origen[1] + self.offset[1]
+
+    def superficie(self, fila, conjunto=0):
+        '''
+        Superficie de pygame con el patrón (blanco = espejo encendido). Se reutiliza la misma superficie
+        y su buffer entre llamadas: hay que proyectarla antes de pedir el siguiente patrón.
+        Requiere pygame.display.set_mode previo.
+        '''
+        if not PYGAME_DISPONIBLE:
+            raise ImportError("BancoPatrones.superficie requiere pygame")
+        if self._superficie is None:
+            self._superficie = pygame.Surface((self.lado, self.lado)).convert()
+            self._blanco = self._superficie.map_rgb((255, 255, 255))
+            self._valores = np.empty((self.lado, self.lado), dtype=np.uint32)
+        # surfarray indexa (x, y): se traspone la vista, sin copia
+        np.multiply(self.patron(fila, conjunto).T, self._blanco, out=self._valores, dtype=np.uint32)
+        pygame.surfarray.blit_array(self._superficie, self._valores)
+        return self._superficie
+
+
+def proyectar_banco(ruta, fps=60, conjunto=0, origen=(320, 0)):
+    '''
+    Proyecta todos los patrones de un banco a `fps` cuadros por segundo (como
+    display_hadamard_patterns_from_disk de Matrix_Functions.py, sin leer PNG por cuadro).
+    '''
+    pygame.init()
+    screen = pygame.display.set_mode((1920, 1080), pygame.FULLSCREEN)
+    clock = pygame.time.Clock()
+    banco = BancoPatrones(ruta)
+    posicion = banco.posicion(origen)
+
+    running = True
+    index = 0
+    while running and index < len(banco):
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT or event.type == pygame.KEYDOWN:
+                running = False
+
+        screen.fill((0, 0, 0))
+        screen.blit(banco.superficie(index, conjunto), posicion)
+        pygame.display.flip()
+
+        clock.tick(fps)
+        index += 1
+
+    pygame.quit()
@@ -0,0 +1,102 @@
+import numpy as np
+import os
+import time
+from Mascara import cargar_indices
+from Operadores_Intensidad import IntensityMatrix, DifferenceMatrix, LazyIntensityMatrix
+from Planificador_Memoria import planificar_filas
+from SVD_Aleatoria import svd_aleatoria, energia_capturada
+
+'''
+Etapa offline: comprime la matriz de intensidad con una SVD aleatoria de rango k.
+
+La matriz M × 2N (o D, M × N) la genera una base de entrada de 64×64 y es muy redundante:
+Y ≈ US · V^T con US = U·Σ (M × k) y V (n × k). Con los factores en disco la reconstrucción es
+    Y @ c ≈ US @ (V^T @ c)          O(k·(M + n)) en lugar de O(M·n)
+y lee M × k float32 (k = 64 → 335 MB) en lugar de 10–20 GB de enteros
+(Modo_Matriz = 'bajo_rango' en Reconstruccion_Imagen_Sin_RVITM.py).
+
+Se guardan los k valores singulares ordenados: la reconstrucción puede usar cualquier rango
+r ≤ k (Rango_Reconstruccion) para cambiar fidelidad por latencia sin recalcular la SVD.
+'''
+
+print("=== COMPRESIÓN DE LA MATRIZ DE INTENSIDAD (SVD ALEATORIA) ===")
+inicio_tiempo = time.time()
+
+# Configurar paths
+base_path = '/home/manuel/temp_intensity'
+Path_Matriz_Final = os.path.join(base_path, 'Matriz_Intensidad.fcm')           # [Y_H1 | Y_H2] int16
+Path_Matriz_Diferencia = os.path.join(base_path, 'Matriz_Diferencia.fcm')      # D int16
+Path_Speckles_H1 = os.path.join(base_path, 'speckles_H1_vectorizados.fcm')
+Path_Speckles_H2 = os.path.join(base_path, 'speckles_H2_vectorizados.fcm')
+Path_US = os.path.join(base_path, 'svd_US.npy')
+Path_V = os.path.join(base_path, 'svd_V.npy')
+Path_S = os.path.join(base_path, 'svd_S.npy')
+
+# 'diferencia' (factoriza D, M × N) | 'completa' (factoriza Y, M × 2N) | 'perezosa' (Y al vuelo desde S_H1/S_H2)
+Modo_Matriz = 'diferencia'
+Rango_SVD = 128            # k guardado (US: M × k float32 = 5 MB por columna)
+Sobremuestreo = 16         # Columnas extra del subespacio aleatorio
+Iteraciones_Potencia = 2   # Pasadas Y^T Y Q (cada una lee la matriz completa)
+Memoria_GB = None          # Presupuesto de RAM para los chunks (None = según la RAM libre)
+
+# Constantes de las matrices (basadas en el procesamiento previo)
+Usar_Mascara = False  # True si los speckles se vectorizaron solo con píxeles activos
+M_esperado = len(cargar_indices(os.path.join(base_path, 'mascara_pixeles.npy'))) if Usar_Mascara else 1310720  # Filas
+N_esperado = 4096     # Patrones por conjunto
+
+if Modo_Matriz == 'diferencia':
+    Operador_Intensidad = DifferenceMatrix(Path_Matriz_Diferencia, shape=(M_esperado, N_esperado))
+elif Modo_Matriz == 'completa':
+    Operador_Intensidad = IntensityMatrix(Path_Matriz_Final, shape=(M_esperado, 2 * N_esperado))
+elif Modo_Matriz == 'perezosa':
+    Operador_Intensidad = LazyIntensityMatrix(Path_Speckles_H1, Path_Speckles_H2)
+else:
+    raise ValueError(f"Modo_Matriz debe ser 'diferencia', 'completa' o 'perezosa', se recibió '{Modo_Matriz}'")
+
+n_columnas = Operador_Intensidad.columnas_efectivas
+pasadas = Iteraciones_Potencia + 1
+print(f"Modo de matriz: {Modo_Matriz} ({Operador_Intensidad.M} × {n_columnas})")
+print(f"Rango k: {Rango_SVD} (+{Sobremuestreo} de sobremuestreo)")
+print(f"Pasadas por la matriz: {pasadas} ({pasadas * Operador_Intensidad.nbytes / (1024**3):.1f} GB leídos)")
+
+# Verificar espacio disponible en disco (US + B temporal)
+import shutil
+espacio_libre_gb = shutil.disk_usage(base_path).free / (1024**3)
+necesario_gb = M_esperado * (2 * Rango_SVD + Sobremuestreo) * 4 / (1024**3)
+print(f"\nVerificación de espacio:")
+print(f"- Espacio libre: {espacio_libre_gb:.2f} GB")
+print(f"- US + temporal B: {necesario_gb:.2f} GB")
+if espacio_libre_gb < necesario_gb * 1.1:  # 10% de margen
+    raise Exception(f"Espacio insuficiente. Necesario: {necesario_gb:.2f} GB, Disponible: {espacio_libre_gb:.2f} GB")
+
+# Tamaño de chunk según la RAM disponible: cada chunk se convierte a float32 (_filas_densas) y
+# se multiplica por Q (n × l); W, Q y sus copias son fijos
+l_columnas = min(n_columnas, Rango_SVD + Sobremuestreo)
+memoria_fila = dict(Operador_Intensidad.memoria_por_fila(densas=True))
+memoria_fila['filas @ Q y B_chunk (float32 + float64)'] = l_columnas * (4 + 8)
+chunk_filas = planificar_filas('Compresion_SVD', Operador_Intensidad.M, memoria_fila,
+                               {'Q, W y Q float32': n_columnas * l_columnas * (8 + 8 + 4)},
+                               multiplo=getattr(Operador_Intensidad.matrices[0], 'tesela', (1,))[0],
+                               memoria_gb=Memoria_GB)
+
+print("\nCalculando SVD aleatoria por chunks...")
+US, S, V, energia_total = svd_aleatoria(Operador_Intensidad, Rango_SVD, Path_US, sobremuestreo=Sobremuestreo,
+                                        iteraciones_potencia=Iteraciones_Potencia, chunk_filas=chunk_filas)
+np.save(Path_V, V)
+np.save(Path_S, S)
+
+# Energía capturada por rango: guía para elegir Rango_Reconstruccion
+energia = energia_capturada(S, energia_total)
+print(f"\nEnergía capturada ||Y_k||²/||Y||²:")
+for r in (8, 16, 32, 64, 128, 256, 512):
+    if r <= Rango_SVD:
+        print(f"- rango {r:4d}: {energia[r - 1] * 100:.3f}%  (US: {M_esperado * r * 4 / (1024**2):.0f} MB)")
+print(f"- σ_1 = {S[0]:.1f}, σ_k = {S[-1]:.1f} (σ_k/σ_1 = {S[-1] / S[0]:.2e})")
+
+tiempo_total = time.time() - inicio_tiempo
+print(f"\n=== COMPRESIÓN SVD COMPLETADA ===")
+print(f"US: {Path_US} ({os.path.getsize(Path_US) / (1024**2):.0f} MB)")
+print(f"V:  {Path_V} ({os.path.getsize(Path_V) / (1024**2):.1f} MB)")
+print(f"S:  {Path_S}")
+print(f"Tiempo total: {tiempo_total:.1f} segundos ({tiempo_total/60:.1f} minutos)")
+print(f"Reconstrucción: Modo_Matriz = 'bajo_rango' (Y @ c ≈ US @ (V^T @ c))")
@@ -0,0 +1,64 @@
+import numpy as np
+import cv2
+import os
+import time
+from Mascara import estimar_mascara
+
+'''
+Etapa previa a Vectorizacion_Speckles.py: construye la máscara de píxeles activos.
+
+Se leen hasta Num_Speckles_Mascara speckles de H1 tomados a paso fijo sobre toda la secuencia
+(uno de cada len(archivos_H1) // Num_Speckles_Mascara, no solo los primeros patrones), se calcula
+la desviación estándar por píxel y se conservan los píxeles con varianza significativa (más un
+borde de seguridad).
+Las etapas siguientes (vectorización, matriz de intensidad y diferencia,
+SVD y reconstrucción) usan Usar_Mascara = True para trabajar solo con esas filas.
+'''
+
+print("=== CONSTRUCCIÓN DE MÁSCARA DE PÍXELES ACTIVOS ===")
+inicio_tiempo = time.time()
+
+# Configurar paths
+file_H1 = '/media/manuel/Windows/Speckle_H1_1280x1024'  # Speckles de caracterización (H1)
+base_path = '/home/manuel/temp_intensity'
+Path_Mascara = os.path.join(base_path, 'mascara_pixeles.npy')
+
+Num_Speckles_Mascara = 300   # Speckles usados para estimar la varianza por píxel
+Fraccion_Umbral = 0.1        # Activo si std > Fraccion_Umbral · percentil 99.9 de std
+Dilatacion = 7               # Borde de seguridad (píxeles) alrededor de la región activa
+
+alto, ancho = 1024, 1280
+M = alto * ancho
+
+archivos_H1 = sorted([f for f in os.listdir(file_H1) if f.endswith('.png')])
+if len(archivos_H1) < 2:
+    raise FileNotFoundError(f"Se necesitan al menos 2 speckles en {file_H1}, hay {len(archivos_H1)}")
+# Muestra repartida sobre toda la secuencia (no solo los primeros patrones de baja secuencia)
+paso = max(1, len(archivos_H1) // Num_Speckles_Mascara)
+rutas = [os.path.join(file_H1, f) for f in archivos_H1[::paso][:Num_Speckles_Mascara]]
+print(f"Speckles usados: {len(rutas)} de {len(archivos_H1)}")
+
+mascara, desviacion = estimar_mascara(rutas, (alto, ancho), Fraccion_Umbral, Dilatacion)
+M_activos = int(mascara.sum())
+
+print(f"\nDesviación estándar por píxel: min={desviacion.min():.2f}, max={desviacion.max():.2f}, "
+      f"mediana={np.median(desviacion):.2f}")
+print(f"Píxeles activos: {M_activos:,} de {M:,} ({M_activos / M * 100:.1f}%)")
+filas, columnas = np.nonzero(mascara)
+if M_activos:
+    print(f"Caja envolvente: filas [{filas.min()}, {filas.max()}], columnas [{columnas.min()}, {columnas.max()}]")
+
+print(f"\nReducción por etapa (factor {M / max(M_activos, 1):.2f}x):")
+print(f"- Speckles H1/H2 (uint8, M × 4096): {M * 4096 / (1024**3):.2f} GB → {M_activos * 4096 / (1024**3):.2f} GB cada uno")
+print(f"- Matriz diferencia D (int16, M × 4096): {M * 4096 * 2 / (1024**3):.2f} GB → {M_activos * 4096 * 2 / (1024**3):.2f} GB")
+print(f"- Matriz final Y (int16, M × 8192): {M * 8192 * 2 / (1024**3):.2f} GB → {M_activos * 8192 * 2 / (1024**3):.2f} GB")
+
+os.makedirs(base_path, exist_ok=True)
+np.save(Path_Mascara, mascara)
+cv2.imwrite(os.path.join(base_path, 'mascara_pixeles.png'), mascara.astype(np.uint8) * 255)  # Inspección visual
+
+tiempo_total = time.time() - inicio_tiempo
+print(f"\n=== MÁSCARA COMPLETADA ===")
+print(f"Archivo: {Path_Mascara}")
+print(f"Tiempo total: {tiempo_total:.1f} segundos")
+print(f"Siguiente etapa: Vectorizacion_Speckles.py con Usar_Mascara = True")
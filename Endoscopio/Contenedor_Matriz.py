@@ -0,0 +1,359 @@
+import json
+import os
+import zlib
+import numpy as np
+
+'''
+Contenedor de matrices por chunks (.fcm) para los archivos grandes de la cadena.
+
+Los .dat planos obligaban a repetir shape=(1310720, 8192) y dtype=np.int16 en cada script (y
+Matrix_Checks.py llegaba a deducir las filas del tamaño del archivo). Un .fcm es autodescrito:
+
+    [MAGIA 8 B][longitud de cabecera uint64 LE][cabecera JSON, relleno con espacios][datos]
+
+- La cabecera guarda forma, dtype, orden ('C', 'F' o 'T'), tamaño de chunk o tesela, los parámetros de
+  creación (pattern_size, offsets del DMD, columna de I1, máscara, ...) y un crc32 por chunk.
+- Los datos empiezan en un múltiplo de ALINEACION (página): se abren con np.memmap sin copia,
+  igual que antes, y la lectura por chunks coincide con páginas completas.
+- Un chunk son `chunk` elementos consecutivos del eje mayor de almacenamiento (filas en orden
+  'C', columnas en orden 'F'): siempre un rango contiguo de bytes, verificable por separado.
+
+Disposición teselada (orden 'T'): la matriz se guarda en teselas de `tesela` = (filas, columnas),
+por ejemplo 4096 × 512, cada una contigua en orden C y recorridas por filas de teselas (las de
+borde se rellenan con ceros). Una banda de filas o de columnas se lee como teselas enteras:
+- Banda de filas: las filas de teselas son rangos contiguos (lectura secuencial).
+- Banda de columnas: un segmento contiguo de varias teselas por fila de teselas, en lugar de
+  un acceso por fila que toca todas las páginas del archivo (orden 'C' con [:, inicio:fin]).
+Así sirven las dos direcciones de acceso de la cadena: Vectorizacion_Speckles.py escribe bandas
+de columnas y las etapas siguientes leen bandas de filas. En orden 'T' cada tesela es un chunk
+con su crc32 y abrir_contenedor devuelve una MatrizTeselada (ver su docstring).
+
+Uso:
+    with EscritorContenedor(ruta, (M, 2 * N), np.int16, parametros={...}) as salida:
+        salida.escribir(inicio, bloque)      # o salida.datos[...] = ...
+    datos, cabecera = abrir_contenedor(ruta)
+    datos = abrir_matriz(ruta)               # .fcm, .npy o .dat (con shape y dtype)
+'''
+
+MAGIA = b'ENDOFCM\x01'
+ALINEACION = 4096
+EXTENSION = '.fcm'
+_CRC_PENDIENTE = 0xFFFFFFFF + 1  # Fuera del rango de crc32: chunk sin checksum calculado
+
+
+def _serializar_cabecera(cabecera, longitud=None):
+    '''Cabecera JSON rellena con espacios hasta `longitud` (o hasta alinear los datos).'''
+    texto = json.dumps(cabecera, separators=(',', ':')).encode('utf-8')
+    if longitud is None:
+        longitud = -(-(len(MAGIA) + 8 + len(texto)) // ALINEACION) * ALINEACION - len(MAGIA) - 8
+    if len(texto) > longitud:
+        raise ValueError(f"La cabecera ({len(texto)} B) no cabe en el espacio reservado ({longitud} B)")
+    return texto.ljust(longitud, b' ')
+
+
+def leer_cabecera(ruta):
+    '''Lee y valida la cabecera de un .fcm. Retorna el dict (incluye 'offset_datos').'''
+    with open(ruta, 'rb') as f:
+        if f.read(len(MAGIA)) != MAGIA:
+            raise ValueError(f"{ruta} no es un contenedor .fcm (firma incorrecta)")
+        longitud = int.from_bytes(f.read(8), 'little')
+        cabecera = json.loads(f.read(longitud).decode('utf-8'))
+    cabecera['offset_datos'] = len(MAGIA) + 8 + longitud
+    esperado = cabecera['offset_datos'] + int(np.prod(_forma_almacenada(cabecera))) * np.dtype(cabecera['dtype']).itemsize
+    tamaño = os.path.getsize(ruta)
+    if tamaño < esperado:
+        raise ValueError(f"{ruta} está truncado: {tamaño} B, la cabecera describe {esperado} B")
+    return cabecera
+
+
+def _rejilla(shape, tesela):
+    '''Número de teselas por eje (filas de teselas, columnas de teselas).'''
+    return -(-shape[0] // tesela[0]), -(-shape[1] // tesela[1])
+
+
+def _forma_almacenada(cabecera):
+    '''Forma del array en disco: la matriz, o (filas_T, columnas_T, filas_tesela, columnas_tesela) en orden 'T'.'''
+    if cabecera['orden'] == 'T':
+        return _rejilla(cabecera['shape'], cabecera['tesela']) + tuple(cabecera['tesela'])
+    return tuple(cabecera['shape'])
+
+
+def _num_chunks(cabecera):
+    if cabecera['orden'] == 'T':
+        filas_T, columnas_T = _rejilla(cabecera['shape'], cabecera['tesela'])
+        return filas_T * columnas_T
+    mayor = cabecera['shape'][0] if cabecera['orden'] == 'C' else cabecera['shape'][-1]
+    return max(1, -(-mayor // cabecera['chunk']))
+
+
+def _vista_chunk(datos, cabecera, k):
+    '''Vista (sin copia) del chunk k como bytes contiguos.'''
+    chunk = cabecera['chunk']
+    if cabecera['orden'] == 'T':
+        vista = datos.teselas.reshape((-1,) + tuple(cabecera['tesela']))[k]
+    elif cabecera['orden'] == 'C':
+        vista = datos[k * chunk:(k + 1) * chunk]
+    else:
+        vista = datos[..., k * chunk:(k + 1) * chunk]
+    return memoryview(vista.reshape(-1, order='A')).cast('B')
+
+
+class MatrizTeselada:
+    '''
+    Vista 2D de una matriz guardada por teselas (orden 'T'), sin copia: `teselas` es el memmap
+    4D (filas_T, columnas_T, filas_tesela, columnas_tesela).
+
+    Las lecturas reúnen teselas enteras en un array 2D contiguo:
+    - leer_filas(inicio, fin) / leer_columnas(inicio, fin) / leer_bloque(...), con `out` opcional
+    - indexación matriz[a:b], matriz[:, c:d], matriz[i, j] (devuelve copias, no vistas)
+    Las escrituras (escribir_bloque, matriz[...] = ...) siguen el mismo recorrido por teselas.
+
+    Expone shape, dtype, ndim, itemsize y nbytes como un array, de modo que LectorChunks y los
+    operadores de Operadores_Intensidad.py la aceptan en lugar de un memmap.
+    '''
+
+    ndim = 2
+
+    def __init__(self, teselas, shape):
+        self.teselas = teselas
+        self.shape = tuple(shape)
+        self.tesela = teselas.shape[2:]
+        self.dtype = teselas.dtype
+        self.itemsize = teselas.itemsize
+        self.nbytes = self.shape[0] * self.shape[1] * self.itemsize
+
+    def __len__(self):
+        return self.shape[0]
+
+    def _recorrer(self, f0, f1, c0, c1):
+        '''Intersecciones (tesela, región en la tesela, región en el bloque) del bloque [f0:f1, c0:c1].'''
+        ft, ct = self.tesela
+        for tf in range(f0 // ft, -(-f1 // ft)):
+            fa, fb = max(f0, tf * ft), min(f1, (tf + 1) * ft)
+            for tc in range(c0 // ct, -(-c1 // ct)):
+                ca, cb = max(c0, tc * ct), min(c1, (tc + 1) * ct)
+                yield ((tf, tc, slice(fa - tf * ft, fb - tf * ft), slice(ca - tc * ct, cb - tc * ct)),
+                       (slice(fa - f0, fb - f0), slice(ca - c0, cb - c0)))
+
+    def leer_bloque(self, f0, f1, c0, c1, out=None):
+        '''Copia [f0:f1, c0:c1] en `out` (o en un array nuevo) leyendo teselas enteras en orden de disco.'''
+        if out is None:
+            out = np.empty((f1 - f0, c1 - c0), dtype=self.dtype)
+        for origen, destino in self._recorrer(f0, f1, c0, c1):
+            np.copyto(out[destino], self.teselas[origen], casting='unsafe')
+        return out
+
+    def escribir_bloque(self, f0, c0, bloque):
+        '''Escribe `bloque` a partir de la posición (f0, c0).'''
+        bloque = np.asarray(bloque)
+        for destino, origen in self._recorrer(f0, f0 + bloque.shape[0], c0, c0 + bloque.shape[1]):
+            self.teselas[destino] = bloque[origen]
+
+    def leer_filas(self, inicio, fin, out=None):
+        return self.leer_bloque(inicio, fin, 0, self.shape[1], out)
+
+    def leer_columnas(self, inicio, fin, out=None):
+        return self.leer_bloque(0, self.shape[0], inicio, fin, out)
+
+    def rango_bytes_filas(self, inicio, fin):
+        '''Bytes [inicio, fin) de `teselas` que contienen las filas [inicio, fin) (para madvise).'''
+        bytes_banda = self.teselas.strides[0]
+        return inicio // self.tesela[0] * bytes_banda, -(-fin // self.tesela[0]) * bytes_banda
+
+    def _claves(self, clave):
+        '''Normaliza la indexación a dos slices con paso 1, más el paso y si cada eje es un entero.'''
+        if not isinstance(clave, tuple):
+            clave = (clave,)
+        if len(clave) > 2 or any(k is Ellipsis for k in clave):
+            raise IndexError(f"MatrizTeselada admite hasta dos índices (enteros o slices), se recibió {clave}")
+        clave = clave + (slice(None),) * (2 - len(clave))
+        rangos = []
+        for k, n in zip(clave, self.shape):
+            if isinstance(k, (int, np.integer)):
+                k = int(k) + n if k < 0 else int(k)
+                if not 0 <= k < n:
+                    raise IndexError(f"Índice {k} fuera de rango para un eje de tamaño {n}")
+                rangos.append((k, k + 1, 1, True))
+            elif isinstance(k, slice):
+                inicio, fin, paso = k.indices(n)
+                if paso < 0:
+                    raise IndexError("MatrizTeselada no admite pasos negativos")
+                rangos.append((inicio, max(inicio, fin), paso, False))
+            else:
+                raise IndexError(f"Índice no soportado en MatrizTeselada: {k!r}")
+        return rangos
+
+    def __getitem__(self, clave):
+        (f0, f1, pf, ef), (c0, c1, pc, ec) = self._claves(clave)
+        bloque = self.leer_bloque(f0, f1, c0, c1)[::pf, ::pc]
+        if ef or ec:
+            bloque = bloque[(0 if ef else slice(None), 0 if ec else slice(None))]
+        return bloque
+
+    def __setitem__(self, clave, valor):
+        (f0, f1, pf, _), (c0, c1, pc, _) = self._claves(clave)
+        if pf != 1 or pc != 1:
+            raise IndexError("MatrizTeselada solo admite escrituras con paso 1")
+        bloque = np.empty((f1 - f0, c1 - c0), dtype=self.dtype)
+        bloque[...] = valor
+        self.escribir_bloque(f0, c0, bloque)
+
+    def __array__(self, dtype=None, copy=None):
+        matriz = self.leer_bloque(0, self.shape[0], 0, self.shape[1])
+        return matriz if dtype is None else matriz.astype(dtype)
+
+    def flush(self):
+        self.teselas.flush()
+
+
+class EscritorContenedor:
+    '''
+    Crea un .fcm y expone `datos` (np.memmap escribible, o MatrizTeselada en orden 'T') para
+    rellenarlo por bloques.
+
+    Los chunks escritos con `escribir` en orden secuencial se resumen (crc32) al completarse,
+    mientras sus páginas siguen en caché; el resto se resume en `cerrar`, que además escribe la
+    cabecera definitiva. Hasta entonces el archivo no se considera válido.
+
+    Parámetros:
+    - shape, dtype: como en np.memmap
+    - orden: 'C', 'F' o 'T' (teselas)
+    - chunk: elementos del eje mayor por chunk (por defecto 16384 filas en 'C' o 256 columnas en 'F')
+    - tesela: (filas, columnas) de cada tesela en orden 'T' (por defecto 4096 × 512)
+    - parametros: dict JSON con los parámetros de creación de la etapa
+    '''
+
+    def __init__(self, ruta, shape, dtype, orden='C', chunk=None, parametros=None, tesela=(4096, 512)):
+        if orden not in ('C', 'F', 'T'):
+            raise ValueError(f"orden debe ser 'C', 'F' o 'T', se recibió '{orden}'")
+        if len(shape) != 2 and orden == 'T':
+            raise ValueError(f"El orden 'T' necesita una matriz 2D, se recibió {shape}")
+        self.ruta = ruta
+        self.shape = tuple(int(n) for n in shape)
+        self.dtype = np.dtype(dtype)
+        self.orden = orden
+        self.cabecera = {
+            'version': 1,
+            'shape': list(self.shape),
+            'dtype': self.dtype.str,
+            'orden': orden,
+            'chunk': None if orden == 'T' else int(chunk or (16384 if orden == 'C' else 256)),
+            'parametros': parametros or {},
+        }
+        if orden == 'T':
+            # Teselas no mayores que la matriz (sin relleno inútil en matrices estrechas)
+            self.cabecera['tesela'] = [min(int(t), n) for t, n in zip(tesela, self.shape)]
+        self.cabecera['checksums'] = [_CRC_PENDIENTE] * _num_chunks(self.cabecera)
+        # Se reserva el espacio con los checksums pendientes: la cabecera final nunca es más larga
+        texto = _serializar_cabecera(self.cabecera)
+        self._longitud = len(texto)
+        with open(ruta, 'wb') as f:
+            f.write(MAGIA + self._longitud.to_bytes(8, 'little') + texto)
+        self.cabecera['offset_datos'] = len(MAGIA) + 8 + self._longitud
+        self.datos = _mapear(ruta, self.cabecera, 'r+')
+        self._escrito = 0  # Extensión contigua escrita con `escribir` (eje mayor)
+
+    def _unidad(self):
+        '''Extensión del eje mayor que cubre un chunk completo (una fila de teselas en orden 'T').'''
+        return self.cabecera['tesela'][0] if self.orden == 'T' else self.cabecera['chunk']
+
+    def escribir(self, inicio, bloque):
+        '''Escribe `bloque` a partir de la posición `inicio` del eje mayor (filas en 'C' y 'T', columnas en 'F').'''
+        fin = inicio + bloque.shape[-1 if self.orden == 'F' else 0]
+        if self.orden == 'T':
+            self.datos.escribir_bloque(inicio, 0, bloque)
+        elif self.orden == 'C':
+            self.datos[inicio:fin] = bloque
+        else:
+            self.datos[..., inicio:fin] = bloque
+        if inicio != self._escrito:
+            return
+        self._escrito = fin
+        mayor = self.shape[-1 if self.orden == 'F' else 0]
+        unidad = self._unidad()
+        por_unidad = len(self.cabecera['checksums']) // -(-mayor // unidad)  # Teselas por fila de teselas
+        checksums = self.cabecera['checksums']
+        for u in range(inicio // unidad, -(-mayor // unidad)):
+            if min((u + 1) * unidad, mayor) > self._escrito:
+                break
+            for k in range(u * por_unidad, (u + 1) * por_unidad):
+                if checksums[k] == _CRC_PENDIENTE:
+                    checksums[k] = zlib.crc32(_vista_chunk(self.datos, self.cabecera, k))
+
+    def cerrar(self):
+        '''Completa los checksums pendientes, vuelca los datos y escribe la cabecera definitiva.'''
+        if self.datos is None:
+            return
+        checksums = self.cabecera['checksums']
+        for k, crc in enumerate(checksums):
+            if crc == _CRC_PENDIENTE:
+                checksums[k] = zlib.crc32(_vista_chunk(self.datos, self.cabecera, k))
+        self.datos.flush()
+        self.datos = None
+        cabecera = {clave: valor for clave, valor in self.cabecera.items() if clave != 'offset_datos'}
+        with open(self.ruta, 'r+b') as f:
+            f.seek(len(MAGIA) + 8)
+            f.write(_serializar_cabecera(cabecera, self._longitud))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, tipo, valor, traza):
+        if tipo is None:
+            self.cerrar()
+        else:
+            self.datos = None  # Archivo incompleto: sin checksums, verificar_contenedor lo detecta
+
+
+def _mapear(ruta, cabecera, modo):
+    '''np.memmap sobre la región de datos (envuelto en MatrizTeselada en orden 'T').'''
+    orden = cabecera['orden']
+    datos = np.memmap(ruta, dtype=np.dtype(cabecera['dtype']), mode=modo, offset=cabecera['offset_datos'],
+                      shape=_forma_almacenada(cabecera), order='C' if orden == 'T' else orden)
+    return MatrizTeselada(datos, cabecera['shape']) if orden == 'T' else datos
+
+
+def abrir_contenedor(ruta, modo='r'):
+    '''Abre un .fcm sin copia. Retorna (np.memmap o MatrizTeselada, cabecera).'''
+    cabecera = leer_cabecera(ruta)
+    return _mapear(ruta, cabecera, modo), cabecera
+
+
+def verificar_contenedor(ruta, chunks=None):
+    '''
+    Recalcula el crc32 de los chunks indicados (todos por defecto; teselas en orden 'T').
+    Retorna la lista de índices de chunk corruptos o sin checksum.
+    '''
+    datos, cabecera = abrir_contenedor(ruta)
+    checksums = cabecera['checksums']
+    chunks = range(len(checksums)) if chunks is None else chunks
+    return [k for k in chunks if zlib.crc32(_vista_chunk(datos, cabecera, k)) != checksums[k]]
+
+
+def abrir_matriz(fuente, shape=None, dtype=None):
+    '''
+    Abre una matriz en modo lectura: array ya abierto, .fcm, .npy o .dat plano.
+
+    En .fcm y .npy la forma y el tipo salen de la cabecera; si se indica `shape` se valida.
+    Un .dat plano necesita `shape` y `dtype` (formato heredado).
+    '''
+    if not isinstance(fuente, str):
+        return fuente
+    if fuente.endswith(EXTENSION):
+        matriz = abrir_contenedor(fuente)[0]
+    elif fuente.endswith('.npy'):
+        matriz = np.load(fuente, mmap_mode='r')
+    else:
+        if shape is None or dtype is None:
+            raise ValueError(f"{fuente}: un .dat plano necesita shape y dtype")
+        return np.memmap(fuente, dtype=dtype, mode='r', shape=shape)
+    if shape is not None and matriz.shape != tuple(shape):
+        raise ValueError(f"{fuente} tiene forma {matriz.shape}, se esperaba {tuple(shape)}")
+    return matriz
+
+
+def parametros_matriz(fuente):
+    '''Parámetros de creación de un .fcm ({} para otros formatos).'''
+    if isinstance(fuente, str) and fuente.endswith(EXTENSION):
+        return leer_cabecera(fuente)['parametros']
+    return {}
@@ -0,0 +1,103 @@
+import threading
+import numpy as np
+
+'''
+Producto de bloques enteros (int16 / int8 / uint8) por matrices float32 sin copia intermedia.
+
+La versión directa `bloque.astype(np.float32) @ C` crea en cada chunk una copia float32 del
+bloque (16384 × 8192 × 4 bytes = 512 MB en modo 'completa') solo para multiplicarla por C.
+Con B pequeño (un speckle o pocos) el producto está limitado por ancho de banda de memoria,
+así que esa copia duplica o triplica el tráfico y además fragmenta el heap.
+
+- Con numba: kernel compilado y paralelo (prange sobre filas) que lee el bloque entero
+  directamente y escribe en el buffer de salida que se le pasa. Recorre C transpuesta para que
+  el bucle interno sea contiguo en ambos operandos y se vectorice (conversión + FMA en SIMD);
+  las sumas parciales por carril en float32 dan el mismo error que el GEMM float32 de BLAS.
+- Sin numba, o con B grande (donde BLAS gana en cómputo): conversión por sub-bloques a un
+  buffer float32 reutilizado y np.matmul(..., out=...), sin asignaciones por chunk.
+'''
+
+try:
+    from numba import njit, prange
+    NUMBA_DISPONIBLE = True
+except ImportError:
+    NUMBA_DISPONIBLE = False
+
+# A partir de este número de columnas en C el GEMM de BLAS supera al kernel escalar
+UMBRAL_COLUMNAS_KERNEL = 8
+FILAS_SUBBLOQUE = 1024  # Filas convertidas por vez en el camino BLAS (~32 MB con 8192 columnas)
+
+
+if NUMBA_DISPONIBLE:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _kernel_producto(A, CT, out, acumular):
+        m, k = A.shape
+        B = CT.shape[0]
+        for i in prange(m):
+            for b in range(B):
+                s = np.float32(0.0)
+                for j in range(k):
+                    s += np.float32(A[i, j]) * CT[b, j]
+                if acumular:
+                    out[i, b] += s
+                else:
+                    out[i, b] = s
+
+
+# Caché por hilo: dos hilos con producto_entero a la vez no comparten el bloque convertido
+_buffers_conversion = threading.local()
+
+
+def _buffer_conversion(columnas):
+    '''Buffer float32 reutilizado para el camino BLAS (uno por número de columnas y por hilo).'''
+    buffers = getattr(_buffers_conversion, 'buffers', None)
+    if buffers is None:
+        buffers = _buffers_conversion.buffers = {}
+    buffer = buffers.get(columnas)
+    if buffer is None:
+        buffer = buffers[columnas] = np.empty((FILAS_SUBBLOQUE, columnas), dtype=np.float32)
+    return buffer
+
+
+def producto_entero(A, C, out=None, acumular=False):
+    '''
+    out (+)= A @ C con A entero (o float32) y C float32, sin copia float32 completa de A.
+
+    Parámetros:
+    - A: array (m, k), típicamente un bloque de filas int16/int8/uint8 de un memmap
+    - C: array (k, B) float32
+    - out: array (m, B) float32 donde escribir (se crea si es None)
+    - acumular: si True suma el resultado a `out` en lugar de sobrescribirlo
+
+    Retorna:
+    - out
+    '''
+    C = np.ascontiguousarray(C, dtype=np.float32)
+    if C.ndim == 1:
+        C = C.reshape(-1, 1)
+    m = A.shape[0]
+    if out is None:
+        out = np.zeros((m, C.shape[1]), dtype=np.float32) if acumular else np.empty((m, C.shape[1]), dtype=np.float32)
+
+    if A.dtype == np.float32:
+        if acumular:
+            out += A @ C
+        else:
+            np.matmul(A, C, out=out)
+        return out
+
+    if NUMBA_DISPONIBLE and C.shape[1] <= UMBRAL_COLUMNAS_KERNEL and A.flags.c_contiguous:
+        _kernel_producto(A, np.ascontiguousarray(C.T), out, acumular)
+        return out
+
+    # Camino BLAS: convertir sub-bloques al buffer reutilizado (cabe en caché L2/L3 del socket)
+    buffer = _buffer_conversion(A.shape[1])
+    for inicio in range(0, m, FILAS_SUBBLOQUE):
+        fin = min(inicio + FILAS_SUBBLOQUE, m)
+        sub = buffer[:fin - inicio]
+        np.copyto(sub, A[inicio:fin], casting='unsafe')
+        if acumular:
+            out[inicio:fin] += sub @ C
+        else:
+            np.matmul(sub, C, out=out[inicio:fin])
+    return out
@@ -0,0 +1,197 @@
+import numpy as np
+import mmap
+import queue
+import threading
+import time
+
+'''
+Lector de chunks de filas con precarga en segundo plano para los bucles fuera de memoria
+(Matriz_Intensidad.py, Compresion_SVD.py y la reconstrucción).
+
+Sin precarga, cada chunk bloquea en la paginación del memmap, después convierte y multiplica:
+el disco queda ocioso mientras trabaja BLAS y viceversa. LectorChunks mantiene un hilo que
+copia el chunk k+1 (y lo convierte de tipo si se pide) en un anillo de buffers preasignados
+mientras el hilo principal procesa el chunk k:
+
+    for inicio, fin, (bloque_H1, bloque_H2) in LectorChunks([H1, H2], chunk_filas=16384):
+        ...
+
+- Los buffers se reservan una sola vez y se tocan (y bloquean con mlock si el sistema lo permite),
+  así la copia no paga fallos de página de memoria anónima en cada chunk.
+- Sobre los memmap se aplica madvise(MADV_SEQUENTIAL) y madvise(MADV_WILLNEED) del chunk
+  siguiente, para que el kernel adelante la lectura del disco. Son sugerencias: si la
+  plataforma no las soporta se ignoran.
+- Las matrices teseladas (MatrizTeselada, Contenedor_Matriz.py) se leen por teselas enteras
+  directamente en el buffer; conviene que chunk_filas sea múltiplo de la altura de tesela.
+- Al terminar, `resumen()` informa el ancho de banda de lectura conseguido y el tiempo que
+  el hilo principal pasó esperando datos (≈ 0 cuando la lectura queda oculta tras el cálculo).
+
+Los bloques entregados son vistas sobre los buffers del anillo: solo son válidos hasta la
+siguiente iteración (copiar si hace falta conservarlos).
+'''
+
+
+def _mmap_subyacente(matriz):
+    '''Objeto mmap y desplazamiento (bytes) del primer elemento, o (None, 0) si no es un memmap.'''
+    mm = getattr(matriz, '_mmap', None)
+    if mm is None or not matriz.flags.c_contiguous:
+        return None, 0
+    # np.memmap alinea el inicio del mmap a ALLOCATIONGRANULARITY (misma cuenta que numpy)
+    return mm, matriz.offset % mmap.ALLOCATIONGRANULARITY
+
+
+def _madvise(matriz, consejo, inicio=0, fin=None):
+    '''madvise sobre las filas [inicio, fin) de un memmap (o MatrizTeselada). Sin efecto si no es posible.'''
+    fin = matriz.shape[0] if fin is None else fin
+    if hasattr(matriz, 'rango_bytes_filas'):
+        # MatrizTeselada (Contenedor_Matriz.py): las filas de teselas son rangos contiguos
+        byte_inicio, byte_fin = matriz.rango_bytes_filas(inicio, fin)
+        matriz = matriz.teselas
+    else:
+        byte_inicio, byte_fin = inicio * matriz.strides[0], fin * matriz.strides[0]
+    mm, desplazamiento = _mmap_subyacente(matriz)
+    if mm is None or not hasattr(mm, 'madvise') or consejo is None:
+        return
+    byte_inicio += desplazamiento
+    byte_fin += desplazamiento
+    byte_inicio -= byte_inicio % mmap.PAGESIZE  # madvise exige inicio alineado a página
+    try:
+        mm.madvise(consejo, byte_inicio, byte_fin - byte_inicio)
+    except (OSError, ValueError):
+        pass
+
+
+def _bloquear_memoria(buffer):
+    '''mlock best-effort (buffers "pinned"); falla en silencio si RLIMIT_MEMLOCK no alcanza.'''
+    try:
+        import ctypes
+        libc = ctypes.CDLL(None, use_errno=True)
+        libc.mlock(ctypes.c_void_p(buffer.ctypes.data), ctypes.c_size_t(buffer.nbytes))
+    except (OSError, AttributeError):
+        pass
+
+
+class LectorChunks:
+    '''
+    Iterador de chunks de filas (inicio, fin, bloques) con precarga en un hilo de fondo.
+
+    Parámetros:
+    - matrices: lista de arrays/memmaps 2D con el mismo número de filas
+    - chunk_filas: filas por chunk
+    - dtype: tipo de los buffers (None conserva el de cada matriz; np.float32 convierte en el hilo de fondo)
+    - num_buffers: tamaño del anillo (2 = doble buffer)
+    - inicio, fin: rango de filas a recorrer (por defecto todas)
+    - bloquear_memoria: intentar mlock sobre los buffers
+    '''
+
+    def __init__(self, matrices, chunk_filas, dtype=None, num_buffers=2, inicio=0, fin=None,
+                 bloquear_memoria=True):
+        self.matrices = list(matrices)
+        self.M = self.matrices[0].shape[0]
+        for matriz in self.matrices:
+            if matriz.ndim != 2 or matriz.shape[0] != self.M:
+                raise ValueError(f"Todas las matrices deben ser 2D con {self.M} filas, se recibió {matriz.shape}")
+        if num_buffers < 2:
+            raise ValueError(f"num_buffers debe ser al menos 2 para solapar lectura y cálculo, se recibió {num_buffers}")
+        self.inicio = inicio
+        self.fin = self.M if fin is None else min(fin, self.M)
+        self.chunk_filas = max(1, min(chunk_filas, self.fin - self.inicio))
+        self.num_chunks = (self.fin - self.inicio + self.chunk_filas - 1) // self.chunk_filas
+
+        # Anillo de buffers preasignados: buffers[slot][i] para la matriz i
+        self.buffers = []
+        for _ in range(num_buffers):
+            grupo = []
+            for matriz in self.matrices:
+                buffer = np.empty((self.chunk_filas, matriz.shape[1]), dtype=dtype or matriz.dtype)
+                buffer.fill(0)  # Tocar las páginas ahora, no durante la primera copia
+                if bloquear_memoria:
+                    _bloquear_memoria(buffer)
+                grupo.append(buffer)
+            self.buffers.append(grupo)
+
+        # Estadísticas de la última pasada
+        self.bytes_leidos = 0
+        self.tiempo_lectura = 0.0   # Tiempo del hilo de fondo copiando desde disco
+        self.tiempo_espera = 0.0    # Tiempo del hilo principal bloqueado esperando un chunk
+        self.tiempo_total = 0.0
+
+    @property
+    def nbytes_buffers(self):
+        '''RAM ocupada por el anillo de buffers.'''
+        return sum(buffer.nbytes for grupo in self.buffers for buffer in grupo)
+
+    @property
+    def ancho_banda(self):
+        '''Ancho de banda de lectura conseguido en la última pasada (bytes/s).'''
+        return self.bytes_leidos / self.tiempo_lectura if self.tiempo_lectura > 0 else 0.0
+
+    def resumen(self):
+        return (f"Lectura: {self.bytes_leidos / (1024**3):.2f} GB en {self.tiempo_lectura:.1f}s "
+                f"({self.ancho_banda / (1024**2):.0f} MB/s), espera del cálculo: {self.tiempo_espera:.1f}s "
+                f"de {self.tiempo_total:.1f}s")
+
+    def __len__(self):
+        return self.num_chunks
+
+    def _rango(self, chunk_idx):
+        inicio = self.inicio + chunk_idx * self.chunk_filas
+        return inicio, min(inicio + self.chunk_filas, self.fin)
+
+    def _productor(self, libres, listos, detener):
+        try:
+            for chunk_idx in range(self.num_chunks):
+                slot = libres.get()
+                if detener.is_set():
+                    return
+                inicio, fin = self._rango(chunk_idx)
+                if chunk_idx + 1 < self.num_chunks:
+                    # Pedir al kernel el chunk siguiente mientras copiamos este
+                    siguiente_inicio, siguiente_fin = self._rango(chunk_idx + 1)
+                    for matriz in self.matrices:
+                        _madvise(matriz, getattr(mmap, 'MADV_WILLNEED', None), siguiente_inicio, siguiente_fin)
+                t0 = time.time()
+                for matriz, buffer in zip(self.matrices, self.buffers[slot]):
+                    # copyto libera el GIL: la paginación del memmap ocurre aquí, en paralelo al cálculo
+                    if hasattr(matriz, 'leer_filas'):
+                        matriz.leer_filas(inicio, fin, out=buffer[:fin - inicio])  # Teselas enteras
+                    else:
+                        np.copyto(buffer[:fin - inicio], matriz[inicio:fin], casting='unsafe')
+                    self.bytes_leidos += (fin - inicio) * matriz.shape[1] * matriz.itemsize
+                self.tiempo_lectura += time.time() - t0
+                listos.put((inicio, fin, slot))
+        except Exception as e:
+            listos.put(e)
+
+    def __iter__(self):
+        self.bytes_leidos = 0
+        self.tiempo_lectura = 0.0
+        self.tiempo_espera = 0.0
+        inicio_tiempo = time.time()
+        for matriz in self.matrices:
+            _madvise(matriz, getattr(mmap, 'MADV_SEQUENTIAL', None), self.inicio, self.fin)
+
+        libres = queue.Queue()
+        listos = queue.Queue()
+        detener = threading.Event()
+        for slot in range(len(self.buffers)):
+            libres.put(slot)
+        hilo = threading.Thread(target=self._productor, args=(libres, listos, detener), daemon=True)
+        hilo.start()
+
+        try:
+            for _ in range(self.num_chunks):
+                t0 = time.time()
+                item = listos.get()
+                self.tiempo_espera += time.time() - t0
+                if isinstance(item, Exception):
+                    raise RuntimeError(f"Error en la lectura anticipada de chunks: {item}") from item
+                inicio, fin, slot = item
+                yield inicio, fin, [buffer[:fin - inicio] for buffer in self.buffers[slot]]
+                libres.put(slot)  # El consumidor terminó con el chunk: el slot vuelve al anillo
+        finally:
+            # Corte anticipado (break/excepción): liberar al productor si está esperando un slot
+            detener.set()
+            libres.put(None)
+            hilo.join()
+            self.tiempo_total = time.time() - inicio_tiempo
@@ -0,0 +1,93 @@
+import numpy as np
+import cv2
+import os
+
+'''
+Máscara de píxeles activos de la cámara (región iluminada por el núcleo de la fibra).
+
+El speckle solo cubre parte del cuadro 1280×1024 (ver el muestreo de esquinas y centro de
+Matrix_Checks.py): los píxeles fuera del núcleo tienen varianza ~0 entre speckles y no aportan
+información. Con la máscara, todas las etapas guardan y procesan solo las M_activos filas
+informativas de S, Y y D (disco, RAM y cómputo se reducen en la misma proporción), y la
+imagen reconstruida se dispersa de vuelta al cuadro completo al final.
+
+La máscara se guarda como un array bool (alto, ancho); el orden de las filas activas es el de
+np.flatnonzero sobre la imagen vectorizada en orden C (el mismo de toda la cadena).
+'''
+
+
+def estimar_mascara(rutas, shape_img=(1024, 1280), fraccion_umbral=0.1, dilatacion=7):
+    '''
+    Estima la máscara de píxeles informativos a partir de la varianza por píxel entre speckles.
+
+    Parámetros:
+    - rutas: imágenes de speckle (unos cientos bastan)
+    - fraccion_umbral: un píxel es activo si std > fraccion_umbral · percentil 99.9 de std
+    - dilatacion: lado del elemento estructurante para ensanchar el borde (0 = sin dilatar)
+
+    Retorna:
+    - mascara: array bool (alto, ancho)
+    - desviacion: array float32 (alto, ancho) con la desviación estándar por píxel
+    '''
+    suma = np.zeros(shape_img, dtype=np.float64)
+    suma_cuadrados = np.zeros(shape_img, dtype=np.float64)
+    for ruta in rutas:
+        img = cv2.imread(ruta, cv2.IMREAD_GRAYSCALE)
+        if img is None:
+            raise ValueError(f"No se pudo cargar el speckle: {ruta}")
+        if img.shape != tuple(shape_img):
+            raise ValueError(f"El speckle {os.path.basename(ruta)} tiene dimensiones {img.shape}, "
+                             f"se esperaba {tuple(shape_img)}")
+        img = img.astype(np.float64)
+        suma += img
+        suma_cuadrados += img * img
+    n = len(rutas)
+    if n < 2:
+        raise ValueError(f"Se necesitan al menos 2 speckles para estimar la varianza, se recibieron {n}")
+    media = suma / n
+    desviacion = np.sqrt(np.maximum(suma_cuadrados / n - media * media, 0.0)).astype(np.float32)
+
+    umbral = fraccion_umbral * np.percentile(desviacion, 99.9)
+    mascara = desviacion > umbral
+    if dilatacion > 0:
+        elemento = np.ones((dilatacion, dilatacion), dtype=np.uint8)
+        mascara = cv2.dilate(mascara.astype(np.uint8), elemento) > 0
+    return mascara, desviacion
+
+
+def cargar_indices(ruta_mascara):
+    '''Índices (int64, orden C) de los píxeles activos de una máscara guardada con np.save.'''
+    mascara = np.load(ruta_mascara)
+    if mascara.dtype != np.bool_ or mascara.ndim != 2:
+        raise ValueError(f"{ruta_mascara} no es una máscara bool 2D: {mascara.dtype}, {mascara.shape}")
+    return np.flatnonzero(mascara.ravel(order='C'))
+
+
+def dispersar(valores, indices, M, relleno=None):
+    '''
+    Lleva filas enmascaradas (M_activos, B) de vuelta al cuadro completo (M, B).
+
+    Parámetros:
+    - relleno: valor para los píxeles inactivos; None usa el mínimo de cada columna, de modo
+      que la normalización min-max los deja en negro
+    '''
+    valores = np.asarray(valores).reshape(len(indices), -1)
+    if relleno is None:
+        relleno = valores.min(axis=0) if valores.size else 0
+    out = np.empty((M, valores.shape[1]), dtype=valores.dtype)
+    out[:] = relleno
+    out[indices] = valores
+    return out
+
+
+def filas_de_pixeles(indices, pixeles):
+    '''
+    Filas de las matrices enmascaradas para una selección de píxeles (índices crecientes).
+
+    Retorna:
+    - filas: filas de Y/D de los píxeles activos de la selección
+    - activos: posiciones de esos píxeles dentro de `pixeles` (para dispersar)
+    '''
+    posiciones = np.minimum(np.searchsorted(indices, pixeles), len(indices) - 1)
+    activos = np.flatnonzero(indices[posiciones] == pixeles)
+    return posiciones[activos], activos
@@ -1,10 +1,11 @@
 import numpy as np
 import os
+from Contenedor_Matriz import abrir_contenedor, abrir_matriz, verificar_contenedor
 
 # Paths to your data
-path_speckles_H1 = '/media/manuel/Windows/Archivos_Reconstruccion/speckles_H1_vectorizados.npy'
-path_speckles_H2 = '/media/manuel/Windows/Archivos_Reconstruccion/speckles_H2_vectorizados.npy'
-path_H = '/media/manuel/Windows/Archivos_Reconstruccion/Hadamard_H_menosH_transpuesta.dat'  # Nueva matriz sin compresión
+path_speckles_H1 = '/media/manuel/Windows/Archivos_Reconstruccion/speckles_H1_vectorizados.fcm'
+path_speckles_H2 = '/media/manuel/Windows/Archivos_Reconstruccion/speckles_H2_vectorizados.fcm'
+path_H = '/media/manuel/Windows/Archivos_Reconstruccion/Hadamard_H_menosH_transpuesta.fcm'  # Nueva matriz sin compresión
 
 # Check if files exist
 for path in [path_speckles_H1, path_speckles_H2, path_H]:
@@ -12,9 +13,9 @@ for path in [path_speckles_H1, path_speckles_H2, path_H]:
         print(f"ERROR: File not found: {path}")
         exit()
 
-# Memory-map the .npy files so we don't load them fully into RAM
-H1 = np.load(path_speckles_H1, mmap_mode='r')
-H2 = np.load(path_speckles_H2, mmap_mode='r')
+# Memory-map the containers so we don't load them fully into RAM
+H1 = abrir_matriz(path_speckles_H1)
+H2 = abrir_matriz(path_speckles_H2)
 
 print("\nInspeccionando matrices de speckles...")
 
@@ -112,34 +113,18 @@ if H1.shape[0] != M:
 else:
     print("Número de pixels consistente con DMD")
 
-# Check actual file size and calculate correct dimensions
-file_size = os.path.getsize(path_H)
-expected_dtype = np.int8  # Expected dtype for Hadamard matrix
-dtype_size = np.dtype(expected_dtype).itemsize  # Generic byte size calculation
-expected_size = N * M * dtype_size
-actual_elements = file_size // dtype_size
+# Abrir el contenedor: forma, tipo y parámetros de generación vienen en la cabecera
+X, cabecera_H = abrir_contenedor(path_H)
+parametros_H = cabecera_H['parametros']
+print(f"\nArchivo Hadamard (sin compresión): {os.path.getsize(path_H)} bytes ({os.path.getsize(path_H)/(1024**3):.2f} GB)")
+print(f"Dimensiones en cabecera: {X.shape[0]} x {X.shape[1]}, esperadas: {N} x {M}")
+if X.shape != (N, M):
+    print("WARNING: Las dimensiones del contenedor no coinciden con los speckles")
 
-print(f"\nArchivo Hadamard (sin compresión): {file_size} bytes ({file_size/(1024**3):.2f} GB)")
-print(f"Tipo esperado: {expected_dtype} ({dtype_size} bytes/elemento)")
-print(f"Dimensiones esperadas: {N} x {M} = {N*M} elementos")
-print(f"Tamaño esperado: {expected_size} bytes")
-print(f"Elementos calculados: {actual_elements}")
-
-if actual_elements != N * M:
-    print("WARNING: Las dimensiones no coinciden. Calculando dimensiones reales...")
-    # Try to find correct dimensions
-    if actual_elements % M == 0:
-        N_real = actual_elements // M
-        print(f"Usando dimensiones corregidas: {N_real} x {M}")
-        X = np.memmap(path_H, dtype=expected_dtype, mode='r', shape=(N_real, M))
-    else:
-        print("ERROR: No se pueden determinar dimensiones válidas")
-        print(f"  Archivo: {actual_elements} elementos")
-        print(f"  No es divisible por M={M}")
-        exit()
-else:
-    print("Dimensiones correctas!")
-    X = np.memmap(path_H, dtype=expected_dtype, mode='r', shape=(N, M))
+# Integridad de los datos (crc32 por chunk): primer, central y último chunk
+chunks_test = sorted({0, len(cabecera_H['checksums']) // 2, len(cabecera_H['checksums']) - 1})
+corruptos = verificar_contenedor(path_H, chunks_test)
+print(f"Checksums verificados en chunks {chunks_test}: {'OK' if not corruptos else f'CORRUPTOS {corruptos}'}")
 
 print("\nMatriz [H, -H]ᵀ (sin compresión):")
 print(f"  dtype = {X.dtype}")
@@ -152,14 +137,13 @@ print(f"  sample padding min = {block.min()}, sample padding max = {block.max()}
 # Muestreo más representativo: región central donde están los patrones activos
 print(f"\n🔍 Muestreo representativo en región central activa:")
 
-# Parámetros de escalado (calculados igual que en generación)
-DMD_size = (1280, 1024)  # (ancho, alto)
-ancho, alto = DMD_size
-pattern_size = 64
-scale = min(DMD_size) // pattern_size  # 16x escalado
+# Parámetros de escalado (guardados en la cabecera por Vectorizacion_Patrones_Hadamard.py)
+ancho, alto = parametros_H['DMD_size']
+pattern_size = parametros_H['pattern_size']
+scale = parametros_H['scale']  # 16x escalado
 scaled_size = pattern_size * scale  # 1024 pixels escalados
-offset_x = (ancho - scaled_size) // 2  # 128 offset horizontal
-offset_y = (alto - scaled_size) // 2   # 0 offset vertical
+offset_x = parametros_H['offset_x']  # 128 offset horizontal
+offset_y = parametros_H['offset_y']  # 0 offset vertical
 
 print(f"Región activa: offset_x={offset_x}, offset_y={offset_y}, tamaño={scaled_size}×{scaled_size}")
 
@@ -5,69 +5,84 @@ import scipy.linalg
 import os
 import matplotlib.pyplot as plt
 import imageio.v2 
+# Empaquetado en planos de bits sin pygame (se reexporta para los scripts que lo importaban de aquí)
+from Planos_Bits import (BITPLANE_CHANNEL_ORDER, hadamard_binary_patterns, embed_binary_patterns, pack_bitplanes,
+                         unpack_bitplanes, bitplane_timing, pack_hadamard_frames)
+
+def scale_patterns(patterns, scale):
+    """
+    Escala por repetición de píxeles un bloque de patrones (B, n, n) → (B, n·scale, n·scale).
+    Cada píxel se expande con una vista de paso 0 (np.broadcast_to) y una sola copia al
+    reorganizar: sin bucles en Python.
+    """
+    patterns = np.asarray(patterns)
+    B, rows, columns = patterns.shape
+    expanded = np.broadcast_to(patterns[:, :, None, :, None], (B, rows, scale, columns, scale))
+    return expanded.reshape(B, rows * scale, columns * scale)
+
+def embed_in_DMD_frames(patterns, target_size=(1920, 1080)):
+    """
+    Centra un bloque de patrones (B, alto, ancho) en lienzos negros de `target_size` = (ancho, alto).
+
+    Retorna:
+    - array (B, alto_DMD, ancho_DMD) con el dtype de los patrones
+    """
+    patterns = np.asarray(patterns)
+    B, pattern_height, pattern_width = patterns.shape
+    target_width, target_height = target_size
+    canvas = np.zeros((B, target_height, target_width), dtype=patterns.dtype)
+
+    # Centrado
+    x_offset = (target_width - pattern_width) // 2
+    y_offset = (target_height - pattern_height) // 2
+
+    canvas[:, y_offset:y_offset + pattern_height, x_offset:x_offset + pattern_width] = patterns
+    return canvas
+
+def adapt_columns_to_DMD(matrix_NotAdapated, columns, DMD_pixels=(1920, 1080), target_size=None):
+    """
+    Versión vectorizada de pattern_adapt para varias columnas a la vez.
+
+    Parámetros:
+    - matrix_NotAdapated: array (N², N²)
+        Matriz (ej. Hadamard con valores 0-255) cuyas columnas son los patrones.
+    - columns: lista de int
+        Columnas a convertir en patrones.
+    - DMD_pixels: (ancho, alto)
+        Área del DMD que define el factor de escalado (el cuadrado más grande que cabe).
+    - target_size: (ancho, alto) o None
+        Si se indica, los patrones escalados se centran en un lienzo negro de ese tamaño.
+
+    Retorna:
+    - array (B, n·scale, n·scale), o (B, alto, ancho) con target_size
+    """
+    matrix = np.asarray(matrix_NotAdapated)
+    row_count = int(np.sqrt(len(matrix)))                   # Tamaño N del patrón NxN
+    scale_Factor = int(np.min(DMD_pixels) / row_count)
+    # Columna j → cuadrado NxN: fila r del patrón = elementos r·N ... r·N + N - 1 de la columna
+    squares = matrix[:, np.asarray(columns)].T.reshape(-1, row_count, row_count)
+    patterns = scale_patterns(squares, scale_Factor)
+    return patterns if target_size is None else embed_in_DMD_frames(patterns, target_size)
 
 def pattern_adapt(matrix_NotAdapated, convertion_Column, DMD_pixels = [1920,1080]):
     '''
     Esta función recibe una matriz de orden N^2xN^2 como primer argumento
     y retrona una matriz NxN que contiene solamente
-    los píxeles de la columna respectiva al segundo argumento
+    los píxeles de la columna respectiva al segundo argumento,
+    escalada al cuadrado más grande que cabe en DMD_pixels (ver adapt_columns_to_DMD)
     '''
     if (len(matrix_NotAdapated) & (len(matrix_NotAdapated)- 1) != 0):
         #Si es diferente de 0, entonces no es potencia de dos, no es útil para nuestro trabajo
         return print("La matriz ingresada debe ser potencia de dos")    #Early return para atrapar un error común
     if (len(matrix_NotAdapated) != len(matrix_NotAdapated[0])):
         return print("La matriz no es cuadrada")                #Otra verificación rápida
-              
-    matrix_Adapted = []                                         #Se define la matriz que se va a devolver
-    aux_matrix = []                                             #Utilizaremos esta matriz auxiliar para trabajar en los ciclos
-    square_aux_matrix = []                                      #Matriz intermedia que contendrá el patrón de una columna en un cuadrado
-    row_count = int(np.sqrt(len(matrix_NotAdapated)))           #Requerimos saber el tamaño N del patrón NxN que se va a adpatar
-    scale_Factor = int(np.min(DMD_pixels)/row_count)            #Para escalar los píxeles
-    offset = 0             
-    '''Primero lo que haremos es convertir una columna de la matriz origen en una matriz cuadrada
-        Llevando la lógica de:
-            Patrón Proyectado   :     Patrón origen
-                fila [0]        :   Columna [0-63]
-                fila [1]        :   Columna [64-127]
-                ...
-                fila [64]       :   Columna [4032-4095]'''
-    
-    for row_Adapted in range(0, row_count,1):
-        #Se hace un ciclo de N paso para asignar N filas
-        for row_NotAdapted in range(offset, row_count + offset,1):
-            #Se añade cada elemento de la columna a una fila
-            aux_matrix.append(matrix_NotAdapated[row_NotAdapted, convertion_Column])
-        offset+= row_count                         #Empezamos el siguiente ciclo desde nos quedamos en el anterior
-        square_aux_matrix.append(aux_matrix)       #Añadimos una fila a la matriz cuadrada
-        aux_matrix = []                            #Se limpian los elementos de la matriz
-    #En este punto square_aux_matrix ya es una matriz NxN 
-
-    ''' Se deben adapatar las matrices de NxN píxeles a 1920x1080 píxeles
-        Se buscará conservar el patrón en un cuadrado '''
-    for row in range(0, row_count, 1): 
-        for rows_scale in range(0, scale_Factor, 1):
-            for column in range(0, row_count, 1):
-                for column_scale in range(0,scale_Factor,1):
-                    aux_matrix.append(square_aux_matrix[row][column])   #Lista de listas
-            matrix_Adapted.append(aux_matrix)
-            aux_matrix = []
-    return matrix_Adapted
+    return adapt_columns_to_DMD(matrix_NotAdapated, [convertion_Column], DMD_pixels)[0]
 
 def embed_in_DMD_frame(matrix, target_size=(1920, 1080)):
     """
     Centra la matriz dentro de un lienzo negro del tamaño `target_size` = (ancho, alto)
     """
-    pattern = np.array(matrix, dtype=np.uint8)
-    pattern_height, pattern_width = pattern.shape
-    target_width, target_height = target_size
-    canvas = np.zeros((target_height, target_width), dtype=np.uint8)  # alto, ancho
-
-    # Centrado 
-    x_offset = (target_width - pattern_width) // 2
-    y_offset = (target_height - pattern_height) // 2
-
-    canvas[y_offset:y_offset + pattern_height, x_offset:x_offset + pattern_width] = pattern
-    return canvas
+    return embed_in_DMD_frames(np.array(matrix, dtype=np.uint8)[None], target_size)[0]
 
 def get_Hadamard_1_SurfaceToShow(pattern_size, convertion_Column):
     '''     
@@ -113,7 +128,7 @@ def get_Hadamard_2_SurfaceToShow(pattern_size, convertion_Column):
     Hadamard_H2_surface = pygame.surfarray.make_surface(Hadamard_H2_rgb_pattern)    # Se convierte en superficie el patrón para mostrarlo con pygame
     return Hadamard_H2_surface
 
-def save_hadamard_patterns_to_disk(pattern_size, Hadamard_Selection,target_size = [1920,1080],output_dir="Hadamard_Patterns"):
+def save_hadamard_patterns_to_disk(pattern_size, Hadamard_Selection,target_size = [1920,1080],output_dir="Hadamard_Patterns", batch_size=64):
     """
     Generates and saves to disk all Hadamard patterns (as PNG images)
     for a given pattern resolution.
@@ -123,6 +138,8 @@ def save_hadamard_patterns_to_disk(pattern_size, Hadamard_Selection,target_size
         Size N of the square pattern (e.g., 64, 128). N^2 patterns will be generated.
     - output_dir: str
         Directory where the patterns will be saved as PNG images.
+    - batch_size: int
+        Patterns generated per vectorized call (adapt_columns_to_DMD).
     """
     os.makedirs(output_dir, exist_ok=True)
     matrix_order = pattern_size ** 2
@@ -137,16 +154,18 @@ def save_hadamard_patterns_to_disk(pattern_size, Hadamard_Selection,target_size
     else:
         return print("Hadamard Selection must be 1 or 2")
 
-    for i in range(matrix_order):
-        pattern_scaled = pattern_adapt(hadamard_matrix, i, target_size)
-        pattern_centered = embed_in_DMD_frame(pattern_scaled, target_size)
+    for start in range(0, matrix_order, batch_size):
+        # Batch of centered frames (B, height, width) in one vectorized call
+        columns = np.arange(start, min(start + batch_size, matrix_order))
+        frames = adapt_columns_to_DMD(hadamard_matrix, columns, target_size, target_size)
 
-        # Save as PNG image
-        filename = os.path.join(output_dir, f"hadamard_{i:04}.png")
-        plt.imsave(filename, pattern_centered, cmap="gray", vmin=0, vmax=255)
+        for i, pattern_centered in zip(columns, frames):
+            # Save as PNG image
+            filename = os.path.join(output_dir, f"hadamard_{i:04}.png")
+            plt.imsave(filename, pattern_centered, cmap="gray", vmin=0, vmax=255)
 
-        if i % 100 == 0 or i == matrix_order - 1:
-            print(f"Saved pattern {i + 1} of {matrix_order}")
+            if i % 100 == 0 or i == matrix_order - 1:
+                print(f"Saved pattern {i + 1} of {matrix_order}")
 
     print(f"All patterns saved in folder: '{output_dir}/'")
 
@@ -197,9 +216,53 @@ def adapt_matrix_to_scale(matrix_NotAdapated, DMD_pixels=[1920, 1080]):
     scale = int(min(DMD_pixels) // N)
     if scale < 1:
         raise ValueError("El patrón es más grande que el área del DMD.")
-    # Repite los píxeles para escalar
-    matrix_scaled = np.repeat(np.repeat(matrix, scale, axis=0), scale, axis=1)
-    return matrix_scaled
+    # Repite los píxeles para escalar (las dimensiones extra, ej. RGB, se escalan por separado)
+    planes = matrix.reshape(N, matrix.shape[1], -1).transpose(2, 0, 1)
+    return scale_patterns(planes, scale).transpose(1, 2, 0).reshape((N * scale, matrix.shape[1] * scale) + matrix.shape[2:])
+
+def save_bitplane_frames_to_disk(pattern_size, columns, signs=None, target_size=(1280, 1024),
+                                 output_dir="Hadamard_Planos_Bits", planes_per_frame=24):
+    """
+    Guarda como PNG RGB (sin pérdidas) los cuadros empaquetados de una secuencia de patrones:
+    frame_{k:05}.png lleva los patrones k·planes_per_frame ... (k + 1)·planes_per_frame - 1.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    total = (len(columns) + planes_per_frame - 1) // planes_per_frame
+    for k, frame in enumerate(pack_hadamard_frames(pattern_size, columns, signs, target_size, planes_per_frame)):
+        imageio.v2.imwrite(os.path.join(output_dir, f"frame_{k:05}.png"), frame)
+        if k % 20 == 0 or k == total - 1:
+            print(f"Saved frame {k + 1} of {total}")
+    print(f"{len(columns)} patterns packed into {total} frames in folder: '{output_dir}/'")
+
+def display_bitplane_frames_from_disk(folder_path, fps=60, offset=(320, 0)):
+    """
+    Proyecta los cuadros RGB empaquetados de una carpeta a `fps` cuadros por segundo.
+    El DMD, en modo "video pattern", muestra sus 24 planos de bits en secuencia dentro de cada
+    cuadro; la cámara se dispara con la salida de trigger del DMD (bitplane_timing).
+    Los cuadros se cargan antes de empezar para que la decodificación PNG no retrase ninguno.
+    """
+    pygame.init()
+    screen = pygame.display.set_mode((1920, 1080), pygame.FULLSCREEN)
+    clock = pygame.time.Clock()
+
+    filenames = sorted([f for f in os.listdir(folder_path) if f.endswith(".png")])
+    surfaces = [pygame.image.load(os.path.join(folder_path, f)).convert() for f in filenames]
+
+    running = True
+    index = 0
+    while running and index < len(surfaces):
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT or event.type == pygame.KEYDOWN:
+                running = False
+
+        screen.fill((0, 0, 0))
+        screen.blit(surfaces[index], offset)
+        pygame.display.flip()
+
+        clock.tick(fps)
+        index += 1
+
+    pygame.quit()
 
 '''
 #No pues, esto hace cosas. Usa una imagen de 64x64, la convierte a 1920x1080 y la guarda en el disco
@@ -209,5 +272,7 @@ img_matrix = adapt_matrix_to_scale(img_matrix, [1280, 1024])
 imagen = embed_in_DMD_frame(img_matrix, [1280, 1024])
 plt.imsave(filename, imagen, cmap="gray", vmin=0, vmax=255)
 '''
-save_hadamard_patterns_to_disk(2,1, [1280,1024] ,"Hadamard_1_2_1280x1024")
-save_hadamard_patterns_to_disk(2,2, [1280,1024] ,"Hadamard_2_2_1280x1024")
\ No newline at end of file
+if __name__ == '__main__':
+    # Solo al ejecutar el archivo: Orquesta.py importa este módulo
+    save_hadamard_patterns_to_disk(2,1, [1280,1024] ,"Hadamard_1_2_1280x1024")
+    save_hadamard_patterns_to_disk(2,2, [1280,1024] ,"Hadamard_2_2_1280x1024")
\ No newline at end of file
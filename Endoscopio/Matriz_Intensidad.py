@@ -1,11 +1,38 @@
 import numpy as np
 import os
 import time
+from Contenedor_Matriz import EscritorContenedor, abrir_matriz, parametros_matriz
+from Lector_Chunks import LectorChunks
+from Planificador_Memoria import planificar_filas
 
 '''
 Este código construye la matriz de intensidad final a partir de los speckles vectorizados.
 Carga las matrices H1 y H2 (cada una de 1310720 x 4096), aplica la fórmula 2*I^p - I^1,
-y concatena horizontalmente para generar una matriz final de 1310720 x 8192.
+y genera en una sola pasada:
+- Matriz_Intensidad.fcm:  Y = [Y_H1 | Y_H2], 1310720 x 8192 int16 (modo 'completa')
+- Matriz_Diferencia.fcm:  D = Y_H1 - Y_H2 = 2*(S_H1 - S_H2), 1310720 x 4096 int16 (modo 'diferencia')
+
+================================ ETAPA ÚNICA EN FLUJO ================================
+
+Antes los datos de intensidad se reescribían cinco veces (temp_Y_H1.dat, temp_Y_H2.dat,
+temp_Matriz_Final.dat, Matriz_Intensidad.npy y de nuevo en Concatenacion_Final.py, más
+Matriz_Diferencia.py). Ahora:
+- Se leen bloques de filas de S_H1 y S_H2 una sola vez (LectorChunks, lectura anticipada).
+- Para cada bloque se forma Y = [2*S_H1 - I1 | 2*S_H2 - I1] en un buffer reutilizado y se
+  escribe en su posición final: escrituras secuenciales grandes sobre archivos row-major.
+- Las salidas son contenedores .fcm (Contenedor_Matriz.py): la cabecera describe forma, tipo,
+  chunk, parámetros de creación (heredados de los speckles, más la columna de I1) y un crc32 por
+  chunk, calculado al escribir cada bloque. No hace falta una copia .dat + .npy ni declarar el
+  shape al abrirlos (abrir_matriz).
+
+I1 = H1[:, 0] se toma de la columna 0 de cada bloque de filas: nunca se recorre la columna
+completa del archivo (acceso con stride).
+
+La reconstrucción en modo 'perezosa' (LazyIntensityMatrix) no necesita este script: calcula
+Y = 2*S - I1 al vuelo desde los speckles uint8.
+Si los speckles se vectorizaron con máscara (Construccion_Mascara.py), M es el número de píxeles
+activos: la forma se toma de las propias cabeceras y todo lo demás escala en proporción.
+=====================================================================================
 '''
 
 ######################### Construcción de matriz de intensidad #########################
@@ -16,17 +43,23 @@ print("Iniciando carga de matrices de speckles vectorizados...")
 
 # Configurar paths - OPTIMIZADO: usar disco local para todo el procesamiento
 base_path = '/home/manuel/temp_intensity'  # Todo en disco local (más rápido)
-temp_path = '/home/manuel/temp_intensity'  # Mismo directorio para eficiencia
+Path_Matriz_Final = os.path.join(base_path, 'Matriz_Intensidad.fcm')       # Y (M × 2N), modo 'completa'
+Path_Matriz_Diferencia = os.path.join(base_path, 'Matriz_Diferencia.fcm')  # D (M × N), modo 'diferencia'
+Generar_Matriz_Final = True        # Escribir Y = [Y_H1 | Y_H2]
+Generar_Matriz_Diferencia = True   # Escribir D = Y_H1 - Y_H2 (mitad de tamaño, misma reconstrucción)
+Memoria_GB = None                  # Presupuesto de RAM para los chunks (None = según la RAM libre)
+Num_Buffers_Precarga = 2           # Buffers de lectura anticipada
 
-# Crear directorio temporal si no existe
-os.makedirs(temp_path, exist_ok=True)
+if not (Generar_Matriz_Final or Generar_Matriz_Diferencia):
+    raise ValueError("Activar al menos una salida: Generar_Matriz_Final o Generar_Matriz_Diferencia")
 
 # Cargar matrices de speckles vectorizados con memmap (optimización crítica de RAM)
 print("Cargando matrices de speckles vectorizados con memmap...")
 try:
     # Usar memmap para evitar cargar 10+ GB en RAM
-    H1_speckles = np.load(f'{base_path}/speckles_H1_vectorizados.npy', mmap_mode='r')  
-    H2_speckles = np.load(f'{base_path}/speckles_H2_vectorizados.npy', mmap_mode='r')  
+    Path_Speckles_H1 = os.path.join(base_path, 'speckles_H1_vectorizados.fcm')
+    H1_speckles = abrir_matriz(Path_Speckles_H1)
+    H2_speckles = abrir_matriz(os.path.join(base_path, 'speckles_H2_vectorizados.fcm'))
     print("Matrices cargadas exitosamente desde disco local con memmap (ultra-optimizado)")
 except FileNotFoundError as e:
     raise FileNotFoundError(f"No se pudo cargar el archivo: {e}")
@@ -36,212 +69,143 @@ except Exception as e:
 # Solo verificaciones esenciales (las detalladas ya están en Matrix_Checks.py)
 print(f"H1_speckles: {H1_speckles.shape}, {H1_speckles.dtype}")
 print(f"H2_speckles: {H2_speckles.shape}, {H2_speckles.dtype}")
+if H1_speckles.shape != H2_speckles.shape:
+    raise ValueError(f"H1 {H1_speckles.shape} y H2 {H2_speckles.shape} deben tener la misma forma")
 
 # Constantes esperadas basadas en validación previa
 M_esperado, N_esperado = H1_speckles.shape
 
+# Verificar espacio disponible en disco
+import shutil
+espacio_libre_gb = shutil.disk_usage(base_path).free / (1024**3)
+tamaño_Y_gb = M_esperado * 2 * N_esperado * 2 / (1024**3) if Generar_Matriz_Final else 0  # int16 = 2 bytes
+tamaño_D_gb = M_esperado * N_esperado * 2 / (1024**3) if Generar_Matriz_Diferencia else 0
+print(f"\nVerificación de espacio:")
+print(f"- Espacio libre: {espacio_libre_gb:.2f} GB")
+print(f"- Matriz final Y: {tamaño_Y_gb:.2f} GB, matriz diferencia D: {tamaño_D_gb:.2f} GB")
+if espacio_libre_gb < (tamaño_Y_gb + tamaño_D_gb) * 1.1:  # 10% de margen
+    raise Exception(f"Espacio insuficiente. Necesario: {tamaño_Y_gb + tamaño_D_gb:.2f} GB, Disponible: {espacio_libre_gb:.2f} GB")
+
 
 print(f"\n=== PROCESAMIENTO DE MATRIZ DE INTENSIDAD ===")
 
 print("Aplicando fórmula: Y = 2 * I^p - I^1...")
 
-# PROCESAMIENTO POR CHUNKS PARA EVITAR OVERFLOW DE RAM
-# Se procesará columna por columna para mantener bajo uso de memoria RAM
-print("Configurando procesamiento por chunks para optimizar uso de RAM...")
-
-# Configuración de chunks - OPTIMIZACIÓN INTELIGENTE con límites de RAM
-'''
-================================ CONSIDERACIONES SOBRE chunk_size ================================
-
-1. CONFIGURACIÓN ACTUAL:
-   - Se utiliza un valor de `chunk_size = 1024`, equivalente a procesar 1/4 de todas las columnas
-     (4096 columnas en total).
-   - Esto implica un uso de memoria estimado de:
-       RAM ≈ 1024 × 1310720 × 2 bytes × 2 matrices = ~5.37 GB
-   - Esto respeta la RAM física disponible (7.6 GB), manteniendo margen de seguridad.
-
-2. MOTIVACIÓN:
-   - Esta configuración reduce el número de ciclos de procesamiento (solo 4 chunks)
-   - Se mejora el throughput general reduciendo operaciones I/O intermedias.
-   - Mantiene estabilidad del sistema sin forzar swap masivo.
-
-3. VENTAJAS:
-   - Comportamiento predecible en entornos con RAM limitada
-   - No compite agresivamente con el sistema operativo por recursos
-   - Permite operaciones concurrentes sin degradación significativa
-
-4. ESCALABILIDAD:
-   - Para máquinas con más RAM: chunk_size puede aumentarse proporcionalmente
-   - Para máquinas con menos RAM: chunk_size se puede reducir a 512 o 256
-
-===============================================================================================
-'''
-chunk_size = 512  # Chunk size balanceado: rendimiento + estabilidad
-total_columnas = N_esperado  # 4096
-num_chunks = (total_columnas + chunk_size - 1) // chunk_size  # División hacia arriba
-
-# Calcular RAM estimada por chunk
-ram_por_chunk_gb = chunk_size * M_esperado * 2 / (1024**3)  # int16 = 2 bytes por elemento
+# Tamaño de chunk según la RAM disponible (Planificador_Memoria.py). Cada chunk de Y o D es un
+# rango contiguo del .fcm de salida; un hilo de fondo lee el chunk k+1 mientras se procesa el k.
+chunk_filas = planificar_filas('Matriz_Intensidad', M_esperado, por_fila={
+    f'S_H1 + S_H2 ({Num_Buffers_Precarga} buffers de precarga, {H1_speckles.dtype})':
+        Num_Buffers_Precarga * 2 * N_esperado * np.dtype(H1_speckles.dtype).itemsize,
+    'bloque Y (int16)': 2 * N_esperado * 2,
+    'bloque D (int16)': N_esperado * 2 if Generar_Matriz_Diferencia else 0,
+}, multiplo=getattr(H1_speckles, 'tesela', (1,))[0], memoria_gb=Memoria_GB)
+lector = LectorChunks([H1_speckles, H2_speckles], chunk_filas, num_buffers=Num_Buffers_Precarga)
+num_chunks = len(lector)
 
 print(f"Configuración de chunks:")
-print(f"- Tamaño de chunk: {chunk_size} columnas")
+print(f"- Tamaño de chunk: {chunk_filas} filas")
 print(f"- Total de chunks: {num_chunks}")
-print(f"- RAM estimada por chunk: {ram_por_chunk_gb:.3f} GB")
-
-# Crear archivos de matrices temporales en disco usando memmap
-print("Creando matrices temporales en disco...")
-Y_H1_memmap = np.memmap(os.path.join(temp_path, 'temp_Y_H1.dat'), 
-                        dtype=np.int16, mode='w+', shape=(M_esperado, N_esperado))
-Y_H2_memmap = np.memmap(os.path.join(temp_path, 'temp_Y_H2.dat'), 
-                        dtype=np.int16, mode='w+', shape=(M_esperado, N_esperado))
-
-# Extraer I1 (vector columna base) y convertir a int16 de una vez
-print("Extrayendo vector I1 (patrón Hadamard con todos los píxeles en 1)...")
-print("IMPORTANTE: I1 es el speckle de referencia (patrón all-ones H1[:, 0])")
-I1 = H1_speckles[:, 0].reshape(-1, 1).astype(np.int16)
-print(f"Vector I1 extraído: forma={I1.shape}, dtype={I1.dtype}")
-print(f"I1 estadísticas: min={I1.min()}, max={I1.max()}, media={I1.mean():.2f}")
-
-# Pre-calcular índices de chunks para optimización
-print("Pre-calculando índices de chunks...")
-chunk_indices = [(i * chunk_size, min((i + 1) * chunk_size, total_columnas)) 
-                 for i in range(num_chunks)]
+print(f"- Buffers de precarga: {lector.nbytes_buffers / (1024**3):.3f} GB")
+
+# Crear las matrices de salida: .fcm autodescritos, un chunk del contenedor por chunk de filas
+print("Creando matrices de salida en disco...")
+# Con adquisición compresiva la cabecera trae pattern_size y los 'patrones' de cada columna (se heredan)
+parametros = parametros_matriz(Path_Speckles_H1)
+parametros = dict(parametros, etapa='Matriz_Intensidad', conjunto='H1+H2',
+                  pattern_size=parametros.get('pattern_size', int(round(N_esperado ** 0.5))), columna_I1=0,
+                  formula='Y = 2*S - I1')
+Y_salida = EscritorContenedor(Path_Matriz_Final, (M_esperado, 2 * N_esperado), np.int16, chunk=lector.chunk_filas,
+                              parametros=dict(parametros, matriz='Y')) if Generar_Matriz_Final else None
+D_salida = EscritorContenedor(Path_Matriz_Diferencia, (M_esperado, N_esperado), np.int16, chunk=lector.chunk_filas,
+                              parametros=dict(parametros, matriz='D')) if Generar_Matriz_Diferencia else None
+
+# Buffers reutilizados para el bloque de Y y de D
+Y_chunk = np.empty((lector.chunk_filas, 2 * N_esperado), dtype=np.int16)
+D_chunk = np.empty((lector.chunk_filas, N_esperado), dtype=np.int16)
+
+print("IMPORTANTE: I1 es el speckle de referencia (patrón all-ones H1[:, 0]), se toma de cada chunk de filas")
+I1_min, I1_max, I1_suma = np.inf, -np.inf, 0
 
 # Procesar por chunks para evitar overflow de RAM
 print(f"\n=== PROCESAMIENTO POR CHUNKS ===")
-for i, (inicio, fin) in enumerate(chunk_indices):
-    columnas_chunk = fin - inicio
-    
-    print(f"Procesando chunk {i+1}/{num_chunks}: columnas {inicio} a {fin-1} ({columnas_chunk} columnas)")
-    
+for i, (inicio, fin, (H1_chunk, H2_chunk)) in enumerate(lector):
+    filas = fin - inicio
+    Y = Y_chunk[:filas]
+
     # ===== FÓRMULA CRÍTICA: Y = 2*Speckle - I₁ =====
     # Esta transformación es ESENCIAL para que la reconstrucción funcione:
-    # - Elimina el término DC I₁ de cada speckle 
+    # - Elimina el término DC I₁ de cada speckle
     # - Convierte la matriz de intensidad en formato adecuado para inversión
     # - La reconstrucción posterior I_rec = (1/2N)*(Y @ c) YA dará la imagen correcta
-    
-    # Aplicar fórmula vectorizada: Y = 2 * I^p - I^1
-    # Carga y conversión directa para eficiencia
-    Y_H1_memmap[:, inicio:fin] = 2 * H1_speckles[:, inicio:fin].astype(np.int16) - I1
-    Y_H2_memmap[:, inicio:fin] = 2 * H2_speckles[:, inicio:fin].astype(np.int16) - I1
-    
-    # Mostrar progreso solo cada chunk (son pocos ahora)
-    progreso = (i + 1) / num_chunks * 100
-    print(f"Progreso: {progreso:.1f}% completado ({i+1}/{num_chunks})")
-
-# Validación rápida solo en muestra pequeña
-print(f"Procesamiento por chunks completado")
-print(f"Y_H1_memmap: {Y_H1_memmap.shape}, {Y_H1_memmap.dtype}")
-print(f"Y_H2_memmap: {Y_H2_memmap.shape}, {Y_H2_memmap.dtype}")
-
-# Dimensiones para concatenación final
-filas_finales = M_esperado
-columnas_finales = 2 * N_esperado  # H1 + H2 concatenadas horizontalmente
-
-# Concatenar horizontalmente usando memmap optimizado
-print(f"\n=== CONCATENACIÓN FINAL CON MEMMAP ===")
-
-# Calcular memoria final
-bytes_por_elemento = 2  # int16
-memoria_final_gb = filas_finales * columnas_finales * bytes_por_elemento / (1024**3)
-print(f"Matriz final: {filas_finales} x {columnas_finales} ({memoria_final_gb:.2f} GB)")
-
-try:
-    # Crear matriz final memmap en disco local (más rápido)
-    Matriz_Intensidad_memmap = np.memmap(os.path.join(base_path, 'temp_Matriz_Final.dat'), 
-                                        dtype=np.int16, mode='w+', shape=(filas_finales, columnas_finales))
-    
-    # Concatenar por chunks optimizado
-    print("Copiando Y_H1 y Y_H2 a matriz final...")
-    chunk_concatenacion = 1500  # Chunks optimizados
-    for i in range(0, filas_finales, chunk_concatenacion):
-        fin_fila = min(i + chunk_concatenacion, filas_finales)
-        # Operación vectorizada de concatenación
-        Matriz_Intensidad_memmap[i:fin_fila, :N_esperado] = Y_H1_memmap[i:fin_fila, :]
-        Matriz_Intensidad_memmap[i:fin_fila, N_esperado:] = Y_H2_memmap[i:fin_fila, :]
-        
-        # Progreso cada 100 chunks
-        if (i // chunk_concatenacion + 1) % 100 == 0:
-            progreso_concat = (fin_fila / filas_finales) * 100
-            print(f"Concatenación: {progreso_concat:.1f}% completada")
-    
-    print(f"Concatenación exitosa: {Matriz_Intensidad_memmap.shape}")
-    
-except MemoryError:
-    print("Error: No hay suficiente memoria para crear la matriz concatenada.")
-    raise
-
-# Guardar la matriz de intensidad final
-print(f"\n=== GUARDADO DE RESULTADO ===")
-
-try:
-    # Uso directo de np.save con memmap - más eficiente
-    archivo_final = os.path.join(base_path, 'Matriz_Intensidad.npy')
-    print(f"Guardando en: {archivo_final}")
-    
-    # NumPy puede manejar memmap directamente
-    np.save(archivo_final, Matriz_Intensidad_memmap)
-    
-    # Verificación de guardado
-    if os.path.exists(archivo_final):
-        tamaño_archivo_mb = os.path.getsize(archivo_final) / (1024**2)
-        print(f"Archivo guardado: {tamaño_archivo_mb:.2f} MB")
-    else:
-        raise FileNotFoundError("El archivo no se guardó correctamente")
-        
-except Exception as e:
-    print(f"Error al guardar: {e}")
-    raise
-
-# Limpiar archivos temporales
-print(f"\n=== LIMPIEZA DE ARCHIVOS TEMPORALES ===")
-try:
-    # Lista de archivos temporales a eliminar
-    temp_files = [
-        os.path.join(temp_path, 'temp_Y_H1.dat'),
-        os.path.join(temp_path, 'temp_Y_H2.dat'),
-        os.path.join(base_path, 'temp_Matriz_Final.dat')
-    ]
-    
-    for temp_file in temp_files:
-        if os.path.exists(temp_file):
-            os.remove(temp_file)
-            print(f"Archivo temporal eliminado: {os.path.basename(temp_file)}")
-    
-    print("Limpieza completada")
-except Exception as e:
-    print(f"Advertencia: No se pudieron eliminar archivos temporales: {e}")
+    I1 = H1_chunk[:, :1].astype(np.int16)
+    I1_min, I1_max, I1_suma = min(I1_min, I1.min()), max(I1_max, I1.max()), I1_suma + int(I1.sum())
+
+    # Aplicar fórmula vectorizada: Y = 2 * I^p - I^1, directamente en el buffer del bloque
+    np.multiply(H1_chunk, 2, out=Y[:, :N_esperado], dtype=np.int16)
+    np.multiply(H2_chunk, 2, out=Y[:, N_esperado:], dtype=np.int16)
+    Y -= I1
+
+    # Escrituras secuenciales: el bloque ocupa un rango contiguo de cada archivo
+    if Y_salida is not None:
+        Y_salida.escribir(inicio, Y)
+    if D_salida is not None:
+        np.subtract(Y[:, :N_esperado], Y[:, N_esperado:], out=D_chunk[:filas])
+        D_salida.escribir(inicio, D_chunk[:filas])
+
+    # Mostrar progreso cada 10%
+    if i % max(1, num_chunks // 10) == 0 or i == num_chunks - 1:
+        progreso = fin / M_esperado * 100
+        print(f"Progreso: {progreso:.1f}% completado ({i+1}/{num_chunks}) - {time.time() - inicio_tiempo:.1f}s")
+
+print(lector.resumen())
+print(f"I1 estadísticas: min={I1_min}, max={I1_max}, media={I1_suma / M_esperado:.2f}")
+del lector, Y_chunk, D_chunk  # Liberar buffers
+
+for salida in (Y_salida, D_salida):
+    if salida is not None:
+        salida.cerrar()  # Vuelca los datos y escribe la cabecera con los checksums
+del Y_salida, D_salida
 
 # Estadísticas finales con muestreo eficiente
 print("\n=== ESTADÍSTICAS FINALES ===")
 try:
-    # Cargar con mmap para verificación final eficiente
-    archivo_final = os.path.join(base_path, 'Matriz_Intensidad.npy')
-    matriz_final = np.load(archivo_final, mmap_mode='r')
-    
-    print(f"Matriz final verificada: {matriz_final.shape}, {matriz_final.dtype}")
-    
-    # Muestreo estratificado eficiente - diferentes zonas de la matriz
-    filas_total, cols_total = matriz_final.shape
-    # Tomar muestras de 3 regiones (centro y esquinas)
-    regiones = [
-        (0, 0, 50, 50),  # Superior izquierda
-        (filas_total//2-25, cols_total//2-25, 50, 50),  # Centro
-        (filas_total-50, cols_total-50, 50, 50)  # Inferior derecha
-    ]
-    
-    print("Verificación por muestreo:")
-    for i, (fila_ini, col_ini, filas, cols) in enumerate(regiones):
-        muestra_region = matriz_final[fila_ini:fila_ini+filas, col_ini:col_ini+cols]
-        print(f"  Región {i+1}: rango=[{muestra_region.min()}, {muestra_region.max()}]")
-    
+    if Generar_Matriz_Final:
+        matriz_final = abrir_matriz(Path_Matriz_Final)
+        print(f"Matriz final verificada: {matriz_final.shape}, {matriz_final.dtype}")
+
+        # Muestreo estratificado eficiente - diferentes zonas de la matriz
+        filas_total, cols_total = matriz_final.shape
+        # Tomar muestras de 3 regiones (centro y esquinas)
+        regiones = [
+            (0, 0, 50, 50),  # Superior izquierda
+            (filas_total//2-25, cols_total//2-25, 50, 50),  # Centro
+            (filas_total-50, cols_total-50, 50, 50)  # Inferior derecha
+        ]
+
+        print("Verificación por muestreo:")
+        for i, (fila_ini, col_ini, filas, cols) in enumerate(regiones):
+            muestra_region = matriz_final[fila_ini:fila_ini+filas, col_ini:col_ini+cols]
+            print(f"  Región {i+1}: rango=[{muestra_region.min()}, {muestra_region.max()}]")
+
+    if Generar_Matriz_Diferencia:
+        # D debe ser par (2*(S_H1 - S_H2)) y estar en [-510, 510]
+        matriz_D = abrir_matriz(Path_Matriz_Diferencia)
+        muestra = matriz_D[::1000, ::64]
+        print(f"Matriz diferencia verificada: {matriz_D.shape}, {matriz_D.dtype}")
+        print(f"  Rango (muestreo): [{muestra.min()}, {muestra.max()}]")
+        print(f"  Valores impares: {np.count_nonzero(muestra % 2)} (deben ser 0)")
+        if muestra.min() < -510 or muestra.max() > 510:
+            print("ADVERTENCIA: valores fuera de [-510, 510], revisar speckles H1/H2")
+
 except Exception as e:
     print(f"Error en estadísticas finales: {e}")
 
 print(f"\nPROCESO COMPLETADO EXITOSAMENTE")
-print(f"Matriz de intensidad guardada en: {os.path.join(base_path, 'Matriz_Intensidad.npy')}")
+if Generar_Matriz_Final:
+    print(f"Matriz de intensidad guardada en: {Path_Matriz_Final} (Modo_Matriz = 'completa')")
+if Generar_Matriz_Diferencia:
+    print(f"Matriz diferencia guardada en: {Path_Matriz_Diferencia} (Modo_Matriz = 'diferencia')")
+print(f"Uso: abrir_matriz(ruta) (Contenedor_Matriz.py; la cabecera describe forma, tipo y parámetros)")
 tiempo_final = time.time()
 tiempo_total = tiempo_final - inicio_tiempo
 print(f"Tiempo total de procesamiento: {tiempo_total:.1f} segundos ({tiempo_total/60:.1f} minutos)")
-
-
@@ -0,0 +1,110 @@
+import cv2
+import json
+import numpy as np
+import os
+import time
+from Reconstruccion import listar_speckles, cargar_speckles, normalizar_uint8
+from Vista_Previa import VistaPreviaAdquisicion
+
+'''
+Vistas previas de 8×8, 16×16 y 32×32 mientras Orquesta.py captura los speckles de H1.
+
+Con Orden_Patrones = 'muñeca_rusa' los primeros 64, 256 y 1024 patrones son bases completas de
+esas resoluciones (Ordenes_Hadamard.py). Este script sigue la carpeta de captura, incorpora cada
+speckle nuevo a VistaPreviaAdquisicion (Vista_Previa.py, sin guardar la matriz) y, al completarse
+un nivel, reconstruye el speckle de prueba (output_dir/prueba/, capturado por Orquesta.py antes de
+los patrones) y guarda la vista previa. Así se ve a los pocos segundos si la fibra, el enfoque o la
+exposición son correctos, y se puede detener la captura (una tecla en Orquesta.py) sin esperar
+a los 8192 patrones.
+
+Indicadores por nivel:
+- potencia relativa: media de cada speckle de H1 frente a la de I1. Cada patrón (salvo el 0)
+  enciende la mitad de los bloques, así que debería quedarse cerca de 0.5; si se aleja, la fuente
+  o el acoplamiento a la fibra derivan durante la captura
+- fracción de píxeles saturados (255) en los speckles recibidos
+'''
+
+print("=== VISTAS PREVIAS DURANTE LA ADQUISICIÓN ===")
+
+# === Configuración ===
+Carpeta_Adquisicion = "Speckles_Reconstruir"  # output_dir de Orquesta.py
+Carpeta_Prueba = os.path.join(Carpeta_Adquisicion, 'prueba')
+Carpeta_Vistas = os.path.join(Carpeta_Adquisicion, 'vista_previa')
+Niveles = (3, 4, 5)        # Vistas previas de 2^k × 2^k: 8×8, 16×16 y 32×32
+shape_img = (1024, 1280)   # (alto, ancho) de los speckles
+Tamano_Vista = 256         # Lado de las PNG guardadas (ampliación sin interpolación)
+Intervalo_Sondeo = 0.5     # Segundos entre revisiones de la carpeta
+Espera_Maxima = 60         # Segundos sin speckles nuevos antes de terminar
+
+os.makedirs(Carpeta_Vistas, exist_ok=True)
+
+# Patrones en orden de adquisición (Orquesta.py escribe el JSON antes de proyectar)
+ruta_patrones = os.path.join(Carpeta_Adquisicion, 'patrones_hadamard.json')
+while not os.path.exists(ruta_patrones):
+    print(f"Esperando {ruta_patrones}...")
+    time.sleep(Intervalo_Sondeo)
+with open(ruta_patrones) as f:
+    adquisicion = json.load(f)
+pattern_size = adquisicion['pattern_size']
+patrones = np.asarray(adquisicion['patrones'])
+print(f"Adquisición: {len(patrones)} patrones H1 de {pattern_size}×{pattern_size}, orden '{adquisicion['orden']}'")
+if adquisicion['orden'] != 'muñeca_rusa':
+    print("ADVERTENCIA: con este orden los niveles solo se completan al final de la captura")
+# Cuadro de captura de cada patrón H1 (con H1 y H2 intercalados, 'programa' de Orquesta.py)
+programa = np.asarray(adquisicion.get('programa', [[0, k] for k in range(len(patrones))]))
+cuadros_H1 = np.flatnonzero(programa[:, 0] == 0)
+if (programa[cuadros_H1, 1] != np.arange(len(patrones))).any():
+    raise ValueError("El programa no captura los patrones H1 en orden")
+
+rutas_prueba = listar_speckles(Carpeta_Prueba)
+nombres_prueba = [os.path.splitext(os.path.basename(ruta))[0] for ruta in rutas_prueba]
+vista = VistaPreviaAdquisicion(cargar_speckles(rutas_prueba, shape_img), patrones, pattern_size)
+print(f"Speckles de prueba: {nombres_prueba}")
+
+Niveles = sorted(k for k in Niveles if 2 ** k <= pattern_size)
+pendientes = list(Niveles)
+saturados = 0
+potencia = []  # Media de cada speckle / media de I1
+ultimo_total = -1
+inicio = time.time()
+ultimo_nuevo = time.time()
+
+while pendientes and vista.recibidos < len(patrones):
+    archivos = sorted(f for f in os.listdir(Carpeta_Adquisicion) if f.startswith('frame_') and f.endswith('.png'))
+    # El último archivo puede estar escribiéndose: solo se lee si la carpeta no cambió desde la revisión anterior
+    disponibles = len(archivos) if len(archivos) == ultimo_total else len(archivos) - 1
+    ultimo_total = len(archivos)
+    while vista.recibidos < len(patrones) and cuadros_H1[vista.recibidos] < disponibles:
+        archivo = archivos[cuadros_H1[vista.recibidos]]
+        img = cv2.imread(os.path.join(Carpeta_Adquisicion, archivo), cv2.IMREAD_GRAYSCALE)
+        if img is None:
+            break  # Archivo incompleto: se reintenta en la siguiente revisión
+        if img.shape != shape_img:
+            raise ValueError(f"{archivo} tiene dimensiones {img.shape}, se esperaba {shape_img}")
+        saturados += np.count_nonzero(img == 255)
+        potencia.append(img.mean())
+        ultimo_nuevo = time.time()
+        for k in vista.agregar(img.ravel()):
+            if k not in pendientes:
+                continue
+            pendientes.remove(k)
+            lado = 2 ** k
+            imagenes = vista.imagen(k)
+            previas = normalizar_uint8(imagenes.reshape(lado * lado, -1), (lado, lado))
+            for nombre, previa in zip(nombres_prueba, previas):
+                ampliada = cv2.resize(previa, (Tamano_Vista, Tamano_Vista), interpolation=cv2.INTER_NEAREST)
+                cv2.imwrite(os.path.join(Carpeta_Vistas, f"{nombre}_{lado}x{lado}.png"), ampliada)
+            relativa = np.asarray(potencia[1:]) / max(potencia[0], 1e-30)
+            print(f"Vista previa {lado}×{lado} tras {vista.recibidos} patrones ({time.time() - inicio:.1f}s): "
+                  f"potencia relativa "
+                  f"{relativa.min():.3f}-{relativa.max():.3f}, "
+                  f"saturados {saturados / (vista.recibidos * img.size) * 100:.2f}%")
+    if time.time() - ultimo_nuevo > Espera_Maxima:
+        print(f"Sin speckles nuevos en {Espera_Maxima}s: fin del seguimiento")
+        break
+    time.sleep(Intervalo_Sondeo)
+
+print(f"\n=== SEGUIMIENTO TERMINADO ===")
+print(f"Patrones recibidos: {vista.recibidos}/{len(patrones)}")
+print(f"Niveles sin completar: {[f'{2**k}×{2**k}' for k in pendientes] or 'ninguno'}")
+print(f"Vistas previas en: {Carpeta_Vistas}")
@@ -0,0 +1,171 @@
+import numpy as np
+from scipy.sparse.linalg import LinearOperator
+
+'''
+Operadores estructurados para la matriz de patrones X = [H, -H] proyectada en el DMD.
+
+Cada columna de X es una columna de la matriz de Sylvester H (N×N, N = pattern_size²)
+reorganizada como un cuadrado pattern_size×pattern_size, escalada por repetición de
+píxeles y centrada en el lienzo del DMD (misma construcción que
+Vectorizacion_Patrones_Hadamard.py). Por eso no hace falta materializar X^T en disco
+(8192 × 1310720 int8 ≈ 10 GB):
+
+    X^T · I_out = [H·b, -H·b]     donde b[k] = suma de I_out sobre el bloque k del área activa
+    X · v       = expandir(H · (v[:N] - v[N:]))
+
+y H·b se calcula con una transformada rápida de Walsh–Hadamard en O(N log N).
+'''
+
+
+def fwht(a):
+    '''
+    Transformada rápida de Walsh–Hadamard (orden natural de Sylvester, sin normalizar)
+    a lo largo del eje 0. Equivale a scipy.linalg.hadamard(n) @ a.
+
+    Parámetros:
+    - a: array (n,) o (n, B) con n potencia de dos.
+
+    Retorna:
+    - array float64 con la misma forma que `a`.
+    '''
+    a = np.array(a, dtype=np.float64)   # Copia de trabajo en float64 para no perder precisión en las sumas
+    n = a.shape[0]
+    if n == 0 or (n & (n - 1)) != 0:
+        raise ValueError(f"La longitud de la transformada debe ser potencia de dos, se recibió {n}")
+    resto = a.shape[1:]
+    h = 1
+    while h < n:
+        # Mariposas de tamaño h: pares (x, y) separados h posiciones → (x + y, x - y)
+        a = a.reshape((n // (2 * h), 2, h) + resto)
+        x = a[:, 0].copy()
+        a[:, 0] += a[:, 1]
+        a[:, 1] = x - a[:, 1]
+        h *= 2
+    return a.reshape((n,) + resto)
+
+
+class HadamardOperator(LinearOperator):
+    '''
+    Operador lineal implícito para X = [H, -H] ∈ {-1, 0, 1}^(M×2N) sin archivo en disco.
+
+    - rmatvec(I_out) = X^T · I_out (correlación c del paso 3 de la reconstrucción)
+    - matvec(v)      = X · v       (síntesis de un patrón en el plano del DMD)
+
+    Parámetros:
+    - pattern_size: int
+        Tamaño del patrón base (64 → N = 4096 patrones por conjunto).
+    - DMD_size: (ancho, alto)
+        Resolución del lienzo vectorizado (1280×1024 → M = 1310720).
+    '''
+
+    def __init__(self, pattern_size=64, DMD_size=(1280, 1024), dtype=np.float32):
+        ancho, alto = DMD_size
+        self.pattern_size = pattern_size
+        self.DMD_size = DMD_size
+        self.N = pattern_size ** 2                              # Patrones por conjunto (H1 o H2)
+        self.M = ancho * alto                                   # Píxeles del lienzo
+        self.scale = min(DMD_size) // pattern_size              # 16x escalado
+        self.scaled_size = pattern_size * self.scale            # 1024 píxeles escalados
+        self.offset_x = (ancho - self.scaled_size) // 2         # 128 offset horizontal
+        self.offset_y = (alto - self.scaled_size) // 2          # 0 offset vertical
+        if self.scale < 1:
+            raise ValueError("El patrón es más grande que el área del DMD.")
+        if (self.N & (self.N - 1)) != 0:
+            raise ValueError(f"pattern_size²={self.N} debe ser potencia de dos (matriz de Sylvester)")
+        super().__init__(dtype=np.dtype(dtype), shape=(self.M, 2 * self.N))
+
+    def suma_bloques(self, I):
+        '''
+        Suma I (M,) o (M, B) sobre cada bloque scale×scale del área activa.
+        Retorna (N, B) en float64, con los bloques en el orden C del patrón base.
+        '''
+        I = np.asarray(I).reshape(self.M, -1)
+        ancho, alto = self.DMD_size
+        n, s = self.pattern_size, self.scale
+        activa = I.reshape(alto, ancho, -1)[self.offset_y:self.offset_y + self.scaled_size,
+                                            self.offset_x:self.offset_x + self.scaled_size]
+        return activa.reshape(n, s, n, s, -1).sum(axis=(1, 3), dtype=np.float64).reshape(self.N, -1)
+
+    def expandir(self, w):
+        '''
+        Inversa estructural de suma_bloques: escala (N, B) por repetición de píxeles y lo
+        centra en el lienzo del DMD. Retorna (M, B) con ceros en el relleno.
+        '''
+        w = np.asarray(w).reshape(self.N, -1)
+        B = w.shape[1]
+        ancho, alto = self.DMD_size
+        n, s = self.pattern_size, self.scale
+        lienzo = np.zeros((alto, ancho, B), dtype=self.dtype)
+        bloques = w.reshape(n, 1, n, 1, B)
+        lienzo[self.offset_y:self.offset_y + self.scaled_size,
+               self.offset_x:self.offset_x + self.scaled_size] = \
+            np.broadcast_to(bloques, (n, s, n, s, B)).reshape(self.scaled_size, self.scaled_size, B)
+        return lienzo.reshape(self.M, B)
+
+    def _rmatmat(self, I):
+        c_H = fwht(self.suma_bloques(I))        # H^T · b = H · b (Sylvester es simétrica)
+        return np.concatenate([c_H, -c_H]).astype(self.dtype)
+
+    def _matmat(self, V):
+        V = np.asarray(V, dtype=np.float64).reshape(2 * self.N, -1)
+        return self.expandir(fwht(V[:self.N] - V[self.N:]))
+
+    def _rmatvec(self, I):
+        return self._rmatmat(np.reshape(I, (-1, 1))).ravel()
+
+    def _matvec(self, v):
+        return self._matmat(np.reshape(v, (-1, 1))).ravel()
+
+    def _adjoint(self):
+        return _HadamardOperatorTranspuesto(self)
+
+    _transpose = _adjoint
+
+    def patron(self, i):
+        '''
+        Fila i de X^T construida explícitamente como int8 (±1 en el área activa, 0 en el relleno).
+        Solo para verificación: reproduce make_hadamard_pattern_optimized.
+        '''
+        signo = 1 if i < self.N else -1
+        e = np.zeros((self.N, 1))
+        e[i % self.N] = signo
+        return self.expandir(fwht(e)).astype(np.int8).ravel()
+
+    def verificar(self, n_muestras=4, semilla=0):
+        '''
+        Compara rmatvec contra el producto explícito con n_muestras patrones aleatorios.
+        Retorna el error relativo máximo.
+        '''
+        rng = np.random.default_rng(semilla)
+        I = rng.integers(0, 256, size=self.M).astype(np.float32)
+        c = self.rmatvec(I)
+        error = 0.0
+        for i in rng.choice(2 * self.N, size=n_muestras, replace=False):
+            exacto = float(self.patron(i).astype(np.float64) @ I)
+            error = max(error, abs(float(c[i]) - exacto) / max(1.0, abs(exacto)))
+        return error
+
+
+class _HadamardOperatorTranspuesto(LinearOperator):
+    '''X^T como operador: intercambia matvec y rmatvec de HadamardOperator.'''
+
+    def __init__(self, X):
+        self.X = X
+        super().__init__(dtype=X.dtype, shape=(X.shape[1], X.shape[0]))
+
+    def _matvec(self, x):
+        return self.X._rmatvec(x)
+
+    def _rmatvec(self, x):
+        return self.X._matvec(x)
+
+    def _matmat(self, x):
+        return self.X._rmatmat(x)
+
+    def _rmatmat(self, x):
+        return self.X._matmat(x)
+
+    def _adjoint(self):
+        return self.X
+
+    _transpose = _adjoint
@@ -0,0 +1,358 @@
+import numpy as np
+import time
+from concurrent.futures import ThreadPoolExecutor
+from Contenedor_Matriz import abrir_matriz, MatrizTeselada
+from Lector_Chunks import LectorChunks
+from Kernel_Producto import producto_entero
+
+'''
+Operadores por chunks de filas para la matriz de intensidad Y ∈ ℤ^(M×2N).
+
+Todas las variantes exponen la misma interfaz: `producto(C)` calcula Y @ C recorriendo
+los memmaps por bloques de filas, de modo que la reconstrucción no depende de cómo está
+almacenada Y en disco:
+
+- IntensityMatrix:  Y = [Y_H1 | Y_H2] materializada (Matriz_Intensidad.fcm, M × 2N int16)
+- DifferenceMatrix: D = Y_H1 - Y_H2 (Matriz_Diferencia.fcm, M × N int16).
+  Como X = [H, -H], siempre c[N:] = -c[:N] y por tanto Y @ c = D @ c[:N]:
+  se leen la mitad de bytes por reconstrucción.
+- LazyIntensityMatrix: Y calculada al vuelo desde los speckles uint8 (speckles_H*_vectorizados.fcm).
+  Como Y_Hp = 2·S_p - I1·1^T, Y @ c = 2·(S_H1 @ c[:N] + S_H2 @ c[N:]) - I1·sum(c):
+  no hacen falta los archivos int16 y se leen 1 byte por elemento en lugar de 2.
+- LowRankIntensityMatrix: aproximación de rango k (US · V^T) de Y o de D (Compresion_SVD.py).
+  Y @ C = US @ (V^T @ C): se leen M × k float32 en lugar de M × N o M × 2N enteros.
+
+`producto` recorre las filas con LectorChunks: el chunk k+1 se lee de disco en un hilo de fondo
+mientras se multiplica el chunk k. Los bloques se mantienen en su tipo entero y se multiplican con
+producto_entero (Kernel_Producto.py), que escribe directamente en las filas de la salida sin
+crear una copia float32 de cada chunk.
+
+`producto_seleccion(C, filas)` calcula solo un subconjunto de filas (región de interés,
+submuestreo): con memmaps se leen únicamente las páginas de esas filas, así que el coste es
+proporcional a los píxeles pedidos; con teselas ('T') se leen las bandas de teselas que tocan.
+
+abrir_operador(modo, rutas) construye el operador de un modo por nombre (Reconstructor, servidor).
+'''
+
+
+def _leer_filas(matriz, filas):
+    '''Filas `filas` (índices crecientes) de un memmap, array o MatrizTeselada como array contiguo.'''
+    if filas[-1] - filas[0] + 1 == len(filas):
+        return np.ascontiguousarray(matriz[filas[0]:filas[-1] + 1])
+    if isinstance(matriz, MatrizTeselada):
+        # Las teselas se leen enteras: una lectura por banda de teselas, luego se eligen las filas
+        cortes = np.flatnonzero(np.diff(filas // matriz.tesela[0])) + 1
+        out = np.empty((len(filas), matriz.shape[1]), dtype=matriz.dtype)
+        inicio = 0
+        for grupo in np.split(filas, cortes):
+            out[inicio:inicio + len(grupo)] = matriz.leer_filas(grupo[0], grupo[-1] + 1)[grupo - grupo[0]]
+            inicio += len(grupo)
+        return out
+    return np.asarray(matriz[filas])  # Memmap: solo se tocan las páginas de esas filas
+
+
+class _OperadorIntensidadBase:
+    '''
+    Base común: guarda los memmaps (todos con M filas) y recorre bloques de filas.
+    Las subclases implementan `_producto_bloque(bloques, C)` para las filas de un chunk.
+    '''
+
+    def __init__(self, matrices, N):
+        self.matrices = list(matrices)
+        self.M = self.matrices[0].shape[0]
+        self.N = N
+        self.shape = (self.M, 2 * N)        # Forma efectiva de Y (C siempre es 2N × B)
+        for matriz in self.matrices:
+            if matriz.shape[0] != self.M:
+                raise ValueError(f"Todas las matrices deben tener {self.M} filas, se recibió {matriz.shape}")
+
+    @property
+    def nbytes(self):
+        '''Bytes leídos de disco por una pasada completa sobre el operador.'''
+        return sum(matriz.nbytes for matriz in self.matrices)
+
+    @property
+    def columnas_efectivas(self):
+        '''Columnas de la matriz almacenada que representa a Y (N para D, 2N para Y).'''
+        return sum(matriz.shape[1] for matriz in self.matrices)
+
+    def memoria_por_fila(self, num_buffers=2, densas=False):
+        '''
+        Bytes de RAM por fila de chunk, desglosados para planificar_filas (Planificador_Memoria.py).
+
+        Parámetros:
+        - num_buffers: buffers del anillo de precarga (LectorChunks)
+        - densas: incluir la copia float32 de _filas_densas (producto_traspuesto, Gram, SVD)
+        '''
+        memoria = {f'bloques leídos ({num_buffers} buffers de precarga)':
+                   num_buffers * sum(matriz.shape[1] * np.dtype(matriz.dtype).itemsize for matriz in self.matrices)}
+        if densas:
+            memoria['copia float32 del chunk'] = 4 * self.columnas_efectivas
+        return memoria
+
+    def _preparar(self, C):
+        '''Transformación previa de C (2N, B) común a todos los chunks de una pasada.'''
+        return C
+
+    def _producto_bloque(self, bloques, C, out):
+        '''Escribe en `out` (filas, B) float32 las filas de Y @ C correspondientes a `bloques`.'''
+        raise NotImplementedError
+
+    def _filas_densas(self, bloques):
+        '''Filas de la matriz almacenada (Y o D) como float32 (filas, columnas_efectivas).'''
+        if len(bloques) == 1:
+            return bloques[0].astype(np.float32, copy=False)
+        return np.hstack([bloque.astype(np.float32, copy=False) for bloque in bloques])
+
+    def producto_filas(self, C, inicio, fin):
+        '''Filas [inicio, fin) de Y @ C, con C de forma (2N, B). Retorna (fin-inicio, B) float32.'''
+        C = self._preparar(np.asarray(C, dtype=np.float32).reshape(2 * self.N, -1))
+        out = np.empty((fin - inicio, C.shape[1]), dtype=np.float32)
+        self._producto_bloque([np.ascontiguousarray(matriz[inicio:fin]) for matriz in self.matrices], C, out)
+        return out
+
+    def _lector(self, chunk_size, num_buffers, inicio, fin):
+        '''
+        LectorChunks de la pasada; se reutiliza entre llamadas con la misma configuración para no
+        reservar (y bloquear con mlock) el anillo de buffers en cada reconstrucción.
+        '''
+        clave = (chunk_size, num_buffers, inicio, fin, tuple(id(matriz) for matriz in self.matrices))
+        if getattr(self, '_clave_lector', None) != clave:
+            self.lector = None  # Liberar el anillo anterior antes de reservar el nuevo
+            self.lector = LectorChunks(self.matrices, chunk_size, num_buffers=num_buffers, inicio=inicio, fin=fin)
+            self._clave_lector = clave
+        return self.lector  # También guarda las estadísticas de lectura de la última pasada
+
+    def producto(self, C, chunk_size=32768, out=None, progreso=True, num_buffers=2, inicio=0, fin=None):
+        '''
+        Y @ C por chunks de filas, con lectura anticipada (LectorChunks).
+
+        Parámetros:
+        - C: array (2N,) o (2N, B)
+        - chunk_size: filas leídas por chunk
+        - out: array (M, B) float32 opcional donde escribir el resultado
+        - progreso: imprime avance cada 10% y el ancho de banda de lectura al final
+        - num_buffers: buffers del anillo de precarga (2 = doble buffer)
+        - inicio, fin: rango de filas a calcular (solo se escriben out[inicio:fin]; Producto_Paralelo.py)
+
+        Retorna:
+        - array (M, B) float32
+        '''
+        C = self._preparar(np.asarray(C, dtype=np.float32).reshape(2 * self.N, -1))
+        if out is None:
+            out = np.empty((self.M, C.shape[1]), dtype=np.float32)
+        lector = self._lector(chunk_size, num_buffers, inicio, fin)
+        num_chunks = len(lector)
+        inicio_tiempo = time.time()
+        for chunk_idx, (inicio_chunk, fin_chunk, bloques) in enumerate(lector):
+            try:
+                self._producto_bloque(bloques, C, out[inicio_chunk:fin_chunk])
+            except Exception as e:
+                raise RuntimeError(f"Error procesando chunk reconstrucción {chunk_idx}: {e}")
+            if progreso and (chunk_idx % max(1, num_chunks // 10) == 0 or chunk_idx == num_chunks - 1):
+                avance = (chunk_idx + 1) / num_chunks * 100
+                print(f"Reconstrucción: {avance:.1f}% ({fin_chunk:,}/{self.M:,} píxeles) - {time.time() - inicio_tiempo:.1f}s")
+        if progreso:
+            print(lector.resumen())
+        return out
+
+    def producto_seleccion(self, C, filas, chunk_size=32768, out=None):
+        '''
+        Filas `filas` de Y @ C (región de interés o submuestreo), leyendo solo esas filas.
+
+        Parámetros:
+        - C: array (2N,) o (2N, B)
+        - filas: índices de fila crecientes
+        - chunk_size: filas seleccionadas por grupo de lectura (el grupo k+1 se lee en un hilo
+          mientras se multiplica el k)
+        - out: array (len(filas), B) float32 opcional
+
+        Retorna:
+        - array (len(filas), B) float32
+        '''
+        C = self._preparar(np.asarray(C, dtype=np.float32).reshape(2 * self.N, -1))
+        filas = np.asarray(filas, dtype=np.int64)
+        if out is None:
+            out = np.empty((len(filas), C.shape[1]), dtype=np.float32)
+        grupos = [filas[i:i + chunk_size] for i in range(0, len(filas), chunk_size)]
+
+        def leer(grupo):
+            return [_leer_filas(matriz, grupo) for matriz in self.matrices]
+
+        with ThreadPoolExecutor(max_workers=1) as lector:
+            siguiente = lector.submit(leer, grupos[0]) if grupos else None
+            for k, grupo in enumerate(grupos):
+                bloques = siguiente.result()
+                if k + 1 < len(grupos):
+                    siguiente = lector.submit(leer, grupos[k + 1])
+                self._producto_bloque(bloques, C, out[k * chunk_size:k * chunk_size + len(grupo)])
+        return out
+
+    def producto_traspuesto(self, I, chunk_size=16384, progreso=True):
+        '''
+        A^T @ I por chunks de filas, con A la matriz almacenada (Y, o D en modo diferencia).
+
+        Parámetros:
+        - I: array (M,) o (M, B)
+
+        Retorna:
+        - array (columnas_efectivas, B) float64
+        '''
+        I = np.asarray(I, dtype=np.float32).reshape(self.M, -1)
+        out = np.zeros((self.columnas_efectivas, I.shape[1]), dtype=np.float64)
+        lector = LectorChunks(self.matrices, chunk_size)
+        for inicio, fin, bloques in lector:
+            out += self._filas_densas(bloques).T @ I[inicio:fin]
+        if progreso:
+            print(f"Producto traspuesto: {lector.resumen()}")
+        return out
+
+
+class IntensityMatrix(_OperadorIntensidadBase):
+    '''
+    Y = [Y_H1 | Y_H2] materializada, forma (M, 2N) int16.
+
+    Parámetros:
+    - fuente: ruta (.fcm, .npy o .dat) o array (M, 2N)
+    - shape: forma esperada (obligatoria solo para un .dat plano)
+    '''
+
+    def __init__(self, fuente, shape=None, dtype=np.int16):
+        Y = abrir_matriz(fuente, shape, dtype)
+        if Y.shape[1] % 2 != 0:
+            raise ValueError(f"Y debe tener 2N columnas, se recibió {Y.shape}")
+        super().__init__([Y], Y.shape[1] // 2)
+
+    def _producto_bloque(self, bloques, C, out):
+        producto_entero(bloques[0], C, out)
+
+
+class DifferenceMatrix(_OperadorIntensidadBase):
+    '''
+    D = Y_H1 - Y_H2, forma (M, N) int16. Aplica Y @ c = D @ c[:N] (válido porque c[N:] = -c[:N]).
+
+    Parámetros:
+    - fuente: ruta (.fcm, .npy o .dat) o array (M, N)
+    - shape: forma esperada (obligatoria solo para un .dat plano)
+    '''
+
+    def __init__(self, fuente, shape=None, dtype=np.int16):
+        D = abrir_matriz(fuente, shape, dtype)
+        super().__init__([D], D.shape[1])
+
+    def _producto_bloque(self, bloques, C, out):
+        producto_entero(bloques[0], C[:self.N], out)
+
+
+class LazyIntensityMatrix(_OperadorIntensidadBase):
+    '''
+    Y = [2·S_H1 - I1 | 2·S_H2 - I1] sin materializar, a partir de los speckles uint8 (M × N cada uno).
+
+    I1 es la columna 0 de S_H1 (speckle del patrón all-ones); se toma del propio chunk de filas,
+    así que nunca se recorre la columna completa del archivo (acceso con stride de N bytes).
+
+    Parámetros:
+    - fuente_H1, fuente_H2: rutas a speckles_H*_vectorizados.fcm (o .npy) o arrays (M, N) uint8
+    '''
+
+    def __init__(self, fuente_H1, fuente_H2):
+        S_H1 = abrir_matriz(fuente_H1)
+        S_H2 = abrir_matriz(fuente_H2)
+        if S_H1.shape != S_H2.shape:
+            raise ValueError(f"S_H1 {S_H1.shape} y S_H2 {S_H2.shape} deben tener la misma forma")
+        super().__init__([S_H1, S_H2], S_H1.shape[1])
+
+    def _producto_bloque(self, bloques, C, out):
+        S_H1, S_H2 = bloques
+        I1 = S_H1[:, :1].astype(np.float32)                         # (filas, 1)
+        producto_entero(S_H1, C[:self.N], out)
+        producto_entero(S_H2, C[self.N:], out, acumular=True)
+        out *= 2
+        out -= I1 * C.sum(axis=0, keepdims=True)                    # I1 · sum(c) por columna de C
+
+    def _filas_densas(self, bloques):
+        S_H1, S_H2 = bloques
+        I1 = S_H1[:, :1].astype(np.float32)
+        filas = np.empty((S_H1.shape[0], 2 * self.N), dtype=np.float32)
+        np.multiply(S_H1, np.float32(2), out=filas[:, :self.N], casting='unsafe')
+        np.multiply(S_H2, np.float32(2), out=filas[:, self.N:], casting='unsafe')
+        filas -= I1
+        return filas
+
+
+class LowRankIntensityMatrix(_OperadorIntensidadBase):
+    '''
+    Aproximación de rango k de la matriz almacenada: Y ≈ US · V^T (o D ≈ US · V^T).
+
+    US (M × k) y V (n × k) son los factores float32 que escribe Compresion_SVD.py, con las
+    columnas ordenadas por valor singular decreciente. Si n = N los factores aproximan D y se
+    usa C[:N] (Y @ c = D @ c[:N]); si n = 2N aproximan Y completa.
+
+    Parámetros:
+    - fuente_US, fuente_V: rutas a los .npy (o arrays)
+    - N: patrones por conjunto (4096)
+    - rango: columnas a usar (≤ k guardado); permite cambiar fidelidad por latencia sin recalcular
+    '''
+
+    def __init__(self, fuente_US, fuente_V, N=4096, rango=None):
+        US = np.load(fuente_US, mmap_mode='r') if isinstance(fuente_US, str) else fuente_US
+        V = np.load(fuente_V) if isinstance(fuente_V, str) else np.asarray(fuente_V)
+        if US.shape[1] != V.shape[1]:
+            raise ValueError(f"US {US.shape} y V {V.shape} deben tener el mismo rango")
+        if V.shape[0] not in (N, 2 * N):
+            raise ValueError(f"V debe tener N={N} o 2N={2 * N} filas, se recibió {V.shape}")
+        rango = US.shape[1] if rango is None else rango
+        if not 0 < rango <= US.shape[1]:
+            raise ValueError(f"rango debe estar en [1, {US.shape[1]}], se recibió {rango}")
+        self.rango = rango
+        self.V = np.ascontiguousarray(V[:, :rango], dtype=np.float32)
+        super().__init__([US[:, :rango] if rango < US.shape[1] else US], N)
+
+    @property
+    def columnas_efectivas(self):
+        return self.V.shape[0]
+
+    def _preparar(self, C):
+        # P = V^T @ C (k × B), una sola vez por pasada; los chunks solo hacen US_chunk @ P
+        return self.V.T @ (C[:self.N] if self.V.shape[0] == self.N else C)
+
+    def _producto_bloque(self, bloques, P, out):
+        producto_entero(bloques[0], P, out)
+
+    def _filas_densas(self, bloques):
+        return bloques[0] @ self.V.T
+
+    def producto_traspuesto(self, I, chunk_size=65536, progreso=True):
+        # (US V^T)^T I = V (US^T I): la pasada solo lee US
+        I = np.asarray(I, dtype=np.float32).reshape(self.M, -1)
+        P = np.zeros((self.rango, I.shape[1]), dtype=np.float64)
+        for inicio, fin, (US_chunk,) in LectorChunks(self.matrices, chunk_size):
+            P += US_chunk.T @ I[inicio:fin]
+        return self.V.astype(np.float64) @ P
+
+
+def abrir_operador(modo, rutas, N=4096, M=None, rango=None):
+    '''
+    Operador de intensidad para un modo de reconstrucción.
+
+    Parámetros:
+    - modo: 'diferencia' (rutas = (D,)), 'completa' ((Y,)), 'perezosa' ((S_H1, S_H2))
+      o 'bajo_rango' ((US, V))
+    - rutas: tupla de rutas (o arrays) en el orden indicado
+    - N: patrones por conjunto
+    - M: filas esperadas (solo se valida si se indica; obligatoria para un .dat plano)
+    - rango: columnas de la SVD en modo 'bajo_rango' (None = todas)
+    '''
+    if modo == 'diferencia':
+        operador = DifferenceMatrix(rutas[0], shape=None if M is None else (M, N))
+    elif modo == 'completa':
+        operador = IntensityMatrix(rutas[0], shape=None if M is None else (M, 2 * N))
+    elif modo == 'perezosa':
+        operador = LazyIntensityMatrix(rutas[0], rutas[1])
+    elif modo == 'bajo_rango':
+        operador = LowRankIntensityMatrix(rutas[0], rutas[1], N=N, rango=rango)
+    else:
+        raise ValueError(f"modo debe ser 'diferencia', 'completa', 'perezosa' o 'bajo_rango', se recibió '{modo}'")
+    if operador.N != N or (M is not None and operador.M != M):
+        raise ValueError(f"Operador {modo} con forma {operador.shape}, se esperaba ({M or operador.M}, {2 * N})")
+    return operador
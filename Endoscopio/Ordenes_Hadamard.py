@@ -0,0 +1,166 @@
+import numpy as np
+from scipy.linalg import hadamard
+from Contenedor_Matriz import parametros_matriz
+
+'''
+Órdenes de adquisición de los patrones Hadamard para la caracterización compresiva.
+
+Con la construcción de Sylvester (H_{n²} = H_n ⊗ H_n), la columna j de H reorganizada como
+cuadrado n×n (n = pattern_size, orden C) es el producto exterior de dos funciones de Walsh 1D:
+    patrón_j[f, c] = h_{j // n}[f] · h_{j % n}[c]
+Sus cambios de signo por eje (secuencia s_f, s_c) salen de H_n sin construir los patrones, y el
+número de regiones conexas es (s_f + 1)·(s_c + 1): cada rectángulo tiene signo opuesto a sus vecinos.
+
+- 'natural': orden de Sylvester (el de Orquesta.py y Vectorizacion_Patrones_Hadamard.py)
+- 'secuencia': Walsh 2D, por secuencia total s_f + s_c (de baja a alta frecuencia espacial)
+- 'corte_pastel': "cake-cutting", por número de regiones (s_f + 1)·(s_c + 1)
+- 'muñeca_rusa': multirresolución ("Russian doll"), por nivel y dentro de cada nivel como
+  'corte_pastel'. h_i (Sylvester, n = 2^p) es constante en bloques de n/2^k muestras si y solo
+  si i es múltiplo de n/2^k, así que los primeros 4^k patrones forman una base completa de las
+  imágenes de 2^k × 2^k bloques: cada prefijo 1, 4, 16, 64... se reconstruye exactamente a esa
+  resolución (Vista_Previa.py) mientras la adquisición continúa
+
+En objetos e imágenes naturales casi toda la energía está en los patrones de baja secuencia:
+adquirir solo los primeros K de estos órdenes reduce en N/K el tiempo de proyección y el tamaño
+de las matrices de caracterización (Reconstruccion.InversionCompresiva recupera el resto).
+Los índices adquiridos viajan en la cabecera .fcm ('patrones') de los speckles a D e Y.
+
+Programa de proyección (programa_proyeccion): el orden de los 2K cuadros H1/H2 en el DMD. Dos
+patrones ±1 distintos de H son ortogonales, así que difieren exactamente en N/2 bloques; solo un
+patrón seguido de su complemento (H1_j → H2_j) voltea los N. Por eso el programa se limita a no
+poner nunca complementos seguidos. Reordenar no puede acortar la espera de asentamiento: todas
+las transiciones del programa son de N/2 bloques, justo el caso para el que se ajustó el retardo
+fijo de Orquesta.py (retardos_programa lo mantiene; solo un volteo completo, sin calibrar, puede
+llevar un retardo distinto). La ganancia del programa intercalado es la cancelación de la deriva.
+'''
+
+ORDENES = ('natural', 'secuencia', 'corte_pastel', 'muñeca_rusa')
+
+
+def secuencia_walsh(n):
+    '''Cambios de signo de cada columna de la matriz de Sylvester n × n (secuencia 1D).'''
+    return np.count_nonzero(np.diff(hadamard(n), axis=0), axis=0)
+
+
+def nivel_walsh(n):
+    '''
+    Nivel de resolución de cada columna de la matriz de Sylvester n × n: la menor k tal que la
+    columna es constante en bloques de n/2^k muestras (k = log2(n) - ceros finales del índice).
+    '''
+    indices = np.arange(n)
+    nivel = np.zeros(n, dtype=np.int64)
+    # i & -i: bit más bajo de i, es decir n/2^k con k el nivel
+    nivel[1:] = np.log2(n // (indices[1:] & -indices[1:])).astype(np.int64)
+    return nivel
+
+
+def niveles_patrones(pattern_size):
+    '''Nivel de cada patrón 2D: el patrón j pertenece a la base de 2^k × 2^k bloques si nivel[j] ≤ k.'''
+    nivel = nivel_walsh(pattern_size)
+    return np.maximum(np.repeat(nivel, pattern_size), np.tile(nivel, pattern_size))
+
+
+def orden_patrones(pattern_size, orden='corte_pastel'):
+    '''
+    Permutación de los N = pattern_size² índices de columna de H en orden de adquisición.
+    Los empates se deshacen por secuencia total y después por índice natural, así que el
+    patrón 0 (todo unos, referencia I1 de Matriz_Intensidad.py) siempre va primero.
+    '''
+    if orden not in ORDENES:
+        raise ValueError(f"orden debe ser uno de {ORDENES}, se recibió '{orden}'")
+    n = pattern_size
+    natural = np.arange(n * n)
+    if orden == 'natural':
+        return natural
+    s = secuencia_walsh(n)
+    s_f, s_c = np.repeat(s, n), np.tile(s, n)  # j = fila · n + columna
+    if orden == 'secuencia':
+        return np.lexsort((natural, np.maximum(s_f, s_c), s_f + s_c))
+    claves = (natural, s_f + s_c, (s_f + 1) * (s_c + 1))
+    if orden == 'muñeca_rusa':
+        claves += (niveles_patrones(n),)
+    return np.lexsort(claves)
+
+
+def seleccion_patrones(pattern_size, fraccion=1.0, orden='corte_pastel'):
+    '''
+    Primeros round(fraccion · N) patrones del orden indicado (al menos uno).
+
+    Retorna:
+    - array int64 con los índices de columna de H, en orden de adquisición
+    '''
+    N = pattern_size ** 2
+    if not 0 < fraccion <= 1:
+        raise ValueError(f"fraccion debe estar en (0, 1], se recibió {fraccion}")
+    return orden_patrones(pattern_size, orden)[:max(1, int(round(fraccion * N)))].astype(np.int64)
+
+
+def patrones_adquiridos(fuente, N=None):
+    '''
+    Índices de los patrones de las columnas de una matriz de caracterización (cabecera .fcm).
+    Sin el parámetro 'patrones' (adquisición completa) retorna arange(N), o None si no se indica N.
+    '''
+    patrones = parametros_matriz(fuente).get('patrones')
+    if patrones is None:
+        return None if N is None else np.arange(N)
+    return np.asarray(patrones, dtype=np.int64)
+
+
+def programa_proyeccion(K, intercalar=True):
+    '''
+    Orden de los 2K cuadros de una adquisición (K patrones por conjunto).
+
+    - intercalar=False: todos los H1 y después todos los H2 (como el Orquesta.py original)
+    - intercalar=True: H1_0, H1_1, H2_0, H1_2, H2_1, ..., H2_{K-1}. Cada H2_j se captura dos cuadros
+      después de su H1_j (nunca justo después: sería su complemento), así una deriva lenta de la
+      fuente afecta casi igual a las dos columnas y se cancela en D = S_H1 - S_H2
+
+    Retorna:
+    - array (2K, 2) int64: (conjunto, posición) de cada cuadro, con conjunto 0 = H1 y 1 = H2 y
+      posición el índice en `patrones` (columna de las matrices de speckles)
+    '''
+    posiciones = np.arange(K)
+    if not intercalar or K < 2:
+        return np.column_stack([np.repeat([0, 1], K), np.tile(posiciones, 2)])
+    programa = np.empty((2 * K, 2), dtype=np.int64)
+    programa[0] = (0, 0)
+    programa[1:-1:2, 0], programa[1:-1:2, 1] = 0, posiciones[1:]
+    programa[2:-1:2, 0], programa[2:-1:2, 1] = 1, posiciones[:-1]
+    programa[-1] = (1, K - 1)
+    return programa
+
+
+def volteos_programa(programa, patrones, pattern_size, bloque=512):
+    '''
+    Bloques del patrón que cambian entre cada cuadro del programa y el anterior, calculados sobre
+    los patrones binarios (H1 = (h + 1)/2, H2 = (1 - h)/2). El primer cuadro cuenta como volteo
+    completo (N): lo que había antes en pantalla es desconocido.
+    '''
+    N = pattern_size ** 2
+    H = hadamard(N, dtype=np.int8)
+    columnas = np.asarray(patrones, dtype=np.int64)[programa[:, 1]]
+    signos = np.where(programa[:, 0] == 0, 1, -1).astype(np.int8)
+    volteos = np.empty(len(programa), dtype=np.int64)
+    volteos[0] = N
+    for inicio in range(1, len(programa), bloque):
+        fin = min(inicio + bloque, len(programa))
+        actuales = H[:, columnas[inicio:fin]] * signos[inicio:fin]
+        previos = H[:, columnas[inicio - 1:fin - 1]] * signos[inicio - 1:fin - 1]
+        volteos[inicio:fin] = np.count_nonzero(actuales != previos, axis=0)
+    return volteos
+
+
+def retardos_programa(volteos, N, retardo_cambio, retardo_completo=None):
+    '''
+    Espera (s) antes de capturar cada cuadro del programa.
+
+    - retardo_cambio: retardo medido para un cambio entre patrones distintos (N/2 bloques), el de
+      todas las transiciones de un programa sin complementos seguidos
+    - retardo_completo: retardo de los cuadros con los N bloques volteados (el primero, o un patrón
+      seguido de su complemento); None = retardo_cambio, ya que no hay medida para ese caso
+    '''
+    volteos = np.asarray(volteos)
+    retardos = np.full(len(volteos), retardo_cambio, dtype=np.float64)
+    if retardo_completo is not None:
+        retardos[volteos == N] = retardo_completo
+    return retardos
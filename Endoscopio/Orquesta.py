@@ -3,16 +3,93 @@ from instrumental.drivers.cameras import uc480
 import imageio
 import time
 import os
+import json
+import numpy as np
+from Ordenes_Hadamard import seleccion_patrones, programa_proyeccion, volteos_programa, retardos_programa
+from Matrix_Functions import save_bitplane_frames_to_disk
+from Planos_Bits import bitplane_timing
+from Banco_Patrones import BancoPatrones
 
 # Configuración Cámara
-num_frames = 4096
-delay = 0.05  # segundos entre capturas
+# Espera antes de cada captura: retardo de asentamiento medido para un cambio de patrón (el delay
+# fijo original). Todo cambio entre patrones de Hadamard distintos voltea N/2 bloques, así que el
+# orden de proyección no permite acortarlo (Ordenes_Hadamard.py); solo una nueva medida puede
+Retardo_Cambio = 0.05
+Retardo_Volteo_Completo = None  # Cuadros con los N bloques volteados; None = Retardo_Cambio (sin medir)
 exposure_time_ms = 5  # tiempo de exposición (ms)
 gain_value = 0        # ganancia (0 a 100)
 output_dir = "Speckles_Reconstruir" #Speckles
 
+# Adquisición compresiva (Ordenes_Hadamard.py): solo los primeros Fraccion_Patrones·N patrones
+# del orden elegido ('natural', 'secuencia', 'corte_pastel' o 'muñeca_rusa'); 1.0 = caracterización completa
+Fraccion_Patrones = 1.0
+# 'muñeca_rusa': cada prefijo de 4^k patrones es una base de 2^k × 2^k, así Monitor_Adquisicion.py
+# muestra vistas previas de 8×8, 16×16 y 32×32 mientras se captura (una tecla detiene la captura)
+Orden_Patrones = 'muñeca_rusa'
+pattern_size = 64
+# Speckle de un objeto conocido capturado antes de los patrones (output_dir/prueba/) para las vistas previas
+Capturar_Prueba = True
+# H1 y H2 intercalados (H2_j dos cuadros después de H1_j): la deriva lenta se cancela en D = S_H1 - S_H2
+Intercalar_H1_H2 = True
+# Banco de patrones en un solo .fcm: sin abrir ni decodificar PNG por cuadro. Se crea una vez, antes de capturar:
+#     from Banco_Patrones import crear_banco
+#     crear_banco("D:\\Banco_Hadamard_64_1280x1024.fcm", 64, DMD_size=(1280, 1024))
+# y se indica aquí su ruta. None = carpetas de PNG folder_H1/folder_H2 (save_hadamard_patterns_to_disk)
+Ruta_Banco = None
+folder_H1 = "D:\\Hadamard_1_64_1280x1024"
+folder_H2 = "D:\\Hadamard_2_64_1280x1024"
+folder_reconstruir = "D:\\Imagenes_Reconstruir_1280x1024"
+# 'cuadros': un patrón por cuadro desde folder_H1/folder_H2 (espera retardos[index] antes de cada captura)
+# 'planos_bits': 24 patrones por cuadro RGB (Planos_Bits.pack_bitplanes) con el DMD en modo
+# "video pattern"; requiere la salida de trigger por patrón del DMD cableada a la entrada de trigger de la
+# cámara. La prueba y las imágenes a reconstruir (escala de grises) se proyectan con el DMD en modo vídeo:
+# el script se detiene para cambiar de modo antes y después de los patrones
+Modo_Proyeccion = 'cuadros'
+Planos_Por_Cuadro = 24   # Bajar si la cámara no alcanza fps_planos·Planos_Por_Cuadro imágenes/s
+fps_planos = 60
+Camara_Max_fps = None    # Imágenes/s máximas de la cámara con el recorte usado (None = sin comprobar)
+# Cuadros empaquetados generados antes de la captura (save_bitplane_frames_to_disk); se regeneran si
+# no corresponden al programa actual
+folder_planos = "D:\\Hadamard_Planos_Bits_64_1280x1024"
+# Cada cuadro de patrones va precedido de un cuadro negro: el DMD cambia de cuadro en el vsync, así que
+# la primera imagen no oscura tras las del cuadro negro es el plano 0. Se capturan hasta
+# Cuadros_Margen_Captura cuadros de planos negros antes del cuadro de patrones
+Cuadros_Margen_Captura = 2
+Fraccion_Umbral_Oscuro = 0.25  # Imagen oscura: media < negro + fracción·(blanco - negro); los patrones ≈ 0.5
+Reintentos_Cuadro = 3          # Capturas de un cuadro con planos desalineados antes de abortar
+
 # Crear carpeta si no existe
 os.makedirs(output_dir, exist_ok = True)
+
+# Índices de los patrones a proyectar, en orden de adquisición. Se guardan junto a los speckles:
+# Vectorizacion_Speckles.py los lleva a la cabecera 'patrones' de las matrices
+# El programa (conjunto, posición en `patrones`) de cada cuadro permite asignar frame_i a su columna
+patrones = seleccion_patrones(pattern_size, Fraccion_Patrones, Orden_Patrones)
+programa = programa_proyeccion(len(patrones), Intercalar_H1_H2)
+volteos = volteos_programa(programa, patrones, pattern_size)
+retardos = retardos_programa(volteos, pattern_size**2, Retardo_Cambio, Retardo_Volteo_Completo)
+with open(os.path.join(output_dir, 'patrones_hadamard.json'), 'w') as f:
+    json.dump({'pattern_size': pattern_size, 'orden': Orden_Patrones, 'fraccion': Fraccion_Patrones,
+               'patrones': patrones.tolist(), 'programa': programa.tolist()}, f)
+print(f"Patrones por conjunto: {len(patrones)} de {pattern_size**2} (orden '{Orden_Patrones}')")
+print(f"Esperas: {retardos.sum():.1f}s en total ({Retardo_Cambio * 1000:.0f} ms por cambio de patrón; "
+      f"el orden de proyección no la acorta: {int((volteos[1:] == pattern_size**2 // 2).sum())} de "
+      f"{len(programa) - 1} transiciones voltean N/2 bloques, "
+      f"{int((volteos[1:] == pattern_size**2).sum())} voltean los N)")
+
+if Modo_Proyeccion == 'planos_bits':
+    # Cuadros empaquetados antes de abrir la cámara: empaquetar y codificar PNG durante la captura no llega a fps_planos
+    columnas = patrones[programa[:, 1]]
+    signos = 1 - 2 * programa[:, 0]  # H1: +1, H2: -1
+    descripcion_planos = {'pattern_size': pattern_size, 'planos_por_cuadro': Planos_Por_Cuadro,
+                          'columnas': columnas.tolist(), 'signos': signos.tolist()}
+    ruta_descripcion = os.path.join(folder_planos, 'planos_bits.json')
+    if not os.path.exists(ruta_descripcion) or json.load(open(ruta_descripcion)) != descripcion_planos:
+        save_bitplane_frames_to_disk(pattern_size, columnas, signos, (1280, 1024), folder_planos, Planos_Por_Cuadro)
+        with open(ruta_descripcion, 'w') as f:
+            json.dump(descripcion_planos, f)
+    # Planos del cuadro sin espejos encendidos (H2 de la columna 0): la cámara los ve oscuros
+    oscuro_esperado = (columnas == 0) & (signos < 0)
 # Inicializar cámara
 cams = uc480.list_instruments()
 cam = uc480.UC480_Camera(cams[0])
@@ -30,62 +107,138 @@ cam.start_live_video(framerate = "30Hz")
 
 
 fps = 30 #Frames por segundo para la proyección
-print(f"Iniciando captura de {num_frames} imágenes en '{output_dir}/'...")
+print(f"Iniciando captura de {len(programa)} imágenes en '{output_dir}/'...")
 
 
 running = True  #Variable para poder apagar en algún momento la proyección
 index = 0       #Variable para poder iterar sobre las imágenes
 contador_frame = 0
 
-folder_path = folder_path = "D:\\Hadamard_1_64_1280x1024"
-filenames = sorted([f for f in os.listdir(folder_path) if f.endswith(".png")])  #Ji
-while running and index < len(filenames):   
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT or event.type == pygame.KEYDOWN:
-            running = False
+if Modo_Proyeccion == 'planos_bits':
+    tiempos = bitplane_timing(fps_planos, Planos_Por_Cuadro, camera_max_fps=Camara_Max_fps)
+    # Cada cuadro de patrones ocupa al menos tres cuadros de vídeo (negro, cambio en el vsync y patrones), más la
+    # lectura de la cámara: el ritmo real se mide en la captura
+    print(f"Planos de bits: {tiempos['patterns_per_second']} planos/s en el DMD, exposición {tiempos['exposure_us']:.0f} µs "
+          f"por plano; como máximo {tiempos['patterns_per_second'] // 3} patrones/s con el cuadro negro de sincronización")
 
-    # Carga imagen individual
-    path = os.path.join(folder_path, filenames[index])
-    image = pygame.image.load(path)
+if Capturar_Prueba:
+    # Primera imagen a reconstruir, fuera de la carpeta de speckles de caracterización. Imagen en escala de
+    # grises: el DMD tiene que estar en modo vídeo (también con Modo_Proyeccion = 'planos_bits')
+    os.makedirs(os.path.join(output_dir, 'prueba'), exist_ok=True)
+    nombre_prueba = sorted([f for f in os.listdir(folder_reconstruir) if f.endswith(".png")])[0]
+    screen.blit(pygame.image.load(os.path.join(folder_reconstruir, nombre_prueba)), (320,0))
+    pygame.display.flip()
+    time.sleep(0.5)
+    imageio.imwrite(os.path.join(output_dir, 'prueba', nombre_prueba), cam.grab_image(timeout="2s", copy=True))
 
-    screen.blit(image,  (320,0))
-    pygame.display.flip()   #En esta línea se proyecta la imagen en pantalla
-    
-    time.sleep(delay)
-    frame = cam.grab_image(timeout="2s", copy=True)
-    filename = os.path.join(output_dir, f"frame_{contador_frame:02d}.png")
-    imageio.imwrite(filename, frame)
-    #print(f"Imagen {contador_frame+1}/{num_frames} guardada como {filename}")
-    contador_frame+=1
-    
-    index += 1
+if Modo_Proyeccion == 'planos_bits':
+    # Cada plano de bits dispara una imagen. Superficies cargadas antes de empezar (como
+    # display_bitplane_frames_from_disk) e imágenes en RAM hasta el final: en el bucle solo se proyecta y captura
+    nombres_planos = sorted([f for f in os.listdir(folder_planos) if f.endswith(".png")])
+    superficies = [pygame.image.load(os.path.join(folder_planos, f)).convert() for f in nombres_planos]
+    input("Cambiar el DMD a modo \"video pattern\" con Planos_Por_Cuadro patrones por cuadro y pulsar Enter...")
+    cam.stop_live_video()
+    cam.exposure_time = f"{tiempos['exposure_us']:.0f}us"
+    cam.set_trigger(mode='hardware', edge='rising')
 
-folder_path = "D:\\Hadamard_1_64_1280x1024"
-index = 0
-while running and index < len(filenames):   
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT or event.type == pygame.KEYDOWN:
-            running = False
+    def capturar_cuadro(color, n_imagenes):
+        '''Media de las imágenes disparadas por el DMD con la pantalla en un color uniforme.'''
+        screen.fill(color)
+        pygame.display.flip()
+        time.sleep(2 / fps_planos)
+        cam.start_capture(n_frames=n_imagenes)
+        return float(np.mean(cam.get_captured_image(timeout="2s", copy=True)))
 
-    # Carga imagen individual
-    path = os.path.join(folder_path, filenames[index])
-    image = pygame.image.load(path)
+    # Niveles de referencia con todos los planos apagados / encendidos
+    nivel_negro = capturar_cuadro((0, 0, 0), Planos_Por_Cuadro)
+    nivel_blanco = capturar_cuadro((255, 255, 255), Planos_Por_Cuadro)
+    umbral_oscuro = nivel_negro + Fraccion_Umbral_Oscuro * (nivel_blanco - nivel_negro)
+    print(f"Niveles de referencia: negro {nivel_negro:.1f}, blanco {nivel_blanco:.1f}, umbral {umbral_oscuro:.1f}")
 
-    screen.blit(image, (320,0))
-    pygame.display.flip()   #En esta línea se proyecta la imagen en pantalla
+    imagenes_capturadas = []
+    inicio_captura = time.time()
+    for k, (inicio, superficie) in enumerate(zip(range(0, len(programa), Planos_Por_Cuadro), superficies)):
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT or event.type == pygame.KEYDOWN:
+                running = False
+        if not running:
+            break
+        planos = min(Planos_Por_Cuadro, len(programa) - inicio)
+        esperado = oscuro_esperado[inicio:inicio + planos]
+        n_captura = Cuadros_Margen_Captura * Planos_Por_Cuadro + planos
+        for intento in range(Reintentos_Cuadro):
+            # Cuadro negro completo en el DMD antes del cuadro de patrones
+            screen.fill((0, 0, 0))
+            pygame.display.flip()
+            time.sleep(2 / fps_planos)
+            screen.blit(superficie, (320,0))
+            pygame.display.flip()
+            # Armada después del flip: el DMD sigue en el cuadro negro hasta el siguiente vsync, así que
+            # las primeras imágenes son oscuras y el cuadro de patrones empieza en su plano 0
+            cam.start_capture(n_frames=n_captura)
+            imagenes = cam.get_captured_image(timeout="2s", copy=True)
+            oscuras = np.array([np.mean(imagen) < umbral_oscuro for imagen in imagenes])
+            # Planos 0 oscuros del propio cuadro (H2 de la columna 0) no cuentan como cuadro negro
+            primera = int(np.argmin(oscuras)) if not oscuras.all() else len(oscuras)
+            primera -= int(np.argmin(esperado)) if not esperado.all() else planos
+            if (len(imagenes) == n_captura and 0 < primera and primera + planos <= n_captura
+                    and (oscuras[primera:primera + planos] == esperado).all()):
+                imagenes_capturadas.extend(imagenes[primera:primera + planos])
+                break
+            print(f"Cuadro {k}: {len(imagenes)} imágenes, plano 0 en {primera}: no coincide con el programa, se repite")
+        else:
+            raise RuntimeError(f"Cuadro {k} desalineado tras {Reintentos_Cuadro} intentos: revisar el cableado del "
+                               f"trigger, Planos_Por_Cuadro en el DMD y Fraccion_Umbral_Oscuro")
+    duracion = time.time() - inicio_captura
+    print(f"{len(imagenes_capturadas)} patrones en {duracion:.1f}s ({len(imagenes_capturadas) / duracion:.0f} patrones/s)")
+    for frame in imagenes_capturadas:
+        imageio.imwrite(os.path.join(output_dir, f"frame_{contador_frame:05d}.png"), frame)
+        contador_frame += 1
+    imagenes_capturadas = None
+    # De vuelta al modo del resto de la captura (imágenes a reconstruir, un cuadro cada una)
+    cam.set_trigger(mode='software')
+    cam.exposure_time = exposure_time_ms
+    input("Cambiar el DMD a modo vídeo (escala de grises) y pulsar Enter...")
+    cam.start_live_video(framerate = "30Hz")
+else:
+    if Ruta_Banco is not None:
+        banco = BancoPatrones(Ruta_Banco)
+        filas_banco = [banco.fila(j) for j in patrones]  # Falla antes de proyectar si falta algún patrón
+        posicion_banco = banco.posicion((320, 0))
+        screen.fill((0, 0, 0))  # El banco solo redibuja la región del patrón
+    else:
+        # Nombres hadamard_{j:04}.png: índice de columna j de H
+        filenames = {0: sorted([f for f in os.listdir(folder_H1) if f.endswith(".png")]),
+                     1: sorted([f for f in os.listdir(folder_H2) if f.endswith(".png")])}
+        carpetas = {0: folder_H1, 1: folder_H2}
+    while running and index < len(programa):
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT or event.type == pygame.KEYDOWN:
+                running = False
+
+        conjunto, posicion = programa[index]
+        if Ruta_Banco is not None:
+            # Desempaquetado desde el memmap del banco, sin abrir archivos
+            screen.blit(banco.superficie(filas_banco[posicion], conjunto), posicion_banco)
+        else:
+            # Carga imagen individual
+            path = os.path.join(carpetas[conjunto], filenames[conjunto][patrones[posicion]])
+            image = pygame.image.load(path)
+            screen.blit(image,  (320,0))
+        pygame.display.flip()   #En esta línea se proyecta la imagen en pantalla
     
-    time.sleep(delay)
-    frame = cam.grab_image(timeout="2s", copy=True)
-    filename = os.path.join(output_dir, f"frame_{contador_frame:02d}.png")
-    imageio.imwrite(filename, frame)
-    #print(f"Imagen {contador_frame+1}/{num_frames} guardada como {filename}")
-    contador_frame+=1
+        time.sleep(retardos[index])
+        frame = cam.grab_image(timeout="2s", copy=True)
+        filename = os.path.join(output_dir, f"frame_{contador_frame:05d}.png")  # Orden de sorted() = orden de captura
+        imageio.imwrite(filename, frame)
+        #print(f"Imagen {contador_frame+1}/{len(programa)} guardada como {filename}")
+        contador_frame+=1
     
-    index += 1
+        index += 1
 
 
 #   Proyectar Imágenes para reconstruir  
-folder_path = "D:\\Imagenes_Reconstruir_1280x1024"
+folder_path = folder_reconstruir
 filenames = sorted([f for f in os.listdir(folder_path) if f.endswith(".png")])
 index = 0
 while running and index < len(filenames):   
@@ -102,9 +255,9 @@ while running and index < len(filenames):
     
     time.sleep(0.5)
     frame = cam.grab_image(timeout="2s", copy=True)
-    filename = os.path.join(output_dir, f"frame_{contador_frame:02d}.png")
+    filename = os.path.join(output_dir, f"frame_{contador_frame:05d}.png")
     imageio.imwrite(filename, frame)
-    #print(f"Imagen {contador_frame+1}/{num_frames} guardada como {filename}")
+    #print(f"Imagen {contador_frame+1} guardada como {filename}")
     contador_frame+=1
     
     index += 1    
@@ -0,0 +1,174 @@
+import os
+
+'''
+Planificador de memoria compartido por las etapas fuera de memoria.
+
+Los tamaños de chunk eran constantes ajustadas a mano para una máquina de 7.6 GB. Aquí cada
+etapa describe cuánta RAM necesita por fila de chunk (buffers de precarga en el tipo de disco,
+copias float32 temporales, buffers de salida) y cuánta fija (lotes, Gram, ...), y
+planificar_filas elige el chunk más grande que cabe en el presupuesto:
+
+    chunk_filas = planificar_filas('Reconstrucción', M, por_fila={...}, fijos={...}, multiplo=4096)
+
+Presupuesto (presupuesto_memoria), por orden de prioridad:
+1. `memoria_gb` explícito (p. ej. Memoria_GB en la configuración de cada script)
+2. variable de entorno ENDOSCOPIO_MEMORIA_GB
+3. FRACCION_PRESUPUESTO de la memoria disponible: el mínimo entre MemAvailable y el margen del
+   cgroup (límite - uso, sin contar la caché de páginas reclamable), para contenedores y colas.
+El plan elegido se imprime desglosado, de modo que el mismo código se adapta a un portátil de
+8 GB o a un servidor de 256 GB y queda registrado qué usó cada ejecución.
+'''
+
+FRACCION_PRESUPUESTO = 0.5   # Fracción de la memoria disponible usada por defecto
+VARIABLE_ENTORNO = 'ENDOSCOPIO_MEMORIA_GB'
+MEMORIA_POR_DEFECTO = 2 * 1024**3  # Si no se puede leer la memoria del sistema
+_SIN_LIMITE = 1 << 60              # Los cgroups sin límite informan valores ~2^63
+
+
+def _leer_entero(ruta):
+    try:
+        with open(ruta) as f:
+            texto = f.read().strip()
+    except OSError:
+        return None
+    if texto == 'max':
+        return None
+    try:
+        valor = int(texto)
+    except ValueError:
+        return None
+    return None if valor >= _SIN_LIMITE else valor
+
+
+def _leer_clave(ruta, clave):
+    '''Valor de `clave` en un archivo "clave valor" (memory.stat) o "Clave: valor kB" (/proc/meminfo).'''
+    try:
+        with open(ruta) as f:
+            for linea in f:
+                partes = linea.replace(':', ' ').split()
+                if partes and partes[0] == clave:
+                    return int(partes[1]) * (1024 if partes[-1] == 'kB' else 1)
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def _directorios_cgroup():
+    '''Directorios candidatos del cgroup de memoria del proceso: (versión, ruta), del propio al raíz.'''
+    candidatos = []
+    try:
+        with open('/proc/self/cgroup') as f:
+            for linea in f:
+                jerarquia, controladores, ruta = linea.rstrip('\n').split(':', 2)
+                if controladores == '' and jerarquia == '0':
+                    candidatos.append((2, os.path.join('/sys/fs/cgroup', ruta.lstrip('/'))))
+                elif 'memory' in controladores.split(','):
+                    candidatos.append((1, os.path.join('/sys/fs/cgroup/memory', ruta.lstrip('/'))))
+    except OSError:
+        pass
+    # Dentro de un contenedor el cgroup propio suele verse como la raíz del punto de montaje
+    candidatos += [(2, '/sys/fs/cgroup'), (1, '/sys/fs/cgroup/memory')]
+    return candidatos
+
+
+def _margen_cgroup():
+    '''Bytes que el cgroup de memoria aún permite (None si no hay límite o no se puede leer).'''
+    for version, directorio in _directorios_cgroup():
+        if version == 2:
+            limite = _leer_entero(os.path.join(directorio, 'memory.max'))
+            uso = _leer_entero(os.path.join(directorio, 'memory.current'))
+            cache = _leer_clave(os.path.join(directorio, 'memory.stat'), 'inactive_file')
+        else:
+            limite = _leer_entero(os.path.join(directorio, 'memory.limit_in_bytes'))
+            uso = _leer_entero(os.path.join(directorio, 'memory.usage_in_bytes'))
+            cache = _leer_clave(os.path.join(directorio, 'memory.stat'), 'total_inactive_file')
+        if limite is not None and uso is not None:
+            return max(0, limite - uso + (cache or 0))
+    return None
+
+
+def memoria_disponible():
+    '''
+    Memoria disponible para el proceso en bytes y su origen.
+
+    Retorna:
+    - (bytes, descripción): mínimo entre MemAvailable y el margen del cgroup
+    '''
+    fuentes = []
+    disponible = _leer_clave('/proc/meminfo', 'MemAvailable')
+    if disponible is None:
+        try:
+            disponible = os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+        except (ValueError, OSError, AttributeError):
+            disponible = None
+    if disponible is not None:
+        fuentes.append((disponible, 'MemAvailable'))
+    margen = _margen_cgroup()
+    if margen is not None:
+        fuentes.append((margen, 'límite del cgroup'))
+    if not fuentes:
+        return MEMORIA_POR_DEFECTO, 'valor por defecto (memoria del sistema no disponible)'
+    return min(fuentes)
+
+
+def presupuesto_memoria(memoria_gb=None, fraccion=FRACCION_PRESUPUESTO):
+    '''
+    Presupuesto de RAM en bytes y su origen: `memoria_gb`, ENDOSCOPIO_MEMORIA_GB o
+    `fraccion` de la memoria disponible.
+    '''
+    if memoria_gb is not None:
+        return int(memoria_gb * 1024**3), 'configuración'
+    entorno = os.environ.get(VARIABLE_ENTORNO)
+    if entorno:
+        try:
+            return int(float(entorno) * 1024**3), VARIABLE_ENTORNO
+        except ValueError:
+            raise ValueError(f"{VARIABLE_ENTORNO} debe ser un número de GB, se recibió '{entorno}'")
+    disponible, origen = memoria_disponible()
+    return int(disponible * fraccion), f"{fraccion:.0%} de {disponible / 1024**3:.1f} GB ({origen})"
+
+
+def planificar_filas(etapa, filas_total, por_fila, fijos=None, multiplo=1, memoria_gb=None,
+                     minimo=None, progreso=True):
+    '''
+    Filas por chunk que caben en el presupuesto de memoria.
+
+    Parámetros:
+    - etapa: nombre para el registro del plan
+    - filas_total: filas de la matriz recorrida (el chunk nunca es mayor)
+    - por_fila: dict {descripción: bytes por fila de chunk} (buffers, copias float32, salidas)
+    - fijos: dict {descripción: bytes} independientes del chunk (lotes, Gram, ...)
+    - multiplo: alineación del chunk (p. ej. alto de tesela); se respeta salvo si el chunk es la matriz entera
+    - memoria_gb: presupuesto explícito (None = presupuesto_memoria())
+    - minimo: filas mínimas por chunk aunque se exceda el presupuesto (por defecto `multiplo`)
+
+    Retorna:
+    - chunk_filas (int)
+    '''
+    if filas_total < 1:
+        raise ValueError(f"[{etapa}] la matriz no tiene filas que recorrer (filas_total = {filas_total})")
+    fijos = fijos or {}
+    presupuesto, origen = presupuesto_memoria(memoria_gb)
+    bytes_fila = max(1, int(sum(por_fila.values())))
+    bytes_fijos = int(sum(fijos.values()))
+    minimo = max(1, minimo or multiplo)
+
+    filas = max(0, presupuesto - bytes_fijos) // bytes_fila
+    if filas >= filas_total:
+        filas = filas_total
+    else:
+        filas = max(minimo, filas - filas % multiplo)
+        filas = min(filas, filas_total)
+    num_chunks = -(-filas_total // filas)
+    total = bytes_fijos + filas * bytes_fila
+
+    if progreso:
+        print(f"Plan de memoria [{etapa}]: presupuesto {presupuesto / 1024**3:.2f} GB ({origen})")
+        for descripcion, valor in por_fila.items():
+            print(f"  - {descripcion}: {valor * filas / 1024**2:.1f} MB ({valor:,.0f} B/fila)")
+        for descripcion, valor in fijos.items():
+            print(f"  - {descripcion}: {valor / 1024**2:.1f} MB (fijo)")
+        print(f"  → chunk de {filas:,} filas ({num_chunks} chunks), {total / 1024**3:.2f} GB en total")
+        if total > presupuesto:
+            print(f"  Advertencia: el chunk mínimo ({minimo:,} filas) excede el presupuesto")
+    return int(filas)
@@ -0,0 +1,145 @@
+import numpy as np
+from Operadores_Hadamard import HadamardOperator, fwht
+
+'''
+Patrones de Hadamard empaquetados en planos de bits para el modo "video pattern" del DMD:
+cada cuadro RGB de 24 bits lleva 24 patrones binarios, que el DMD muestra en secuencia.
+
+Solo numpy: generar, empaquetar y desempaquetar cuadros no necesita pantalla. Proyectar y
+guardar los cuadros (pygame, imageio) queda en Matrix_Functions.py, que reexporta estas funciones.
+'''
+
+# Orden de los planos de bits en un cuadro RGB de 24 bits en modo "video pattern" del DMD
+# (DLPC350/LightCrafter: planos 0-7 en verde, 8-15 en rojo, 16-23 en azul, bit menos significativo primero)
+BITPLANE_CHANNEL_ORDER = 'GRB'
+
+def hadamard_binary_patterns(pattern_size, columns, signs=None):
+    """
+    Patrones binarios (espejo encendido = True) de varias columnas de la matriz de Hadamard,
+    sin construir la matriz N²×N²: como HadamardOperator.patron, la columna j es la FWHT del
+    vector unitario e_j (con su signo), reorganizada como cuadrado n×n (como pattern_adapt).
+
+    Parámetros:
+    - pattern_size: int
+        Tamaño n del patrón cuadrado (ej. 64).
+    - columns: lista de int
+        Índices de columna de la matriz de Hadamard de orden n².
+    - signs: lista de ±1 o None
+        +1 para H1 ((H + 1)/2) y -1 para H2 ((1 - H)/2); None = todos H1.
+
+    Retorna:
+    - array bool (len(columns), n, n)
+    """
+    columns = np.asarray(columns, dtype=np.int64)
+    signs = np.ones(len(columns)) if signs is None else np.asarray(signs, dtype=np.float64)
+    unit_vectors = np.zeros((pattern_size ** 2, len(columns)))
+    unit_vectors[columns, np.arange(len(columns))] = signs
+    return fwht(unit_vectors).T.reshape(len(columns), pattern_size, pattern_size) > 0
+
+def embed_binary_patterns(patterns, target_size=(1280, 1024)):
+    """
+    Escala por repetición de píxeles y centra en un lienzo negro de `target_size` = (ancho, alto)
+    un bloque de patrones binarios (K, n, n), con la misma geometría que la reconstrucción
+    (HadamardOperator.expandir).
+
+    Retorna:
+    - array bool (K, alto, ancho)
+    """
+    patterns = np.asarray(patterns, dtype=np.int8)
+    K, n = len(patterns), patterns.shape[-1]
+    target_width, target_height = target_size
+    operator = HadamardOperator(n, tuple(target_size), dtype=np.int8)
+    canvas = operator.expandir(patterns.reshape(K, n * n).T)  # (M, K), ceros en el relleno
+    return canvas.T.reshape(K, target_height, target_width) > 0
+
+def pack_bitplanes(planes, channel_order=BITPLANE_CHANNEL_ORDER):
+    """
+    Empaqueta hasta 24 patrones binarios en un cuadro RGB de 24 bits: el DMD en modo
+    "video pattern" muestra cada plano de bits como un patrón binario independiente, así que
+    un cuadro de vídeo a 60 Hz lleva 24 patrones en lugar de uno.
+
+    Parámetros:
+    - planes: array (K, alto, ancho) bool o 0/255, K ≤ 24, en orden de proyección
+    - channel_order: canales que reciben los planos 0-7, 8-15 y 16-23 (ej. 'GRB')
+
+    Retorna:
+    - array uint8 (alto, ancho, 3) en orden RGB; los planos que faltan quedan en cero
+    """
+    planes = np.asarray(planes)
+    if len(planes) > 24:
+        raise ValueError(f"Un cuadro RGB de 24 bits admite 24 planos, se recibieron {len(planes)}")
+    # Un byte por grupo de 8 planos, bit b del grupo g = plano 8·g + b (bit 0 = primer plano del canal).
+    # Desplazamientos sobre planos contiguos: np.packbits sobre un eje que no es el último es mucho más lento
+    groups = np.zeros((3,) + planes.shape[1:], dtype=np.uint8)
+    plane_bytes = np.empty(planes.shape[1:], dtype=np.uint8)
+    for index, plane in enumerate(planes):
+        bits = (plane if plane.dtype == bool else plane > 0).view(np.uint8)
+        np.left_shift(bits, index % 8, out=plane_bytes)
+        groups[index // 8] |= plane_bytes
+    frame = np.empty(planes.shape[1:] + (3,), dtype=np.uint8)
+    for group, channel in enumerate(channel_order):
+        frame[..., 'RGB'.index(channel)] = groups[group]
+    return frame
+
+def unpack_bitplanes(frame, count=24, channel_order=BITPLANE_CHANNEL_ORDER):
+    """
+    Inversa de pack_bitplanes: recupera los `count` primeros patrones binarios de un cuadro RGB.
+
+    Retorna:
+    - array bool (count, alto, ancho)
+    """
+    frame = np.asarray(frame, dtype=np.uint8)
+    shifts = np.arange(8, dtype=np.uint8)[:, None, None]
+    planes = [(frame[..., 'RGB'.index(channel)][None] >> shifts) & 1 for channel in channel_order]
+    return np.concatenate(planes).astype(bool)[:count]
+
+def bitplane_timing(fps=60, planes_per_frame=24, dark_time_us=105, camera_max_fps=None):
+    """
+    Tiempos de cámara por plano de bits: el periodo de cuadro (1/fps) se reparte entre los planos,
+    y cada plano queda estable el periodo del plano menos el tiempo oscuro del DMD (espejos en
+    tránsito). La cámara debe ir disparada por el DMD (salida de trigger), una imagen por plano.
+
+    Parámetros:
+    - fps: cuadros de vídeo por segundo enviados al DMD
+    - planes_per_frame: planos usados por cuadro (≤ 24)
+    - dark_time_us: tiempo oscuro entre planos (µs)
+    - camera_max_fps: imágenes por segundo máximas de la cámara (None = sin comprobar)
+
+    Retorna:
+    - dict con periodo y exposición por plano (µs), desfases de disparo de cada plano dentro del
+      cuadro (µs), patrones por segundo y la ganancia frente a un patrón por cuadro
+    """
+    if not 1 <= planes_per_frame <= 24:
+        raise ValueError(f"planes_per_frame debe estar entre 1 y 24, se recibió {planes_per_frame}")
+    period_us = 1e6 / (fps * planes_per_frame)
+    exposure_us = period_us - dark_time_us
+    if exposure_us <= 0:
+        raise ValueError(f"Tiempo oscuro de {dark_time_us} µs mayor que el periodo del plano ({period_us:.1f} µs)")
+    patterns_per_second = fps * planes_per_frame
+    if camera_max_fps is not None and patterns_per_second > camera_max_fps:
+        raise ValueError(f"La cámara admite {camera_max_fps} imágenes/s y se necesitan {patterns_per_second}: "
+                         f"usar planes_per_frame ≤ {int(camera_max_fps // fps)} o bajar fps")
+    return {
+        'period_us': period_us,
+        'exposure_us': exposure_us,
+        'trigger_offsets_us': dark_time_us + period_us * np.arange(planes_per_frame),
+        'patterns_per_second': patterns_per_second,
+        'speedup': planes_per_frame,
+    }
+
+def pack_hadamard_frames(pattern_size, columns, signs=None, target_size=(1280, 1024), planes_per_frame=24):
+    """
+    Genera los cuadros RGB empaquetados de una secuencia de patrones de Hadamard, de
+    `planes_per_frame` en `planes_per_frame` (el último cuadro puede ir incompleto).
+    Generador: solo hay un cuadro de patrones en memoria a la vez.
+
+    Parámetros:
+    - columns, signs: como hadamard_binary_patterns, en orden de proyección
+    - target_size: (ancho, alto) del lienzo
+    """
+    columns = np.asarray(columns, dtype=np.int64)
+    signs = np.ones(len(columns), dtype=np.int8) if signs is None else np.asarray(signs, dtype=np.int8)
+    for start in range(0, len(columns), planes_per_frame):
+        end = start + planes_per_frame
+        patterns = hadamard_binary_patterns(pattern_size, columns[start:end], signs[start:end])
+        yield pack_bitplanes(embed_binary_patterns(patterns, target_size))
@@ -0,0 +1,221 @@
+import numpy as np
+import multiprocessing
+import os
+import queue
+import time
+import traceback
+from multiprocessing import shared_memory
+
+'''
+Reconstrucción Y @ C repartida por filas entre procesos, con C e I_rec en memoria compartida.
+
+En un solo proceso el producto solo escala por los hilos de numba/BLAS dentro de cada chunk, y
+un GEMV sobre enteros está limitado por el ancho de banda de un hilo de lectura y un socket de
+memoria. ProductoParalelo divide las M filas del operador en franjas contiguas, una por proceso:
+
+    with ProductoParalelo(Operador_Intensidad, num_procesos=8, B_maximo=32) as paralelo:
+        I_rec = paralelo.producto(C)      # misma interfaz que operador.producto
+
+- C (2N × B) se copia una vez en un segmento de multiprocessing.shared_memory que leen todos.
+- Cada proceso recorre su franja con su propio LectorChunks (lectura anticipada y madvise sobre
+  su rango): varias colas de lectura en paralelo sobre el disco.
+- Cada proceso escribe sus filas directamente en I_rec (M × B), otro segmento compartido: no hay
+  copia ni serialización de resultados, solo un mensaje por proceso al terminar.
+- Los procesos se crean una vez (fork) y atienden todas las pasadas: los memmaps del operador se
+  heredan sin copiarse. Con fork los scripts de configuración no se vuelven a ejecutar en los
+  hijos (spawn o forkserver reimportarían el script principal entero, que en esta cadena es
+  configuración y cálculo a nivel de módulo).
+- Restricción de orden: fork solo es seguro antes de que numba arranque su capa de hilos (TBB u
+  OpenMP no sobreviven a un fork: el proceso se queda colgado). La capa arranca con el primer
+  kernel paralelo del proceso, p. ej. operador.producto con ≤ UMBRAL_COLUMNAS_KERNEL columnas
+  (Kernel_Producto.py) o una transposición de Transposicion.py. ProductoParalelo debe crearse
+  antes de cualquiera de ellos; si la capa ya está activa, el constructor lanza RuntimeError en
+  vez de colgarse.
+- Cada proceso limita sus hilos de numba (y de BLAS con threadpoolctl, si está instalado) a
+  núcleos / num_procesos para no sobresuscribir la máquina.
+
+`producto` copia el resultado de la memoria compartida a `out` (o a un array nuevo): una copia de
+M × B float32 frente a varios GB leídos de disco, y el resultado sigue siendo válido después de
+`cerrar()`, que desmapea los segmentos.
+'''
+
+try:
+    import numba
+    NUMBA_DISPONIBLE = True
+except ImportError:
+    NUMBA_DISPONIBLE = False
+
+try:
+    from threadpoolctl import threadpool_limits
+    THREADPOOLCTL_DISPONIBLE = True
+except ImportError:
+    THREADPOOLCTL_DISPONIBLE = False
+
+
+def _comprobar_fork():
+    '''RuntimeError si numba ya arrancó su capa de hilos en este proceso (fork no es seguro).'''
+    if not NUMBA_DISPONIBLE:
+        return
+    try:
+        capa = numba.threading_layer()
+    except ValueError:
+        return  # Capa sin inicializar: ningún kernel paralelo se ha ejecutado todavía
+    raise RuntimeError(f"La capa de hilos de numba ('{capa}') ya está activa en este proceso y no sobrevive a "
+                       f"un fork: crear ProductoParalelo antes de cualquier producto con ≤ 8 columnas "
+                       f"o transposición con numba, o usar num_procesos=1")
+
+
+def _repartir_filas(M, num_procesos, alineacion=1):
+    '''Franjas contiguas [inicio, fin) de M filas, alineadas a `alineacion` (p. ej. alto de tesela).'''
+    paso = -(-M // num_procesos)
+    paso = -(-paso // alineacion) * alineacion
+    return [(inicio, min(inicio + paso, M)) for inicio in range(0, M, paso)]
+
+
+def _trabajador(operador, C_plana, I_plana, inicio, fin, chunk_size, num_buffers, hilos, ordenes, resultados):
+    '''Bucle de un proceso: por cada orden B calcula I[inicio:fin, :B] = Y[inicio:fin] @ C[:, :B].'''
+    if NUMBA_DISPONIBLE:
+        numba.set_num_threads(min(hilos, numba.config.NUMBA_NUM_THREADS))
+    if THREADPOOLCTL_DISPONIBLE:
+        threadpool_limits(hilos)
+    filas_C = 2 * operador.N
+    while True:
+        B = ordenes.get()
+        if B is None:
+            break
+        try:
+            t0 = time.time()
+            C = C_plana[:filas_C * B].reshape(filas_C, B)
+            I = I_plana[:operador.M * B].reshape(operador.M, B)
+            operador.producto(C, chunk_size=chunk_size, out=I, progreso=False, num_buffers=num_buffers,
+                              inicio=inicio, fin=fin)
+            lector = operador.lector
+            resultados.put((inicio, fin, {'tiempo': time.time() - t0, 'bytes': lector.bytes_leidos,
+                                          'lectura': lector.tiempo_lectura, 'espera': lector.tiempo_espera}))
+        except Exception:
+            resultados.put((inicio, fin, traceback.format_exc()))
+
+
+class ProductoParalelo:
+    '''
+    Y @ C con las filas de `operador` repartidas entre procesos y C, I_rec en memoria compartida.
+
+    Parámetros:
+    - operador: cualquier operador de Operadores_Intensidad.py
+    - num_procesos: procesos de trabajo (por defecto, núcleos disponibles)
+    - B_maximo: columnas máximas de C por pasada (tamaño de los segmentos compartidos)
+    - chunk_size: filas por chunk dentro de cada proceso
+    - num_buffers: buffers de precarga por proceso
+    - alineacion: las franjas empiezan en múltiplos de este número de filas (alto de tesela)
+
+    Debe crearse antes del primer kernel paralelo de numba del proceso (ver el docstring del módulo).
+    '''
+
+    def __init__(self, operador, num_procesos=None, B_maximo=32, chunk_size=16384, num_buffers=2, alineacion=1):
+        _comprobar_fork()
+        self.operador = operador
+        self.B_maximo = B_maximo
+        num_procesos = num_procesos or os.cpu_count() or 1
+        self.franjas = _repartir_filas(operador.M, num_procesos, alineacion)
+        self.num_procesos = len(self.franjas)
+        hilos = max(1, (os.cpu_count() or 1) // self.num_procesos)
+
+        # Segmentos compartidos: C (2N × B_maximo) e I_rec (M × B_maximo) float32, usados como
+        # arrays planos para que la vista (filas, B) de cada pasada sea contigua
+        self._memoria = [shared_memory.SharedMemory(create=True, size=filas * B_maximo * 4)
+                         for filas in (2 * operador.N, operador.M)]
+        self._C = np.ndarray(2 * operador.N * B_maximo, dtype=np.float32, buffer=self._memoria[0].buf)
+        self._I = np.ndarray(operador.M * B_maximo, dtype=np.float32, buffer=self._memoria[1].buf)
+
+        contexto = multiprocessing.get_context('fork')
+        self._resultados = contexto.Queue()
+        self._ordenes = []
+        self._procesos = []
+        for inicio, fin in self.franjas:
+            ordenes = contexto.Queue()
+            proceso = contexto.Process(target=_trabajador, daemon=True,
+                                       args=(operador, self._C, self._I, inicio, fin, chunk_size,
+                                             num_buffers, hilos, ordenes, self._resultados))
+            proceso.start()
+            self._ordenes.append(ordenes)
+            self._procesos.append(proceso)
+        self.estadisticas = []  # Por proceso, de la última pasada
+
+    def producto(self, C, out=None, progreso=True):
+        '''
+        Y @ C repartido entre los procesos.
+
+        Parámetros:
+        - C: array (2N,) o (2N, B) con B ≤ B_maximo
+        - out: array (M, B) float32 opcional donde copiar el resultado
+        - progreso: imprime cada franja terminada y el ancho de banda agregado
+
+        Retorna:
+        - array (M, B) float32
+        '''
+        if not self._procesos:
+            raise RuntimeError("ProductoParalelo ya está cerrado")
+        C = np.asarray(C, dtype=np.float32).reshape(2 * self.operador.N, -1)
+        B = C.shape[1]
+        if B > self.B_maximo:
+            raise ValueError(f"C tiene {B} columnas, el máximo reservado es B_maximo={self.B_maximo}")
+        self._C[:C.size].reshape(C.shape)[:] = C
+
+        inicio_tiempo = time.time()
+        for ordenes in self._ordenes:
+            ordenes.put(B)
+        self.estadisticas = []
+        errores = []
+        for terminados in range(1, self.num_procesos + 1):
+            inicio, fin, resultado = self._esperar_resultado()
+            if isinstance(resultado, str):
+                errores.append(f"Filas [{inicio}, {fin}):\n{resultado}")
+                continue
+            self.estadisticas.append(resultado)
+            if progreso:
+                print(f"Reconstrucción: franja [{inicio:,}, {fin:,}) lista ({terminados}/{self.num_procesos}) - "
+                      f"{time.time() - inicio_tiempo:.1f}s")
+        if errores:
+            raise RuntimeError("Error en los procesos de reconstrucción:\n" + "\n".join(errores))
+        if progreso:
+            print(self.resumen(time.time() - inicio_tiempo))
+        resultado = self._I[:self.operador.M * B].reshape(self.operador.M, B)
+        if out is None:
+            return resultado.copy()
+        np.copyto(out, resultado)
+        return out
+
+    def _esperar_resultado(self):
+        '''Siguiente resultado de la cola, sin quedarse bloqueado si un proceso muere (p. ej. OOM).'''
+        while True:
+            try:
+                return self._resultados.get(timeout=1.0)
+            except queue.Empty:
+                muertos = [franja for franja, proceso in zip(self.franjas, self._procesos) if not proceso.is_alive()]
+                if muertos:
+                    raise RuntimeError(f"Procesos de reconstrucción terminados inesperadamente (franjas {muertos})")
+
+    def resumen(self, tiempo):
+        leidos = sum(e['bytes'] for e in self.estadisticas)
+        espera = max((e['espera'] for e in self.estadisticas), default=0.0)
+        return (f"Lectura: {leidos / (1024**3):.2f} GB en {tiempo:.1f}s con {self.num_procesos} procesos "
+                f"({leidos / max(tiempo, 1e-9) / (1024**2):.0f} MB/s agregados), espera máxima por disco: {espera:.1f}s")
+
+    def cerrar(self):
+        '''Termina los procesos y libera los segmentos de memoria compartida.'''
+        for ordenes in self._ordenes:
+            ordenes.put(None)
+        for proceso in self._procesos:
+            proceso.join()
+        self._procesos, self._ordenes = [], []
+        self._C = self._I = None  # Soltar las vistas antes de cerrar los segmentos
+        for memoria in self._memoria:
+            memoria.close()
+            memoria.unlink()
+        self._memoria = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.cerrar()
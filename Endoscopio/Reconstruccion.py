@@ -0,0 +1,631 @@
+import numpy as np
+import cv2
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from scipy.linalg import cho_factor, cho_solve
+from Lector_Chunks import LectorChunks
+from Mascara import cargar_indices, dispersar, filas_de_pixeles
+from Operadores_Hadamard import HadamardOperator
+from Operadores_Intensidad import abrir_operador
+from Planificador_Memoria import planificar_filas, presupuesto_memoria
+from Producto_Paralelo import ProductoParalelo
+from Ordenes_Hadamard import patrones_adquiridos
+from Recuperacion_Dispersa import fista_hadamard
+
+'''
+Funciones de reconstrucción reutilizables (ver Reconstruccion_Imagen_Sin_RVITM.py).
+
+El modo por lotes apila B speckles en una matriz I_out (M × B):
+    C     = X^T · I_out            (2N × B, una FWHT por columna)
+    I_rec = (1/(2N)) · Y @ C       (M × B, GEMM por chunks de filas)
+de modo que B imágenes cuestan una sola pasada por la matriz de intensidad en disco.
+
+InversionTikhonov es un motor alternativo al filtro adaptado (1/(2N))·Y·c: resuelve
+    a = argmin ||Y a - I_out||² + λ ||a||²  →  (G + λI) a = Y^T I_out,  G = Y^T Y
+e imagen = X a (plano del DMD). G (n × n) se calcula una vez y se guarda en disco; después
+cada lote cuesta una pasada Y^T y una resolución triangular con el Cholesky en caché.
+
+InversionCompresiva extiende a Tikhonov para caracterizaciones con solo K < N patrones
+(Ordenes_Hadamard.py): los K coeficientes medidos se completan con una recuperación dispersa
+(Recuperacion_Dispersa.py) que usa la FWHT como operador de medida.
+
+Reconstructor reúne todo lo anterior en un objeto que abre la calibración una sola vez y
+reconstruye desde código (arrays, iterables o rutas) sin preparación por llamada.
+
+Cada fila de Y es un píxel de salida: una región de interés o una vista submuestreada
+(seleccion_pixeles) solo necesita esas filas, y su coste es proporcional a los píxeles pedidos.
+Reconstructor.progresivo lo usa para dar primero una vista previa y refinarla por bandas.
+'''
+
+
+def listar_speckles(fuente, extension='.png'):
+    '''
+    Normaliza la entrada del modo por lotes a una lista ordenada de rutas.
+
+    Parámetros:
+    - fuente: ruta a una imagen, a un directorio con imágenes, o lista de rutas.
+    '''
+    if isinstance(fuente, (list, tuple)):
+        rutas = list(fuente)
+    elif os.path.isdir(fuente):
+        rutas = [os.path.join(fuente, f) for f in sorted(os.listdir(fuente)) if f.endswith(extension)]
+    else:
+        rutas = [fuente]
+    if not rutas:
+        raise FileNotFoundError(f"No se encontraron speckles ({extension}) en: {fuente}")
+    for ruta in rutas:
+        if not os.path.exists(ruta):
+            raise FileNotFoundError(f"No se encontró el speckle: {ruta}")
+    return rutas
+
+
+def cargar_speckles(rutas, shape_img=(1024, 1280), out=None):
+    '''
+    Carga y vectoriza (orden C) los speckles como columnas de una matriz float32 (M × B).
+
+    Parámetros:
+    - out: array (M, B) float32 opcional donde escribirlos (buffer reutilizado)
+    '''
+    M = shape_img[0] * shape_img[1]
+    I_out = np.empty((M, len(rutas)), dtype=np.float32) if out is None else out
+    for j, ruta in enumerate(rutas):
+        img = cv2.imread(ruta, cv2.IMREAD_GRAYSCALE)
+        if img is None:
+            raise ValueError(f"No se pudo cargar el speckle: {ruta}")
+        if img.shape != tuple(shape_img):
+            raise ValueError(f"El speckle {os.path.basename(ruta)} tiene dimensiones {img.shape}, "
+                             f"se esperaba {tuple(shape_img)}")
+        I_out[:, j] = img.ravel(order='C')
+    return I_out
+
+
+def reconstruir_lote(operador, hadamard_T, I_out, chunk_size=32768, progreso=True):
+    '''
+    I_rec = (1/(2N)) · Y @ (X^T · I_out) para un lote de speckles.
+
+    Parámetros:
+    - operador: operador de intensidad (Operadores_Intensidad.py), forma efectiva (M, 2N)
+    - hadamard_T: X^T como operador (HadamardOperator(...).T)
+    - I_out: array (M, B) float32
+    - chunk_size: filas de Y por chunk
+
+    Retorna:
+    - I_rec: array (M, B) float32
+    '''
+    C = hadamard_T @ I_out                               # (2N, B)
+    I_rec = operador.producto(C, chunk_size=chunk_size, progreso=progreso)
+    I_rec *= np.float32(1.0 / operador.shape[1])         # 1/(2N)
+    return I_rec
+
+
+def normalizar_uint8(I_rec, shape_img=(1024, 1280)):
+    '''
+    Normalización min-max independiente por columna a [0, 255] y reshape a imagen.
+    Si una columna es constante se asigna gris medio (128), igual que en el script original.
+
+    Retorna:
+    - array (B, alto, ancho) uint8
+    '''
+    I_rec = np.asarray(I_rec).reshape(I_rec.shape[0], -1)
+    rec_min = I_rec.min(axis=0)
+    rec_max = I_rec.max(axis=0)
+    rango = rec_max - rec_min
+    constantes = rango == 0
+    rango[constantes] = 1
+    I_norm = ((I_rec - rec_min) / rango * 255.0).astype(np.uint8)
+    I_norm[:, constantes] = 128
+    return I_norm.T.reshape((-1,) + tuple(shape_img))
+
+
+def seleccion_pixeles(shape_img, region=None, paso=1):
+    '''
+    Píxeles (índices en orden C) de una región rectangular, opcionalmente submuestreada.
+
+    Parámetros:
+    - region: (fila_inicio, fila_fin, columna_inicio, columna_fin) o None para la imagen completa
+    - paso: entero o (paso_filas, paso_columnas); uno de cada `paso` píxeles en cada eje
+
+    Retorna:
+    - pixeles: array int64 creciente (filas de Y a calcular sin máscara)
+    - forma: (alto, ancho) de la imagen resultante
+    '''
+    alto, ancho = shape_img
+    f0, f1, c0, c1 = region if region is not None else (0, alto, 0, ancho)
+    if not (0 <= f0 < f1 <= alto and 0 <= c0 < c1 <= ancho):
+        raise ValueError(f"Región {region} fuera de la imagen {tuple(shape_img)}")
+    paso_filas, paso_columnas = (paso, paso) if np.isscalar(paso) else paso
+    if paso_filas < 1 or paso_columnas < 1:
+        raise ValueError(f"El paso debe ser ≥ 1, se recibió {paso}")
+    filas = np.arange(f0, f1, paso_filas, dtype=np.int64)
+    columnas = np.arange(c0, c1, paso_columnas, dtype=np.int64)
+    return (filas[:, None] * ancho + columnas[None, :]).ravel(), (len(filas), len(columnas))
+
+
+class InversionTikhonov:
+    '''
+    Inversión regularizada de Tikhonov sobre la matriz almacenada por un operador de intensidad.
+
+    λ es relativo: se escala por traza(G)/n (autovalor medio de G), así el mismo valor sirve para
+    Y, D o la aproximación de bajo rango. Si la matriz almacenada es D (n = N), Y a = D a' con
+    a = [a', -a'] y la imagen es X·[a'; -a'].
+
+    Parámetros:
+    - operador: operador de Operadores_Intensidad.py (cualquier modo)
+    - hadamard: HadamardOperator (X, M × 2N) para llevar los coeficientes al plano del DMD
+    - ruta_gram: .npy donde se guarda/lee G (None = no guardar)
+    - chunk_filas: filas por chunk al calcular G y A^T I_out
+    '''
+
+    def __init__(self, operador, hadamard, ruta_gram=None, chunk_filas=8192, progreso=True):
+        self.operador = operador
+        self.hadamard = hadamard
+        self.chunk_filas = chunk_filas
+        self.progreso = progreso
+        n = operador.columnas_efectivas
+        if ruta_gram is not None and os.path.exists(ruta_gram):
+            self.G = np.load(ruta_gram)
+            if self.G.shape != (n, n):
+                raise ValueError(f"Gram en caché {ruta_gram} tiene forma {self.G.shape}, se esperaba {(n, n)}")
+            if progreso:
+                print(f"Gram cargada desde caché: {ruta_gram}")
+        else:
+            self.G = self.calcular_gram()
+            if ruta_gram is not None:
+                np.save(ruta_gram, self.G)
+        self.escala = np.trace(self.G) / n   # Autovalor medio: λ_abs = λ · escala
+        self._cholesky = {}                  # λ → factor de Cholesky de (G + λ_abs I)
+        self._autovalores = None             # Descomposición G = U diag(w) U^T (barridos de λ)
+        self._autovectores = None
+
+    def calcular_gram(self):
+        '''G = A^T A por chunks de filas (A = Y o D), acumulada en float64. BLAS paraleliza cada chunk.'''
+        n = self.operador.columnas_efectivas
+        G = np.zeros((n, n), dtype=np.float64)
+        inicio_tiempo = time.time()
+        lector = LectorChunks(self.operador.matrices, self.chunk_filas)
+        num_chunks = len(lector)
+        for chunk_idx, (inicio, fin, bloques) in enumerate(lector):
+            filas = self.operador._filas_densas(bloques)
+            G += filas.T @ filas
+            if self.progreso and (chunk_idx % max(1, num_chunks // 10) == 0 or chunk_idx == num_chunks - 1):
+                print(f"Gram: {(chunk_idx + 1) / num_chunks * 100:.1f}% ({fin:,}/{self.operador.M:,} filas) - "
+                      f"{time.time() - inicio_tiempo:.1f}s")
+        if self.progreso:
+            print(lector.resumen())
+        return G
+
+    def correlacion(self, I_out):
+        '''b = A^T I_out (una pasada por la matriz almacenada para todo el lote).'''
+        return self.operador.producto_traspuesto(I_out, chunk_size=self.chunk_filas, progreso=self.progreso)
+
+    def coeficientes(self, b, lam):
+        '''a = (G + λ_abs I)^-1 b con el Cholesky en caché para λ.'''
+        if lam not in self._cholesky:
+            G_reg = self.G + lam * self.escala * np.eye(self.G.shape[0])
+            self._cholesky[lam] = cho_factor(G_reg, lower=True, overwrite_a=True)
+        return cho_solve(self._cholesky[lam], b)
+
+    def barrido(self, b, lams):
+        '''
+        Coeficientes para varios λ reutilizando una sola descomposición G = U diag(w) U^T:
+        a(λ) = U diag(1/(w + λ_abs)) U^T b, sin pasadas extra por disco.
+
+        Retorna:
+        - lista de arrays (n, B), uno por λ
+        '''
+        if self._autovalores is None:
+            self._autovalores, self._autovectores = np.linalg.eigh(self.G)
+        proyeccion = self._autovectores.T @ b
+        return [self._autovectores @ (proyeccion / (self._autovalores + lam * self.escala)[:, None])
+                for lam in lams]
+
+    def imagen(self, a):
+        '''Lleva los coeficientes al plano del DMD: X·a (M × B float32).'''
+        a = np.asarray(a).reshape(a.shape[0], -1)
+        if a.shape[0] == self.operador.N:  # Matriz almacenada D: a = [a', -a']
+            a = np.vstack([a, -a])
+        return np.asarray(self.hadamard @ a, dtype=np.float32)
+
+    def reconstruir(self, I_out, lam):
+        '''Imagen regularizada (M × B float32) para un lote de speckles I_out (M × B).'''
+        return self.imagen(self.coeficientes(self.correlacion(I_out), lam))
+
+
+class InversionCompresiva(InversionTikhonov):
+    '''
+    Reconstrucción con una caracterización compresiva: matrices con solo los K patrones
+    adquiridos (D: M × K, Y: M × 2K), con `patrones` los índices de columna de H de cada columna.
+
+    1. Tikhonov sobre la matriz parcial (Gram K × K): coeficientes u del objeto en los K patrones.
+    2. fista_hadamard: completa los N - K coeficientes no medidos con la imagen de variación total
+       mínima compatible con los medidos, con la FWHT de longitud N como operador de medida.
+    3. Expansión al plano del DMD (HadamardOperator.expandir), como InversionTikhonov.imagen.
+
+    Parámetros (además de los de InversionTikhonov):
+    - hadamard: HadamardOperator de la adquisición completa (N = pattern_size²)
+    - patrones: K índices de columna de H (patrones_adquiridos), en el orden de las columnas
+    - lam_dispersion: peso de TV relativo (Recuperacion_Dispersa.fista_hadamard)
+    - iteraciones: iteraciones de FISTA (0 = llenado con ceros, la solución lineal)
+    '''
+
+    def __init__(self, operador, hadamard, patrones, lam_dispersion=0.005, iteraciones=100, ruta_gram=None,
+                 chunk_filas=8192, progreso=True):
+        self.patrones = np.asarray(patrones, dtype=np.int64)
+        if len(self.patrones) != operador.N:
+            raise ValueError(f"{len(self.patrones)} patrones para un operador de {operador.N} columnas por conjunto")
+        if self.patrones.min() < 0 or self.patrones.max() >= hadamard.N:
+            raise ValueError(f"Índices de patrón fuera de [0, {hadamard.N})")
+        self.lam_dispersion = lam_dispersion
+        self.iteraciones = iteraciones
+        super().__init__(operador, hadamard, ruta_gram=ruta_gram, chunk_filas=chunk_filas, progreso=progreso)
+
+    def imagen(self, a):
+        '''Coeficientes parciales → imagen completa recuperada en el plano del DMD (M × B float32).'''
+        a = np.asarray(a).reshape(a.shape[0], -1)
+        K = len(self.patrones)
+        # Imagen en bloques x = H_S u: u = 2a' con D (a = [a', -a']) o a_H1 - a_H2 con Y
+        u = 2 * a if a.shape[0] == K else a[:K] - a[K:]
+        # (Hn x)[S] = √N · u con Hn = H/√N
+        x = fista_hadamard(np.sqrt(self.hadamard.N) * u, self.patrones, self.hadamard.pattern_size,
+                           self.lam_dispersion, self.iteraciones)
+        return np.asarray(self.hadamard.expandir(x), dtype=np.float32)
+
+
+class Reconstructor:
+    '''
+    Reconstrucción reutilizable desde código: la calibración se abre una vez y cada llamada solo
+    paga la correlación, la pasada por Y y la normalización.
+
+    Al construirlo se verifican las dimensiones (y el operador Hadamard), se planifica el chunk con
+    el presupuesto de memoria, se reservan los buffers de trabajo (I_out e I_rec para un lote) y, si
+    se pide, se crean los procesos de Producto_Paralelo.py y se calcula o lee la Gram de Tikhonov:
+
+        with Reconstructor.desde_archivos('diferencia', ('Matriz_Diferencia.fcm',)) as rec:
+            imagen = rec.reconstruir(frame)                   # (alto, ancho) uint8
+            for ruta, imagen in rec.flujo(rutas):             # lotes con lectura anticipada
+                ...
+            recorte = rec.reconstruir(frame, region=(200, 456, 300, 556))  # solo esas filas de Y
+            for fraccion, imagen in rec.progresivo(frame):    # vista previa, luego por bandas
+                ...
+
+    Parámetros:
+    - operador: operador de Operadores_Intensidad.py (filas = píxeles activos si hay máscara)
+    - pattern_size, DMD_size: geometría de los patrones (HadamardOperator)
+    - shape_img: (alto, ancho) de los speckles
+    - ruta_mascara: máscara de píxeles activos (Construccion_Mascara.py) o None
+    - motor: 'filtro_adaptado' ((1/(2N))·Y·c), 'tikhonov' (InversionTikhonov) o 'compresivo'
+      (InversionCompresiva, matrices con solo K < N patrones)
+    - lam, ruta_gram: λ relativo y caché de la Gram (motores 'tikhonov' y 'compresivo')
+    - patrones: índices de los K patrones adquiridos (motor 'compresivo'; None = los N)
+    - lam_dispersion, iteraciones_dispersion: recuperación TV (motor 'compresivo')
+    - tamano_lote: speckles por pasada por Y (tamaño de los buffers de trabajo)
+    - num_procesos: >1 reparte las filas de Y entre procesos (solo filtro adaptado)
+    - num_buffers: buffers de precarga por pasada
+    - memoria_gb: presupuesto de RAM (None = Planificador_Memoria.py)
+    - cargar_en_ram: True, False o 'auto' (copiar las matrices a RAM si caben en medio presupuesto)
+    - verificar: comprobar el operador Hadamard contra patrones explícitos
+    - progreso: imprimir el plan de memoria y el avance de cada pasada
+
+    reconstruir, reconstruir_varios y flujo aceptan region y paso (seleccion_pixeles): con el
+    filtro adaptado solo se calculan esas filas de Y, en un proceso (con Tikhonov se recorta).
+
+    Los métodos reconstruct, reconstruct_many, stream y progressive son alias de reconstruir,
+    reconstruir_varios, flujo y progresivo.
+
+    Reentrada: cada llamada toma los buffers I_out reservados mientras los necesita (un generador,
+    hasta agotarse o cerrarse). Si otra llamada o generador ya los tiene, la nueva usa buffers propios
+    del tamaño de un lote, así que se pueden intercalar generadores y llamar a reconstruir entre dos
+    imágenes de un flujo sin corromper lotes a medio llenar (solo cuesta la reserva extra). No es
+    seguro para hilos: desde varios hilos hay que serializar las llamadas (Servicio_Reconstruccion.py).
+    '''
+
+    def __init__(self, operador, pattern_size=64, DMD_size=(1280, 1024), shape_img=(1024, 1280),
+                 ruta_mascara=None, motor='filtro_adaptado', lam=1e-3, ruta_gram=None, patrones=None,
+                 lam_dispersion=0.005, iteraciones_dispersion=100, tamano_lote=32, num_procesos=1, num_buffers=2,
+                 memoria_gb=None, cargar_en_ram=False, verificar=True, progreso=False):
+        if motor not in ('filtro_adaptado', 'tikhonov', 'compresivo'):
+            raise ValueError(f"motor debe ser 'filtro_adaptado', 'tikhonov' o 'compresivo', se recibió '{motor}'")
+        self.operador = operador
+        self.motor = motor
+        self.lam = lam
+        self.shape_img = tuple(shape_img)
+        self.tamano_lote = tamano_lote
+        self.num_buffers = num_buffers
+        self.progreso = progreso
+        self.M_imagen = self.shape_img[0] * self.shape_img[1]
+        self.indices = cargar_indices(ruta_mascara) if ruta_mascara is not None else None
+        M_filas = self.M_imagen if self.indices is None else len(self.indices)
+
+        hadamard = HadamardOperator(pattern_size, DMD_size)
+        self.hadamard_T = hadamard.T
+        self.N = hadamard.N
+        if hadamard.M != self.M_imagen:
+            raise ValueError(f"DMD_size {DMD_size} ({hadamard.M} píxeles) no coincide con shape_img {self.shape_img}")
+        if motor == 'compresivo' and patrones is None:
+            patrones = np.arange(self.N)
+        N_operador = self.N if motor != 'compresivo' else len(patrones)
+        if operador.N != N_operador or operador.M != M_filas:
+            raise ValueError(f"Operador {operador.shape} incompatible: se esperaban {M_filas} filas y "
+                             f"{2 * N_operador} columnas")
+        if verificar and hadamard.verificar() >= 1e-5:
+            raise RuntimeError("El operador Hadamard no coincide con los patrones explícitos")
+        self.factor_escala = np.float32(1.0 / (2 * self.N))
+
+        # Matrices residentes en RAM si caben en la mitad del presupuesto
+        presupuesto, _ = presupuesto_memoria(memoria_gb)
+        self.en_ram = cargar_en_ram is True or (cargar_en_ram == 'auto' and operador.nbytes < presupuesto // 2)
+        if self.en_ram:
+            operador.matrices = [np.ascontiguousarray(np.asarray(matriz)) for matriz in operador.matrices]
+            presupuesto = max(presupuesto - operador.nbytes, presupuesto // 4)
+
+        # Plan de memoria: anillo de precarga (por proceso) frente a buffers de lote y Gram
+        if motor != 'filtro_adaptado':
+            memoria_fila = operador.memoria_por_fila(2, densas=True)
+            fijos = {'Gram, Cholesky y producto por chunk': operador.columnas_efectivas ** 2 * (8 + 8 + 4)}
+        else:
+            memoria_fila = {descripcion: valor * max(1, num_procesos)
+                            for descripcion, valor in operador.memoria_por_fila(num_buffers).items()}
+            fijos = {}
+        fijos['I_out (2 buffers) + I_rec del lote'] = (2 * self.M_imagen + 2 * M_filas) * tamano_lote * 4
+        alineacion = getattr(operador.matrices[0], 'tesela', (1,))[0]
+        self.chunk_size = planificar_filas('Reconstructor', M_filas, memoria_fila, fijos, multiplo=alineacion,
+                                           memoria_gb=presupuesto / 1024**3, progreso=progreso)
+
+        # Buffers de trabajo planos: la vista (filas, B) de cada lote es contigua
+        self._I_out = [np.empty(self.M_imagen * tamano_lote, dtype=np.float32) for _ in range(2)]
+        self._I_out_en_uso = False
+        self._I_rec = np.empty(M_filas * tamano_lote, dtype=np.float32)
+        self._paralelo = None
+        self.tikhonov = None
+        if motor == 'compresivo':
+            self.tikhonov = InversionCompresiva(operador, hadamard, patrones, lam_dispersion=lam_dispersion,
+                                                iteraciones=iteraciones_dispersion, ruta_gram=ruta_gram,
+                                                chunk_filas=self.chunk_size, progreso=progreso)
+        elif motor == 'tikhonov':
+            self.tikhonov = InversionTikhonov(operador, hadamard, ruta_gram=ruta_gram,
+                                              chunk_filas=self.chunk_size, progreso=progreso)
+        elif num_procesos > 1:
+            self._paralelo = ProductoParalelo(operador, num_procesos, B_maximo=tamano_lote,
+                                              chunk_size=self.chunk_size, num_buffers=num_buffers,
+                                              alineacion=alineacion)
+        self.metricas = {}  # Tiempos (ms) del último lote
+        self.totales = {}   # Tiempos (ms) y speckles acumulados desde la creación
+
+    @classmethod
+    def desde_archivos(cls, modo, rutas, rango=None, pattern_size=64, ruta_mascara=None, **kwargs):
+        '''
+        Reconstructor a partir de los archivos de calibración de un modo (abrir_operador).
+
+        Parámetros:
+        - modo, rutas, rango: ver Operadores_Intensidad.abrir_operador
+        - resto: parámetros de Reconstructor
+
+        Con motor 'compresivo' los patrones adquiridos se leen de la cabecera de la primera ruta
+        si no se indican.
+        '''
+        M = len(cargar_indices(ruta_mascara)) if ruta_mascara is not None else None
+        N = pattern_size ** 2
+        if kwargs.get('motor') == 'compresivo':
+            if kwargs.get('patrones') is None:
+                kwargs['patrones'] = patrones_adquiridos(rutas[0], N)
+            N = len(kwargs['patrones'])
+        operador = abrir_operador(modo, rutas, N=N, M=M, rango=rango)
+        return cls(operador, pattern_size=pattern_size, ruta_mascara=ruta_mascara, **kwargs)
+
+    @contextmanager
+    def _buffers_I_out(self):
+        '''Los dos buffers I_out reservados, o dos nuevos si otra llamada o generador activo ya los usa.'''
+        if self._I_out_en_uso:
+            yield [np.empty(self.M_imagen * self.tamano_lote, dtype=np.float32) for _ in range(2)]
+            return
+        self._I_out_en_uso = True
+        try:
+            yield self._I_out
+        finally:
+            self._I_out_en_uso = False
+
+    def precalentar(self):
+        '''Una pasada con C = 0: compila los kernels y trae a caché las páginas de las matrices en disco.'''
+        with self._buffers_I_out() as buffers:
+            buffers[0][:self.M_imagen] = 0
+            self._reconstruir_lote(buffers[0], 1, normalizar=False)
+
+    def _producto_pixeles(self, C, pixeles, relleno=None):
+        '''
+        (1/(2N))·(Y @ C) solo en `pixeles` (len(pixeles), B). Con máscara, los píxeles inactivos
+        se rellenan como en dispersar (None = mínimo de cada columna).
+        '''
+        if self.indices is None:
+            filas, activos = pixeles, None
+        else:
+            filas, activos = filas_de_pixeles(self.indices, pixeles)
+            if not len(filas):  # Selección sin píxeles activos
+                return np.full((len(pixeles), C.shape[1]), 0 if relleno is None else relleno, dtype=np.float32)
+        I = self.operador.producto_seleccion(C, filas, chunk_size=self.chunk_size)
+        I *= self.factor_escala
+        return I if activos is None else dispersar(I, activos, len(pixeles), relleno)
+
+    def _seleccion(self, region, paso):
+        '''(pixeles, forma) de region/paso, o (None, shape_img) si se pide la imagen completa.'''
+        if region is None and paso == 1:
+            return None, self.shape_img
+        return seleccion_pixeles(self.shape_img, region, paso)
+
+    def _reconstruir_lote(self, buffer, B, normalizar, pixeles=None, forma=None):
+        '''
+        Reconstruye las B primeras columnas de `buffer` (I_out plano). Retorna (B, alto, ancho),
+        o (B,) + forma si se indican los píxeles de una selección (_seleccion).
+        '''
+        forma = self.shape_img if pixeles is None else forma
+        I_out = buffer[:self.M_imagen * B].reshape(self.M_imagen, B)
+        t0 = time.perf_counter()
+        if self.tikhonov is not None:
+            I = self.tikhonov.reconstruir(I_out if self.indices is None else I_out[self.indices], self.lam)
+            I = I if pixeles is None else I[pixeles]
+            t1 = t2 = time.perf_counter()
+        elif pixeles is not None:
+            C = self.hadamard_T @ I_out
+            t1 = time.perf_counter()
+            I = self._producto_pixeles(C, pixeles)
+            t2 = time.perf_counter()
+        else:
+            C = self.hadamard_T @ I_out
+            t1 = time.perf_counter()
+            I_rec = self._I_rec[:self.operador.M * B].reshape(self.operador.M, B)
+            if self._paralelo is not None:
+                self._paralelo.producto(C, out=I_rec, progreso=self.progreso)
+            else:
+                self.operador.producto(C, chunk_size=self.chunk_size, out=I_rec, progreso=self.progreso,
+                                       num_buffers=self.num_buffers)
+            I_rec *= self.factor_escala
+            I = I_rec if self.indices is None else dispersar(I_rec, self.indices, self.M_imagen)
+            t2 = time.perf_counter()
+        if normalizar:
+            imagenes = normalizar_uint8(I, forma)
+        else:
+            imagenes = I.T.copy().reshape((B,) + tuple(forma))  # Copia: I_rec es un buffer reutilizado
+        t3 = time.perf_counter()
+        self.metricas = {'correlacion_ms': (t1 - t0) * 1000, 'producto_ms': (t2 - t1) * 1000,
+                         'normalizacion_ms': (t3 - t2) * 1000, 'speckles': B}
+        for clave, valor in self.metricas.items():
+            self.totales[clave] = self.totales.get(clave, 0) + valor
+        return imagenes
+
+    def _validar(self, forma):
+        if tuple(forma) != self.shape_img:
+            raise ValueError(f"El speckle tiene forma {tuple(forma)}, se esperaba {self.shape_img}")
+
+    def reconstruir(self, frames, normalizar=True, region=None, paso=1):
+        '''
+        Reconstruye uno o varios speckles.
+
+        Parámetros:
+        - frames: array (alto, ancho) o (B, alto, ancho); B mayor que tamano_lote se divide en lotes
+        - normalizar: True → uint8 [0, 255]; False → I_rec float32 sin normalizar
+        - region, paso: reconstruir solo una región y/o uno de cada `paso` píxeles (seleccion_pixeles)
+
+        Retorna:
+        - array (alto, ancho) o (B, alto, ancho), según la entrada (forma de la selección si se pide)
+        '''
+        frames = np.asarray(frames)
+        individual = frames.ndim == 2
+        frames = frames[None] if individual else frames
+        self._validar(frames.shape[1:])
+        pixeles, forma = self._seleccion(region, paso)
+        resultados = []
+        with self._buffers_I_out() as buffers:
+            for inicio in range(0, len(frames), self.tamano_lote):
+                lote = frames[inicio:inicio + self.tamano_lote]
+                B = len(lote)
+                np.copyto(buffers[0][:self.M_imagen * B].reshape(self.M_imagen, B), lote.reshape(B, -1).T,
+                          casting='unsafe')
+                resultados.append(self._reconstruir_lote(buffers[0], B, normalizar, pixeles, forma))
+        imagenes = resultados[0] if len(resultados) == 1 else np.concatenate(resultados)
+        return imagenes[0] if individual else imagenes
+
+    def reconstruir_varios(self, frames, normalizar=True, region=None, paso=1):
+        '''
+        Generador: reconstruye un iterable de speckles (alto, ancho) agrupándolos en lotes de
+        tamano_lote, una pasada por Y por lote. Produce las imágenes en el orden de entrada.
+        '''
+        seleccion = self._seleccion(region, paso)
+        with self._buffers_I_out() as buffers:
+            I_out = buffers[0][:self.M_imagen * self.tamano_lote].reshape(self.tamano_lote, -1)
+            B = 0
+            for frame in frames:
+                frame = np.asarray(frame)
+                self._validar(frame.shape)
+                I_out[B] = frame.ravel()  # Fila b del buffer plano = columna b de I_out tras el lote
+                B += 1
+                if B == self.tamano_lote:
+                    yield from self._lote_desde_filas(buffers, B, normalizar, *seleccion)
+                    B = 0
+            if B:
+                yield from self._lote_desde_filas(buffers, B, normalizar, *seleccion)
+
+    def _lote_desde_filas(self, buffers, B, normalizar, pixeles, forma):
+        # Los frames se acumularon como filas (B, M): transponer al buffer siguiente como (M, B)
+        filas = buffers[0][:self.M_imagen * B].reshape(B, self.M_imagen)
+        np.copyto(buffers[1][:self.M_imagen * B].reshape(self.M_imagen, B), filas.T)
+        yield from self._reconstruir_lote(buffers[1], B, normalizar, pixeles, forma)
+
+    def flujo(self, rutas, normalizar=True, region=None, paso=1):
+        '''
+        Generador: (ruta, imagen) para una lista de rutas de speckles. Un hilo carga el lote
+        siguiente (cv2 libera el GIL) mientras se reconstruye el actual, en dos buffers I_out.
+        '''
+        pixeles, forma = self._seleccion(region, paso)
+        rutas = list(rutas)
+        lotes = [rutas[i:i + self.tamano_lote] for i in range(0, len(rutas), self.tamano_lote)]
+
+        def cargar(buffers, indice):
+            lote = lotes[indice]
+            buffer = buffers[indice % 2]
+            cargar_speckles(lote, self.shape_img, out=buffer[:self.M_imagen * len(lote)].reshape(self.M_imagen, len(lote)))
+
+        with self._buffers_I_out() as buffers, ThreadPoolExecutor(max_workers=1) as cargador:
+            siguiente = cargador.submit(cargar, buffers, 0) if lotes else None
+            for indice, lote in enumerate(lotes):
+                siguiente.result()
+                if indice + 1 < len(lotes):
+                    siguiente = cargador.submit(cargar, buffers, indice + 1)
+                imagenes = self._reconstruir_lote(buffers[indice % 2], len(lote), normalizar, pixeles, forma)
+                yield from zip(lote, imagenes)
+
+    def progresivo(self, frame, paso=8, filas_banda=128, normalizar=True):
+        '''
+        Generador: reconstrucción progresiva de un speckle (alto, ancho) con una sola correlación.
+
+        Primero una vista previa con uno de cada `paso` píxeles por eje (1/paso² de las filas de Y,
+        ampliada por repetición); después bandas de `filas_banda` filas de imagen a resolución
+        completa que van sustituyendo a la vista previa, en orden de disco.
+
+        Produce (fraccion, imagen): fracción de filas de imagen ya refinadas (0 para la vista
+        previa) e imagen (alto, ancho) completa, uint8 normalizada en conjunto (o float32).
+        '''
+        if self.tikhonov is not None:
+            raise ValueError("La reconstrucción progresiva solo está disponible con el filtro adaptado")
+        frame = np.asarray(frame)
+        self._validar(frame.shape)
+        with self._buffers_I_out() as buffers:
+            I_out = buffers[0][:self.M_imagen].reshape(self.M_imagen, 1)
+            np.copyto(I_out[:, 0], frame.ravel(), casting='unsafe')
+            C = self.hadamard_T @ I_out  # Array nuevo: los buffers se liberan antes del primer yield
+        alto, ancho = self.shape_img
+
+        # NaN en los píxeles inactivos de la máscara: _imagen_parcial los lleva al mínimo
+        pixeles, forma = seleccion_pixeles(self.shape_img, paso=paso)
+        previa = self._producto_pixeles(C, pixeles, relleno=np.nan).reshape(forma)
+        imagen = np.repeat(np.repeat(previa, paso, axis=0), paso, axis=1)[:alto, :ancho]
+        yield 0.0, self._imagen_parcial(imagen, normalizar)
+        for f0 in range(0, alto, filas_banda):
+            f1 = min(f0 + filas_banda, alto)
+            pixeles = np.arange(f0 * ancho, f1 * ancho, dtype=np.int64)
+            imagen[f0:f1] = self._producto_pixeles(C, pixeles, relleno=np.nan).reshape(f1 - f0, ancho)
+            yield f1 / alto, self._imagen_parcial(imagen, normalizar)
+
+    @staticmethod
+    def _imagen_parcial(imagen, normalizar):
+        # Copia: la imagen de progresivo se sigue actualizando después de cada yield
+        inactivos = np.isnan(imagen)
+        imagen = np.where(inactivos, np.nanmin(imagen) if not inactivos.all() else 0, imagen)
+        return normalizar_uint8(imagen.reshape(-1, 1), imagen.shape)[0] if normalizar else imagen
+
+    reconstruct = reconstruir
+    reconstruct_many = reconstruir_varios
+    stream = flujo
+    progressive = progresivo
+
+    def cerrar(self):
+        '''Termina los procesos de Producto_Paralelo.py, si los hay.'''
+        if self._paralelo is not None:
+            self._paralelo.cerrar()
+            self._paralelo = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.cerrar()
@@ -2,6 +2,14 @@ import numpy as np
 import cv2
 import os
 import gc  # Para liberación explícita de memoria
+from Operadores_Hadamard import HadamardOperator
+from Operadores_Intensidad import IntensityMatrix, DifferenceMatrix, LazyIntensityMatrix, LowRankIntensityMatrix
+from Reconstruccion import listar_speckles, cargar_speckles, normalizar_uint8, seleccion_pixeles, InversionTikhonov, \
+    InversionCompresiva
+from Ordenes_Hadamard import patrones_adquiridos
+from Mascara import cargar_indices, dispersar, filas_de_pixeles
+from Planificador_Memoria import planificar_filas
+from Producto_Paralelo import ProductoParalelo
 
 '''
 ========================= RECONSTRUCCIÓN DE IMÁGENES CON PATRONES HADAMARD =========================
@@ -17,21 +25,54 @@ MARCO TEÓRICO:
 3. Correlación de la salida con los patrones
    • Dado I_out ∈ ℝ^(M×1), se computa c = X^T · I_out ∈ ℝ^(2N×1)
    • c_i mide cuánto "resuena" la salida con el i-ésimo patrón ±1
+   • X no se lee de disco: c[:N] = H · b, con b la suma de I_out en cada bloque 16×16
+     del área activa (FWHT de longitud N), y c[N:] = -c[:N] (HadamardOperator)
 
 4. Reconstrucción lineal
    • Se usa la matriz de intensidad Y para invertir la distorsión del MMF
    • I_rec = (1/(2N)) * Y * c, donde Y = RVITM * X (caracterizada previamente)
    • Sin Y no hay forma de "invertir" la distorsión del MMF
+   • Como c[N:] = -c[:N], Y @ c = (Y_H1 - Y_H2) @ c[:N] = D @ c[:N]
+     (Modo_Matriz = 'diferencia': lee la mitad de bytes, ver Matriz_Intensidad.py)
+   • Como Y = [2·S_H1 - I1 | 2·S_H2 - I1], Y @ c = 2·(S @ c) - I1·sum(c)
+     (Modo_Matriz = 'perezosa': lee directamente los speckles uint8, sin archivos int16)
+   • Con la SVD de rango k (Compresion_SVD.py), Y @ c ≈ US @ (V^T @ c)
+     (Modo_Matriz = 'bajo_rango': lee M × k float32, O(k·(M + N)) por speckle)
 
 5. Normalización y reshape
    • Normalizar I_rec a rango [0,255] → uint8
    • img_rec = I_rec.reshape(alto, ancho)
 
+6. Motor de Tikhonov (Motor_Reconstruccion = 'tikhonov')
+   • (1/(2N))·Y·c es un filtro adaptado; la alternativa regularizada resuelve
+     (G + λI) a = Y^T I_out con G = Y^T Y, e imagen = X a
+   • G se calcula una vez (Path_Gram) y el Cholesky de G + λI queda en caché
+   • Lambdas_Barrido reutiliza la descomposición espectral de G: sin pasadas extra por disco
+   • Motor_Reconstruccion = 'compresivo': matrices con solo K < N patrones (Orquesta.py con
+     Fraccion_Patrones < 1, índices en la cabecera 'patrones'); Tikhonov da los K coeficientes
+     medidos y la recuperación TV (Recuperacion_Dispersa.py) completa el resto
+
+7. Máscara de píxeles activos (Usar_Mascara, Construccion_Mascara.py)
+   • Y, D y S solo guardan las filas de los píxeles iluminados por el núcleo de la fibra
+   • I_rec se calcula para esas filas y se dispersa al cuadro completo antes de normalizar
+
+8. Región de interés y submuestreo (Region_Interes, Paso_Pixeles)
+   • Cada fila de Y es un píxel de salida: para una ventana o una vista previa 1 de cada k
+     píxeles solo se leen y multiplican esas filas (producto_seleccion)
+   • El coste por lote pasa a ser proporcional a los píxeles pedidos, no a M
+
+9. Modo por lotes
+   • Path_Speckle_a_Reconstruir puede ser una imagen, un directorio o una lista de rutas
+   • Los B speckles de un lote se apilan en I_out ∈ ℝ^(M×B): C = X^T · I_out y Y @ C son GEMM
+   • B imágenes cuestan UNA pasada por Y en disco en lugar de B pasadas (GEMV limitadas por memoria)
+
 IMPLEMENTACIÓN OPTIMIZADA:
 - Procesamiento por chunks para evitar overflow de RAM (40+ GB → ~100 MB por chunk)
 - Uso de np.memmap para acceso eficiente a disco sin cargar matrices completas
+- Correlación X^T · I_out implícita con FWHT (sin leer los 10 GB de la matriz Hadamard)
 - Liberación explícita de variables intermedias (del chunk tras cada multiplicación)
 - Tipos de datos optimizados: int8/int16 en disco, float32 en cálculos, uint8 final
+- Producto entero × float32 sin copia por chunk (Kernel_Producto.py, numba si está disponible)
 
 ==========================================================================================
 '''
@@ -41,32 +82,81 @@ print("=== INICIALIZANDO RECONSTRUCCIÓN DE IMAGEN ===")
 # === Paths COMPLETAMENTE LOCALES (OPTIMIZADO) ===
 # Todos los archivos ahora están en disco local para máxima velocidad
 base_local = '/home/manuel/temp_intensity'
-Path_Speckle_a_Reconstruir = '/home/manuel/temp_intensity/panda.png'  # SPECKLE del panda (LOCAL)
-Path_Matriz_Intensidad = '/home/manuel/temp_intensity/temp_Matriz_Final.dat'  # Matriz intensidad (LOCAL)  
-Path_Matriz_Hadamard_T = '/home/manuel/temp_intensity/Hadamard_H_menosH_transpuesta.dat'  # Matriz Hadamard (LOCAL)
+Path_Speckle_a_Reconstruir = '/home/manuel/temp_intensity/panda.png'  # Imagen, directorio o lista de speckles (LOCAL)
+Tamano_Lote = 32  # Speckles por pasada sobre Y (I_out e I_rec ocupan 2 × 5 MB × Tamano_Lote en RAM)
+Memoria_GB = None  # Presupuesto de RAM (None = según la RAM libre y el cgroup, ver Planificador_Memoria.py)
+Path_Matriz_Intensidad = '/home/manuel/temp_intensity/Matriz_Intensidad.fcm'  # Matriz intensidad (LOCAL)
+Path_Matriz_Diferencia = '/home/manuel/temp_intensity/Matriz_Diferencia.fcm'  # D = Y_H1 - Y_H2 (LOCAL)
+Path_Speckles_H1 = '/home/manuel/temp_intensity/speckles_H1_vectorizados.fcm'  # S_H1 uint8 (LOCAL)
+Path_Speckles_H2 = '/home/manuel/temp_intensity/speckles_H2_vectorizados.fcm'  # S_H2 uint8 (LOCAL)
+Path_SVD_US = '/home/manuel/temp_intensity/svd_US.npy'  # U·Σ (M × k float32, Compresion_SVD.py)
+Path_SVD_V = '/home/manuel/temp_intensity/svd_V.npy'    # V (N × k o 2N × k float32)
+Rango_Reconstruccion = None  # Modo 'bajo_rango': r ≤ k columnas de la SVD (None = todas)
+# 'diferencia' (D, M×N int16, Matriz_Intensidad.py), 'completa' ([Y_H1 | Y_H2], M×2N int16),
+# 'perezosa' (Y al vuelo desde S_H1/S_H2 uint8, sin Matriz_Intensidad.py)
+# o 'bajo_rango' (US · V^T de rango k, Compresion_SVD.py)
+Modo_Matriz = 'diferencia'
+# 'filtro_adaptado' (I_rec = (1/(2N))·Y·c), 'tikhonov' ((G + λI) a = Y^T I_out, I_rec = X a)
+# o 'compresivo' (Tikhonov sobre los K patrones adquiridos + recuperación TV de los N - K restantes)
+Motor_Reconstruccion = 'filtro_adaptado'
+Num_Procesos = 1  # Filtro adaptado: >1 reparte las filas de Y entre procesos (Producto_Paralelo.py)
+Lambda_Tikhonov = 1e-3  # Relativo al autovalor medio de G (traza(G)/n)
+Lambdas_Barrido = []    # Ej. [1e-4, 1e-3, 1e-2]: una imagen por λ con la misma pasada por disco
+Lambda_Dispersion = 0.005    # Motor 'compresivo': peso de TV relativo al máximo de la imagen
+Iteraciones_Dispersion = 100  # Iteraciones de FISTA (0 = llenado con ceros de los coeficientes)
+Path_Gram = f'/home/manuel/temp_intensity/Gram_{Modo_Matriz}.npy'  # Caché de G = A^T A (float64)
+Usar_Mascara = False  # True si las matrices se construyeron solo con los píxeles activos
+Path_Mascara = '/home/manuel/temp_intensity/mascara_pixeles.npy'  # Construccion_Mascara.py
+Region_Interes = None  # (fila_inicio, fila_fin, columna_inicio, columna_fin) o None para la imagen completa
+Paso_Pixeles = 1       # Entero o (paso_filas, paso_columnas): 1 de cada k píxeles (vista previa)
 Output_Path = '/home/manuel/temp_intensity/Imagenes_Reconstruidas'
 
 print(f"=== CONFIGURACION COMPLETAMENTE LOCAL ===")
 print(f"Todos los archivos en disco local para maximo rendimiento")
 print(f"Base local: {base_local}")
-print(f"Speckle panda: {Path_Speckle_a_Reconstruir}")
-print(f"Matriz intensidad: {Path_Matriz_Intensidad}")
-print(f"Matriz Hadamard: {Path_Matriz_Hadamard_T}")
+print(f"Speckles a reconstruir: {Path_Speckle_a_Reconstruir}")
+if Modo_Matriz not in ('diferencia', 'completa', 'perezosa', 'bajo_rango'):
+    raise ValueError(f"Modo_Matriz debe ser 'diferencia', 'completa', 'perezosa' o 'bajo_rango', se recibió '{Modo_Matriz}'")
+if Modo_Matriz == 'diferencia':
+    Path_Matriz_Intensidad = Path_Matriz_Diferencia
+print(f"Modo de matriz: {Modo_Matriz}")
+if Modo_Matriz == 'perezosa':
+    print(f"Speckles H1/H2: {Path_Speckles_H1}, {Path_Speckles_H2}")
+elif Modo_Matriz == 'bajo_rango':
+    print(f"Factores SVD: {Path_SVD_US}, {Path_SVD_V} (rango: {Rango_Reconstruccion or 'todos'})")
+else:
+    print(f"Matriz intensidad: {Path_Matriz_Intensidad}")
+print(f"Matriz Hadamard: implícita (HadamardOperator, sin archivo)")
+if Motor_Reconstruccion not in ('filtro_adaptado', 'tikhonov', 'compresivo'):
+    raise ValueError(f"Motor_Reconstruccion debe ser 'filtro_adaptado', 'tikhonov' o 'compresivo', "
+                     f"se recibió '{Motor_Reconstruccion}'")
+print(f"Motor de reconstrucción: {Motor_Reconstruccion}")
+if Motor_Reconstruccion != 'filtro_adaptado':
+    print(f"λ: {Lambdas_Barrido or Lambda_Tikhonov} (Gram en caché: {Path_Gram})")
+if Motor_Reconstruccion == 'compresivo':
+    print(f"Recuperación TV: λ = {Lambda_Dispersion}, {Iteraciones_Dispersion} iteraciones")
 print(f"Salida: {Output_Path}")
 
 # Validar que los archivos de entrada existen
-archivos_requeridos = [
-    (Path_Speckle_a_Reconstruir, "speckle a reconstruir"),
-    (Path_Matriz_Intensidad, "matriz de intensidad"),
-    (Path_Matriz_Hadamard_T, "matriz de Hadamard transpuesta")
-]
+rutas_speckles = listar_speckles(Path_Speckle_a_Reconstruir)
+if Modo_Matriz == 'perezosa':
+    archivos_requeridos = [(Path_Speckles_H1, "speckles H1"), (Path_Speckles_H2, "speckles H2")]
+elif Modo_Matriz == 'bajo_rango':
+    archivos_requeridos = [(Path_SVD_US, "factor US"), (Path_SVD_V, "factor V")]
+else:
+    archivos_requeridos = [(Path_Matriz_Intensidad, "matriz de intensidad")]
+if Usar_Mascara:
+    archivos_requeridos.append((Path_Mascara, "máscara de píxeles activos"))
+archivos_requeridos += [(ruta, "speckle a reconstruir") for ruta in rutas_speckles]
 
 print("Validando archivos de entrada...")
 for archivo, descripcion in archivos_requeridos:
     if not os.path.exists(archivo):
         raise FileNotFoundError(f"No se encontró {descripcion}: {archivo}")
     tamaño_mb = os.path.getsize(archivo) / (1024**2)
-    print(f"- {descripcion}: {tamaño_mb:.1f} MB")
+    if len(archivos_requeridos) <= 10 or descripcion != "speckle a reconstruir":
+        print(f"- {descripcion}: {tamaño_mb:.1f} MB")
+print(f"Speckles a reconstruir: {len(rutas_speckles)}")
 
 # Crear directorio de salida
 os.makedirs(Output_Path, exist_ok=True)
@@ -75,8 +165,11 @@ print(f"Directorio de salida: {Output_Path}")
 print(f"\n=== VALIDACIÓN DE DIMENSIONES Y TIPOS DE DATOS ===")
 
 # === Dimensiones esperadas ===
-shape_I_esperada = (1310720, 8192)  # Matriz de intensidad
-shape_H_esperada = (8192, 1310720)  # Matriz Hadamard transpuesta
+pattern_size = 64                   # Patrón base 64×64 (N = 4096)
+DMD_size = (1280, 1024)             # (ancho, alto) del lienzo vectorizado
+shape_I_esperada = (1310720, 8192)  # Matriz de intensidad efectiva Y (M × 2N)
+shape_D_esperada = (1310720, 4096)  # Matriz diferencia D = Y_H1 - Y_H2 (M × N)
+shape_H_esperada = (8192, 1310720)  # Matriz Hadamard transpuesta (implícita)
 shape_img_esperada = (1024, 1280)   # Imagen original (alto, ancho)
 
 print(f"Dimensiones esperadas:")
@@ -96,61 +189,101 @@ if shape_I_esperada[0] != pixels_imagen:
     raise ValueError(f"Incompatibilidad: filas matriz intensidad ({shape_I_esperada[0]}) "
                     f"!= pixeles imagen ({pixels_imagen})")
 
+# Máscara de píxeles activos: las matrices en disco solo tienen esas filas
+if Usar_Mascara:
+    indices_activos = cargar_indices(Path_Mascara)
+    if indices_activos.size == 0 or indices_activos[-1] >= pixels_imagen:
+        raise ValueError(f"Máscara incompatible con la imagen {shape_img_esperada}: {Path_Mascara}")
+    shape_I_esperada = (len(indices_activos), shape_I_esperada[1])
+    shape_D_esperada = (len(indices_activos), shape_D_esperada[1])
+    print(f"Máscara: {len(indices_activos):,} píxeles activos de {pixels_imagen:,} "
+          f"({len(indices_activos) / pixels_imagen * 100:.1f}%)")
+
+# Caracterización compresiva: las matrices solo tienen las columnas de los K patrones adquiridos
+patrones_medidos = patrones_adquiridos(Path_Speckles_H1 if Modo_Matriz == 'perezosa' else Path_Matriz_Intensidad)
+if patrones_medidos is not None:
+    if Motor_Reconstruccion != 'compresivo':
+        raise ValueError(f"Matrices con {len(patrones_medidos)} de {shape_D_esperada[1]} patrones: "
+                         f"usar Motor_Reconstruccion = 'compresivo'")
+    shape_I_esperada = (shape_I_esperada[0], 2 * len(patrones_medidos))
+    shape_D_esperada = (shape_D_esperada[0], len(patrones_medidos))
+    print(f"Caracterización compresiva: {len(patrones_medidos)} de {pattern_size**2} patrones "
+          f"({len(patrones_medidos) / pattern_size**2 * 100:.1f}%)")
+elif Motor_Reconstruccion == 'compresivo':
+    patrones_medidos = np.arange(shape_D_esperada[1])  # Adquisición completa: solo regularización TV
+
+# Región de interés / submuestreo: solo se calculan las filas de Y de esos píxeles
+pixeles_seleccion = None
+shape_salida = shape_img_esperada
+if Region_Interes is not None or Paso_Pixeles != 1:
+    pixeles_seleccion, shape_salida = seleccion_pixeles(shape_img_esperada, Region_Interes, Paso_Pixeles)
+    filas_seleccion, activos_seleccion = pixeles_seleccion, None
+    if Usar_Mascara:
+        filas_seleccion, activos_seleccion = filas_de_pixeles(indices_activos, pixeles_seleccion)
+    print(f"Selección: región {Region_Interes or 'completa'}, paso {Paso_Pixeles} → imagen {shape_salida}, "
+          f"{len(filas_seleccion):,} filas de Y ({len(filas_seleccion) / shape_I_esperada[0] * 100:.2f}%)")
+
 print("Dimensiones validadas correctamente")
 
-# === Cargar matrices .dat con memmap ===
+# === Cargar matrices (.fcm, .npy o .dat) con memmap ===
 print(f"\n=== CARGANDO MATRICES .DAT CON MEMMAP ===")
 print("Cargando matrices desde archivos .dat (formato optimizado)...")
 
-# Cargar Matriz de Intensidad (.dat)
+# Cargar Matriz de Intensidad (.dat) como operador por chunks
 try:
-    print(f"Cargando Matriz_Intensidad desde: {Path_Matriz_Intensidad}")
-    Matriz_Intensidad = np.memmap(Path_Matriz_Intensidad, 
-                                 dtype=np.int16, mode='r', 
-                                 shape=shape_I_esperada)
+    if Modo_Matriz == 'perezosa':
+        print(f"Cargando speckles desde: {Path_Speckles_H1}, {Path_Speckles_H2}")
+        Operador_Intensidad = LazyIntensityMatrix(Path_Speckles_H1, Path_Speckles_H2)
+    elif Modo_Matriz == 'bajo_rango':
+        print(f"Cargando factores SVD desde: {Path_SVD_US}, {Path_SVD_V}")
+        Operador_Intensidad = LowRankIntensityMatrix(Path_SVD_US, Path_SVD_V, N=shape_D_esperada[1],
+                                                     rango=Rango_Reconstruccion)
+        print(f"Rango usado: {Operador_Intensidad.rango}")
+    elif Modo_Matriz == 'diferencia':
+        print(f"Cargando Matriz_Intensidad desde: {Path_Matriz_Intensidad}")
+        Operador_Intensidad = DifferenceMatrix(Path_Matriz_Intensidad, shape=shape_D_esperada)
+    else:
+        print(f"Cargando Matriz_Intensidad desde: {Path_Matriz_Intensidad}")
+        Operador_Intensidad = IntensityMatrix(Path_Matriz_Intensidad, shape=shape_I_esperada)
+    Matriz_Intensidad = Operador_Intensidad.matrices[0]
     print(f"Matriz_Intensidad cargada: {Matriz_Intensidad.shape}, {Matriz_Intensidad.dtype}")
+    print(f"Operador efectivo Y: {Operador_Intensidad.shape} ({type(Operador_Intensidad).__name__})")
     
 except Exception as e:
     raise RuntimeError(f"Error al cargar Matriz_Intensidad: {e}")
 
-# Cargar Matriz Hadamard (.dat)
-try:
-    print(f"Cargando Matriz_Hadamard_T desde: {Path_Matriz_Hadamard_T}")
-    Matriz_Hadamard_T = np.memmap(Path_Matriz_Hadamard_T, 
-                                 dtype=np.int8, mode='r', 
-                                 shape=shape_H_esperada)
-    print(f"Matriz_Hadamard_T cargada: {Matriz_Hadamard_T.shape}, {Matriz_Hadamard_T.dtype}")
-    
-except Exception as e:
-    raise RuntimeError(f"Error al cargar Matriz_Hadamard_T: {e}")
+# Matriz Hadamard implícita: X = [H, -H] sin archivo (FWHT + suma por bloques)
+Matriz_Hadamard_T = HadamardOperator(pattern_size, DMD_size).T
+print(f"Matriz_Hadamard_T implícita: {Matriz_Hadamard_T.shape}, {Matriz_Hadamard_T.dtype}")
+if Matriz_Hadamard_T.shape != shape_H_esperada:
+    raise ValueError(f"Operador Hadamard con forma {Matriz_Hadamard_T.shape}, se esperaba {shape_H_esperada}")
 
 # Calcular memoria utilizada por los memmap (no cargan en RAM, solo mapean)
-memoria_intensidad_gb = (shape_I_esperada[0] * shape_I_esperada[1] * 2) / (1024**3)  # int16 = 2 bytes
-memoria_hadamard_gb = (shape_H_esperada[0] * shape_H_esperada[1] * 1) / (1024**3)    # int8 = 1 byte
+memoria_intensidad_gb = Operador_Intensidad.nbytes / (1024**3)  # int16 = 2 bytes
 
 print(f"\nMemoria mapeada (no RAM):")
 print(f"- Matriz_Intensidad: {memoria_intensidad_gb:.2f} GB")
-print(f"- Matriz_Hadamard_T: {memoria_hadamard_gb:.2f} GB")
-print(f"- Total archivos mapeados: {memoria_intensidad_gb + memoria_hadamard_gb:.2f} GB")
+print(f"- Matriz_Hadamard_T: 0.00 GB (implícita)")
 
 # ===== DIAGNÓSTICO CRÍTICO: VERIFICAR CONTENIDO DE MATRICES =====
 print(f"\n=== DIAGNÓSTICO DE CONTENIDO DE MATRICES ===")
 
-# Verificar Matriz Hadamard (debe contener solo ±1)
-print("Analizando Matriz_Hadamard_T...")
-h_sample = Matriz_Hadamard_T[:100, :100]  # Muestra pequeña para análisis
-h_unique = np.unique(h_sample)
-print(f"Valores únicos en muestra Hadamard: {h_unique}")
-if len(h_unique) == 2 and set(h_unique) == {-1, 1}:
-    print("✓ Matriz Hadamard válida: contiene solo ±1")
-elif len(h_unique) == 2 and set(h_unique) == {0, 1}:
-    print("⚠ Matriz Hadamard binaria: contiene 0,1 (se convertirá a ±1)")
+# Verificar operador Hadamard contra patrones construidos explícitamente
+print("Analizando Matriz_Hadamard_T (implícita)...")
+error_hadamard = Matriz_Hadamard_T.T.verificar()
+print(f"Error relativo máximo frente a patrones explícitos: {error_hadamard:.2e}")
+if error_hadamard < 1e-5:
+    print("✓ Operador Hadamard válido: coincide con [H, -H]^T explícita")
 else:
-    print(f"✗ PROBLEMA: Matriz Hadamard contiene valores inesperados: {h_unique}")
+    print(f"✗ PROBLEMA: El operador Hadamard no coincide con los patrones explícitos")
 
 # Verificar Matriz de Intensidad (debe tener variación significativa)
 print("Analizando Matriz_Intensidad...")
-y_sample = Matriz_Intensidad[:1000, :100].astype(np.float32)  # Muestra para análisis
+# Muestra Y[:1000, :100] a través del operador (válido también si Y no está materializada)
+num_muestra = min(100, Operador_Intensidad.shape[1])  # Menos columnas con una caracterización compresiva
+columnas_muestra = np.zeros((Operador_Intensidad.shape[1], num_muestra), dtype=np.float32)
+columnas_muestra[np.arange(num_muestra), np.arange(num_muestra)] = 1
+y_sample = Operador_Intensidad.producto_filas(columnas_muestra, 0, 1000)  # Muestra para análisis
 y_min, y_max = y_sample.min(), y_sample.max()
 y_mean, y_std = y_sample.mean(), y_sample.std()
 print(f"Muestra Y - Rango: [{y_min:.2f}, {y_max:.2f}], Media: {y_mean:.2f}, Std: {y_std:.2f}")
@@ -159,43 +292,15 @@ print(f"Muestra Y - Rango: [{y_min:.2f}, {y_max:.2f}], Media: {y_mean:.2f}, Std:
 if y_min >= 0 and y_max <= 255 and y_std < 50:
     print("⚠ POSIBLE PROBLEMA: Y parece contener speckles sin procesar (rango 0-255, baja variación)")
 elif y_min < -100 or y_max > 400:
-    print("✓ Y parece preprocesado: rango extendido sugiere Y = 2·Speckle - I₁")
+    print("✓ Y parece preprocesado: rango extendido sugiere Y = 2·Speckle - I₁ (o D = 2·(S_H1 - S_H2))")
 else:
     print("? Y tiene características intermedias - verificar proceso de caracterización")
 
-del h_sample, y_sample  # Liberar muestras de diagnóstico
+del y_sample, columnas_muestra  # Liberar muestras de diagnóstico
 gc.collect()
 
-# === Speckle a reconstruir ===
-print(f"\n=== CARGANDO Y VALIDANDO SPECKLE ===")
-print(f"Procesando speckle: {os.path.basename(Path_Speckle_a_Reconstruir)}")
-
-# Cargar speckle con validaciones
-img = cv2.imread(Path_Speckle_a_Reconstruir, cv2.IMREAD_GRAYSCALE)
-if img is None:
-    raise ValueError(f"No se pudo cargar el speckle: {Path_Speckle_a_Reconstruir}")
-
-# Validar dimensiones del speckle
-if img.shape != shape_img_esperada:
-    raise ValueError(f"El speckle tiene dimensiones {img.shape}, "
-                    f"se esperaba {shape_img_esperada}")
-
-# Validación simplificada: OpenCV siempre produce uint8 (recomendación 3)
-print(f"Speckle cargado: {img.shape}, dtype={img.dtype}")
-
-# Vectorizar speckle y convertir a float32 para evitar overflow en operaciones
-I_out = img.flatten(order='C').astype(np.float32).reshape(-1, 1)
-print(f"Vector speckle: forma={I_out.shape}, dtype={I_out.dtype}")
-
-# Validar que el vector tiene el tamaño correcto
-if I_out.shape[0] != pixels_imagen:
-    raise ValueError(f"Vector speckle tiene {I_out.shape[0]} elementos, "
-                    f"se esperaban {pixels_imagen}")
-
-print(f"Speckle vectorizado correctamente: {I_out.shape}")
-
-# ==== PASO 3: CORRELACIÓN X^T · I_out OPTIMIZADA POR CHUNKS ===== 
-print(f"\n=== CÁLCULO DE CORRELACIÓN c = X^T · I_out ===")
+# === Validaciones del operador Hadamard (una sola vez para todos los lotes) ===
+print(f"\n=== PARÁMETROS DE CORRELACIÓN c = X^T · I_out ===")
 print("TEORÍA: c_i mide resonancia de la salida con el i-ésimo patrón ±1")
 
 # Calcular N (número de patrones de cada tipo en X = [H, -H])
@@ -216,7 +321,7 @@ if not log2_N.is_integer():
 else:
     orden_hadamard = int(log2_N)
     print(f"Orden Hadamard confirmado: 2^{orden_hadamard} = {N}")
-    
+
 # Verificar que el factor de escala es razonable
 factor_escala_check = 1.0 / (2.0 * N)
 print(f"Factor de escala: 1/(2N) = 1/{2*N} = {factor_escala_check:.8f}")
@@ -225,208 +330,78 @@ if factor_escala_check < 1e-6 or factor_escala_check > 0.1:
 else:
     print("Factor de escala validado correctamente")
 
-# Configuración de chunks optimizada (recomendación: 256-512 filas)
-hadamard_chunk_size = 512  # REDUCIDO: 768→512 para garantizar <2.6GB por chunk
-total_filas_hadamard = Matriz_Hadamard_T.shape[0]  # 8192
-num_hadamard_chunks = (total_filas_hadamard + hadamard_chunk_size - 1) // hadamard_chunk_size
-
-# Calcular memoria por chunk de Hadamard
-memoria_hadamard_chunk_gb = (hadamard_chunk_size * Matriz_Hadamard_T.shape[1] * 4) / (1024**3)  # float32
-
-# ===== OPTIMIZACIÓN CRÍTICA DE MEMORIA =====
-print(f"PROBLEMA: X^T @ I_out directo requeriría ~40 GB en RAM")
-print(f"SOLUCIÓN: Procesamiento por chunks siguiendo recomendación 1")
-print(f"VENTAJA: Reducir 40 GB → {memoria_hadamard_chunk_gb:.3f} GB por chunk")
-
-print(f"Configuración chunks Hadamard:")
-print(f"- Chunk size: {hadamard_chunk_size} filas (recomendación: 256-512)")
-print(f"- Total chunks: {num_hadamard_chunks}")
-print(f"- RAM por chunk: {memoria_hadamard_chunk_gb:.3f} GB (SEGURO)")
-
-# Inicializar vector correlación c = X^T · I_out
-intermedia = np.zeros((total_filas_hadamard, 1), dtype=np.float32)
-print(f"Vector correlación c inicializado: {intermedia.shape}")
+# ===== CORRELACIÓN IMPLÍCITA (SIN LEER X^T DE DISCO) =====
+# Cada fila de X^T es una columna de Sylvester escalada 16x y centrada en (offset_x, offset_y):
+#   c[:N] = H · b, b[k] = suma de I_out en el bloque k del área activa → una FWHT de longitud N
+#   c[N:] = -c[:N]
+print(f"ANTES: X^T @ I_out leía {shape_H_esperada[0] * shape_H_esperada[1] / (1024**3):.2f} GB de disco por imagen")
+print(f"AHORA: suma por bloques {Matriz_Hadamard_T.T.scale}×{Matriz_Hadamard_T.T.scale} + FWHT de longitud {N}")
 
-print("Calculando c = X^T @ I_out por chunks (implementación optimizada)...")
-import time
-inicio_hadamard = time.time()
-
-# IMPLEMENTACIÓN SIGUIENDO RECOMENDACIONES 2, 3, 6:
-# - np.memmap en modo 'r' para acceso secuencial a disco
-# - Liberación explícita tras cada multiplicación (del chunk)  
-# - BLAS multihilo aprovecha varios núcleos automáticamente
-for chunk_idx in range(num_hadamard_chunks):
-    inicio_fila = chunk_idx * hadamard_chunk_size
-    fin_fila = min((chunk_idx + 1) * hadamard_chunk_size, total_filas_hadamard)
-    
-    try:
-        # Cargar chunk de X^T desde memmap y convertir a float32 (recomendación 5)
-        hadamard_chunk = Matriz_Hadamard_T[inicio_fila:fin_fila, :].astype(np.float32)
-        
-        # Multiplicar chunk por speckle: c_chunk = X_chunk^T @ I_out
-        resultado_chunk = hadamard_chunk @ I_out
-        
-        # Almacenar resultado del chunk
-        intermedia[inicio_fila:fin_fila, :] = resultado_chunk
-        
-        # Liberación explícita de memoria (recomendación 3)
-        del hadamard_chunk, resultado_chunk
-        
-        # Liberación adicional cada 5 chunks
-        if (chunk_idx + 1) % 5 == 0:
-            gc.collect()  # Forzar recolección de basura
-        
-        # Mostrar progreso cada 10% (recomendación 2: reducir overhead I/O)
-        if chunk_idx % max(1, num_hadamard_chunks//10) == 0 or chunk_idx == num_hadamard_chunks - 1:
-            progreso = (chunk_idx + 1) / num_hadamard_chunks * 100
-            tiempo_transcurrido = time.time() - inicio_hadamard
-            print(f"Correlación: {progreso:.1f}% completado ({chunk_idx+1}/{num_hadamard_chunks}) - {tiempo_transcurrido:.1f}s")
-            
-    except Exception as e:
-        raise RuntimeError(f"Error en chunk correlación {chunk_idx}: {e}")
-
-tiempo_hadamard = time.time() - inicio_hadamard
-print(f"Correlación c = X^T @ I_out completada en {tiempo_hadamard:.1f}s")
-print(f"Vector correlación calculado: {intermedia.shape}, dtype={intermedia.dtype}")
-
-# Validar resultado correlación - solo forma (rápido)
-if intermedia.shape != (Matriz_Hadamard_T.shape[0], 1):
-    raise ValueError(f"Vector correlación tiene forma incorrecta: {intermedia.shape}")
-
-# Validaciones de overflow eliminadas (recomendación 3: casos raros)
-
-# === PASO 4: RECONSTRUCCIÓN I_rec = (1/(2N)) * Y @ c ===
-print(f"\n=== RECONSTRUCCIÓN LINEAL I_rec = (1/(2N)) * Y @ c ===")
+# === Configuración de la reconstrucción I_rec = (1/(2N)) * Y @ C ===
+print(f"\n=== RECONSTRUCCIÓN LINEAL I_rec = (1/(2N)) * Y @ C ===")
 print("TEORÍA: Usar matriz de intensidad Y para invertir distorsión del MMF")
-print(f"FÓRMULA: I_rec = (1/(2N)) * Matriz_Intensidad @ c")
+print(f"FÓRMULA: I_rec = (1/(2N)) * Matriz_Intensidad @ C")
 print("IMPORTANTE: Y = RVITM * X (caracterizada previamente) es esencial para invertir la fibra")
 
-# Configuración de chunks optimizada para Y @ c (matriz de intensidad)
-chunk_size = 32768  # REDUCIDO: 49152→32768 para garantizar estabilidad (~1GB/chunk)
-total_filas = shape_I_esperada[0]  # 1310720 píxeles de salida
+# Tamaño de chunk según la RAM disponible (Planificador_Memoria.py): el chunk más grande que cabe
+# en el presupuesto junto con los buffers fijos del lote (y la Gram en el motor de Tikhonov)
+Num_Buffers_Precarga = 2  # Anillo de LectorChunks: el chunk k+1 se lee mientras se multiplica el k
+total_filas = Operador_Intensidad.M  # 1310720 píxeles de salida (o M_activos con máscara)
+B_maximo = min(Tamano_Lote, len(rutas_speckles))
+memoria_fija = {f'I_out + I_rec del lote (float32, B = {B_maximo})': 2 * total_filas * B_maximo * 4}
+if Motor_Reconstruccion != 'filtro_adaptado':
+    # G (float64), G + λI factorizada (float64) y el producto filas^T filas de cada chunk (float32)
+    memoria_fija['Gram, Cholesky y producto por chunk'] = Operador_Intensidad.columnas_efectivas ** 2 * (8 + 8 + 4)
+    memoria_fila = Operador_Intensidad.memoria_por_fila(2, densas=True)
+elif Num_Procesos > 1:
+    # Cada proceso tiene su propio anillo de precarga; I_rec compartida se copia al resultado
+    memoria_fila = {f'{descripcion} × {Num_Procesos} procesos': valor * Num_Procesos
+                    for descripcion, valor in Operador_Intensidad.memoria_por_fila(Num_Buffers_Precarga).items()}
+    memoria_fija['I_rec en memoria compartida'] = total_filas * B_maximo * 4
+else:
+    memoria_fila = Operador_Intensidad.memoria_por_fila(Num_Buffers_Precarga)
+chunk_size = planificar_filas('Reconstrucción', total_filas, memoria_fila, memoria_fija,
+                              multiplo=getattr(Operador_Intensidad.matrices[0], 'tesela', (1,))[0],
+                              memoria_gb=Memoria_GB)
+memoria_plan_mb = (sum(memoria_fija.values()) + chunk_size * sum(memoria_fila.values())) / (1024**2)
 num_chunks = (total_filas + chunk_size - 1) // chunk_size
+columnas_leidas = sum(m.shape[1] for m in Operador_Intensidad.matrices)  # 2N ('completa', 'perezosa') o N ('diferencia')
 
-# Usar la matriz de intensidad Y (NO la matriz de patrones X)
-print(f"Matriz Y (intensidad): {Matriz_Intensidad.shape} (M × 2N)")
-print(f"Vector correlación c: {intermedia.shape} (2N × 1)")
-print(f"Resultado: Y @ c → I_rec (M × 1)")
+# Lotes de speckles: cada lote es una pasada por Y
+num_lotes = (len(rutas_speckles) + Tamano_Lote - 1) // Tamano_Lote
 
-# Calcular memoria por chunk para Y @ c
-bytes_por_chunk = chunk_size * shape_I_esperada[1] * 4  # float32 = 4 bytes  
-memoria_chunk_mb = bytes_por_chunk / (1024**2)
-
-print(f"Configuración chunks para X @ c:")
+# Usar la matriz de intensidad Y (NO la matriz de patrones X)
+print(f"Matriz Y (intensidad): {Operador_Intensidad.shape} (M × 2N), almacenada como {Matriz_Intensidad.shape}")
+print(f"Matriz correlación C: (2N × B), B ≤ {Tamano_Lote} speckles por lote")
+print(f"Resultado: Y @ C → I_rec (M × B)")
+if Modo_Matriz == 'diferencia':
+    print(f"Modo diferencia: Y @ C = D @ C[:N] (se leen {columnas_leidas} columnas en lugar de {2*N})")
+elif Modo_Matriz == 'perezosa':
+    print(f"Modo perezoso: Y @ C = 2·(S @ C) - I1·sum(C) (uint8, 1 byte por elemento en lugar de 2)")
+elif Modo_Matriz == 'bajo_rango':
+    print(f"Modo bajo rango: Y @ C ≈ US @ (V^T @ C) (rango {Operador_Intensidad.rango}, "
+          f"se leen {columnas_leidas} columnas float32 en lugar de {2*N} enteras)")
+
+print(f"Configuración chunks para Y @ C:")
 print(f"- Tamaño de chunk: {chunk_size:,} filas")
 print(f"- Total chunks: {num_chunks}")
-print(f"- RAM por chunk: {memoria_chunk_mb:.1f} MB")
-print(f"- Total píxeles a reconstruir: {total_filas:,}")
+print(f"- Lotes: {num_lotes} (pasadas por Y en lugar de {len(rutas_speckles)})")
+print(f"- Disco leído por lote: {Operador_Intensidad.nbytes / (1024**3):.2f} GB")
+print(f"- Total píxeles a reconstruir por speckle: {total_filas if pixeles_seleccion is None else len(filas_seleccion):,}")
 print(f"- Factor escala: 1/(2N) = 1/{2*N} = {1.0/(2*N):.6f}")
 
-# Validar que el chunk size es razonable (recomendación 1)
-if memoria_chunk_mb > 500:  # Más de 500 MB por chunk puede ser problemático
-    print(f"Advertencia: Chunk size grande ({memoria_chunk_mb:.1f} MB)")
-
-# Inicializar resultado final I_rec
-I_rec = np.zeros((total_filas, 1), dtype=np.float32)
-print(f"Vector reconstrucción I_rec inicializado: {I_rec.shape}, {I_rec.dtype}")
-
-# Procesar Y @ c por chunks (usando matriz de intensidad para invertir MMF)
-print("Iniciando reconstrucción I_rec = (1/(2N)) * Y @ c por chunks...")
-filas_procesadas = 0
-
-# Factor de escala precalculado (recomendación 5: mantener float32 durante cálculo)
-factor_escala = np.float32(1.0 / (2.0 * N))
-
-# Running min/max para evitar pasada adicional (recomendación 6)
-rec_min_running = np.float32(np.inf)
-rec_max_running = np.float32(-np.inf)
-
-for chunk_idx in range(num_chunks):
-    inicio = chunk_idx * chunk_size
-    fin = min((chunk_idx + 1) * chunk_size, total_filas)
-    filas_chunk = fin - inicio
-    
-    try:
-        # Cargar chunk de Y (matriz de intensidad) desde memmap y convertir a float32
-        y_chunk = Matriz_Intensidad[inicio:fin, :].astype(np.float32)
-        
-        # Validar dimensiones del chunk Y
-        if y_chunk.shape[1] != shape_I_esperada[1]:  # Debe tener 2N columnas (8192)
-            raise ValueError(f"Chunk Y {chunk_idx} tiene {y_chunk.shape[1]} columnas, "
-                           f"se esperaban {shape_I_esperada[1]} (2N)")
-        
-        # Aplicar fórmula de reconstrucción: I_rec = (1/(2*N)) * Y @ c
-        # Y @ c invierte la distorsión del MMF usando la caracterización previa
-        resultado_chunk = (factor_escala * (y_chunk @ intermedia)).astype(np.float32)
-        
-        # Validar resultado del chunk
-        if resultado_chunk.shape != (filas_chunk, 1):
-            raise ValueError(f"Resultado chunk {chunk_idx} tiene forma incorrecta: {resultado_chunk.shape}")
-        
-        # Almacenar resultado
-        I_rec[inicio:fin] = resultado_chunk
-        filas_procesadas += filas_chunk
-        
-        # Actualizar min/max running (recomendación 6: evitar pasada adicional)
-        chunk_min = resultado_chunk.min()
-        chunk_max = resultado_chunk.max()
-        rec_min_running = min(rec_min_running, chunk_min)
-        rec_max_running = max(rec_max_running, chunk_max)
-        
-        # Liberación explícita de memoria (recomendación 3)
-        del y_chunk, resultado_chunk
-        
-        # Liberación adicional cada 10 chunks
-        if (chunk_idx + 1) % 10 == 0:
-            gc.collect()  # Forzar recolección de basura
-        
-        # Mostrar progreso cada 10% (recomendación 2: reducir overhead I/O)
-        if chunk_idx % max(1, num_chunks//10) == 0 or chunk_idx == num_chunks - 1:
-            progreso = (chunk_idx + 1) / num_chunks * 100
-            print(f"Reconstrucción: {progreso:.1f}% ({filas_procesadas:,}/{total_filas:,} píxeles)")
-            
-    except Exception as e:
-        raise RuntimeError(f"Error procesando chunk reconstrucción {chunk_idx}: {e}")
-
-print(f"Reconstrucción I_rec completada: {filas_procesadas:,} píxeles procesados")
-
-# Liberación de memoria intermedia (recomendación 3)
-del intermedia  # Liberar vector correlación c (ya no se necesita)
-gc.collect()    # Forzar liberación antes de normalización
-
 # ===== EXPLICACIÓN TEÓRICA CORRECTA =====
 print(f"\n=== TEORÍA CORRECTA DE RECONSTRUCCIÓN ===")
 print("CONSTRUCCIÓN Y: Y = 2*Speckle_i - I₁ (ya aplicada en Matriz_Intensidad.py)")
-print("RECONSTRUCCIÓN: I_rec = (1/(2N)) * (Y @ c)")  
+print("RECONSTRUCCIÓN: I_rec = (1/(2N)) * (Y @ c)")
 print("RESULTADO: I_rec YA contiene la imagen correcta (sin necesidad de sumar I₁)")
 print("")
 print("IMPORTANTE: NO se debe sumar I₁ después, porque ya está")
 print("           implícito en la construcción de Y = 2*Speckle - I₁")
 
-# La reconstrucción I_rec YA es correcta tal como está
-# No necesitamos ninguna corrección DC adicional
-I_rec_final = I_rec.copy()
-print(f"I_rec final (sin corrección DC): rango=[{I_rec_final.min():.4f}, {I_rec_final.max():.4f}]")
-print(f"Media: {I_rec_final.mean():.4f}, Std: {I_rec_final.std():.4f}")
-
-# Usar directamente I_rec sin modificaciones
-I_rec = I_rec_final
-del I_rec_final
-gc.collect()
-
-# === PASO 5: NORMALIZACIÓN Y RESHAPE ===
-print(f"\n=== NORMALIZACIÓN I_rec → [0,255] Y RESHAPE ===")
-print("TEORÍA: Convertir float32 → uint8 para imagen final")
-print(f"\n=== NORMALIZACIÓN Y GUARDADO ===")
-
-# Normalizar a rango 0-255 sin binarización
-print("Normalizando a escala de grises 0-255...")
-
-# IMPORTANTE: Usar los valores directos de I_rec (sin corrección DC)
-rec_min, rec_max = I_rec.min(), I_rec.max()
-print(f"Estadísticas I_rec final: rango=[{rec_min:.4f}, {rec_max:.4f}]")
+# Factor de escala precalculado (recomendación 5: mantener float32 durante cálculo)
+factor_escala = np.float32(1.0 / (2.0 * N))
 
-# Normalización lineal a rango [0, 255]
 '''
 CASO ESPECIAL - VALORES CONSTANTES:
 La normalizacion min-max usa: I_norm = (I_rec - min) / (max - min) * 255
@@ -440,67 +415,166 @@ SOLUCION: Si max == min, asignar gris medio (128) en lugar de normalizar
 - Evita crashes por division por cero
 - Gris medio es neutro (no introduce bias hacia claro/oscuro)
 - Visualmente detectable -> indica problema en reconstruccion
+(normalizar_uint8 aplica esta regla por separado a cada speckle del lote)
 '''
-if rec_max != rec_min:  # Evitar división por cero
-    I_norm = ((I_rec - rec_min) / (rec_max - rec_min) * 255.0).astype(np.uint8)
-    print(f"Normalización aplicada: [{rec_min:.4f}, {rec_max:.4f}] → [0, 255]")
-else:
-    # Si todos los valores son iguales, asignar valor medio
-    I_norm = np.full_like(I_rec, 128, dtype=np.uint8)
-    print("Advertencia: Todos los valores son iguales, asignando valor medio (128)")
-
-# Liberación de I_rec tras conversión (recomendación 3, 5)
-del I_rec  # Liberar float32, mantener solo uint8 final
-gc.collect()   # Liberar 5MB adicionales
-
-# Validacion rapida resultado normalizado
-print(f"Rango despues de normalizacion: [{I_norm.min()}, {I_norm.max()}]")
-
-# Reshape a imagen 2D (paso final)
-print(f"Convirtiendo vector a imagen {shape_img_esperada}...")
-try:
-    img_rec = I_norm.reshape(shape_img_esperada)
-    print(f"Imagen reconstruida: {img_rec.shape}, dtype={img_rec.dtype}")
-    
-    # Validar que no hay overflow en el reshape
-    if img_rec.size != I_norm.size:
-        raise ValueError(f"Error en reshape: tamaños diferentes {img_rec.size} vs {I_norm.size}")
-        
-except ValueError as e:
-    raise ValueError(f"Error en reshape: {e}. "
-                    f"Vector tiene {I_norm.size} elementos, "
-                    f"imagen requiere {shape_img_esperada[0] * shape_img_esperada[1]}")
-
-# Liberación de I_norm tras reshape (recomendación 3)
-del I_norm  # Solo mantener img_rec final
-
-# Estadisticas finales simplificadas (evitar calculos costosos)
-print(f"Imagen reconstruida: {img_rec.shape}, dtype={img_rec.dtype}")
-print(f"Rango valores finales: [{img_rec.min()}, {img_rec.max()}]")
-
-# Guardar imagen con validacion
-nombre_salida = f'reconstruida_panda_{os.path.basename(Path_Speckle_a_Reconstruir)}'
-ruta_completa = os.path.join(Output_Path, nombre_salida)
 
-try:
-    resultado_guardado = cv2.imwrite(ruta_completa, img_rec)
-    if not resultado_guardado:
-        raise RuntimeError("cv2.imwrite devolvio False")
-    
-    # Verificar que el archivo se guardo correctamente
-    if os.path.exists(ruta_completa):
-        tamano_archivo_kb = os.path.getsize(ruta_completa) / 1024
-        print(f"Imagen guardada exitosamente: {nombre_salida} ({tamano_archivo_kb:.1f} KB)")
+import time
+if Motor_Reconstruccion != 'filtro_adaptado':
+    # G = A^T A se calcula una sola vez (o se lee de la caché) para todos los lotes y todos los λ
+    print(f"\n=== MOTOR DE TIKHONOV: MATRIZ DE GRAM ===")
+    inicio_gram = time.time()
+    if Motor_Reconstruccion == 'compresivo':
+        Inversion_Tikhonov = InversionCompresiva(Operador_Intensidad, Matriz_Hadamard_T.T, patrones_medidos,
+                                                 lam_dispersion=Lambda_Dispersion,
+                                                 iteraciones=Iteraciones_Dispersion, ruta_gram=Path_Gram,
+                                                 chunk_filas=chunk_size)
     else:
-        raise FileNotFoundError("El archivo no se creo correctamente")
-        
-except Exception as e:
-    raise RuntimeError(f"Error al guardar imagen: {e}")
-
+        Inversion_Tikhonov = InversionTikhonov(Operador_Intensidad, Matriz_Hadamard_T.T, ruta_gram=Path_Gram,
+                                               chunk_filas=chunk_size)
+    print(f"Gram {Inversion_Tikhonov.G.shape} lista en {time.time() - inicio_gram:.1f}s "
+          f"(autovalor medio: {Inversion_Tikhonov.escala:.3e})")
+
+Producto_Paralelo = None
+if Motor_Reconstruccion == 'filtro_adaptado' and Num_Procesos > 1 and pixeles_seleccion is None:
+    # Procesos creados una sola vez (fork): heredan los memmaps y atienden todos los lotes
+    Producto_Paralelo = ProductoParalelo(Operador_Intensidad, Num_Procesos, B_maximo=B_maximo,
+                                         chunk_size=chunk_size, num_buffers=Num_Buffers_Precarga,
+                                         alineacion=getattr(Operador_Intensidad.matrices[0], 'tesela', (1,))[0])
+    print(f"\nReconstrucción en {Producto_Paralelo.num_procesos} procesos, franjas de "
+          f"{Producto_Paralelo.franjas[0][1]:,} filas (C e I_rec en memoria compartida)")
+
+rutas_guardadas = []
+inicio_total = time.time()
+
+for lote_idx in range(num_lotes):
+    rutas_lote = rutas_speckles[lote_idx * Tamano_Lote:(lote_idx + 1) * Tamano_Lote]
+    B = len(rutas_lote)
+    print(f"\n=== LOTE {lote_idx+1}/{num_lotes}: {B} SPECKLES ===")
+
+    # === Speckles a reconstruir ===
+    # Vectorizar speckles (orden C) como columnas float32 para evitar overflow en operaciones
+    I_out = cargar_speckles(rutas_lote, shape_img_esperada)
+    print(f"Matriz speckles I_out: forma={I_out.shape}, dtype={I_out.dtype}")
+
+    # Validar que los vectores tienen el tamaño correcto
+    if I_out.shape[0] != pixels_imagen:
+        raise ValueError(f"Vectores speckle tienen {I_out.shape[0]} elementos, "
+                        f"se esperaban {pixels_imagen}")
+
+    if Motor_Reconstruccion != 'filtro_adaptado':
+        # === PASO 3-4 (TIKHONOV): b = A^T · I_out (una pasada), a = (G + λI)^-1 b, I_rec = X · a ===
+        print("Iniciando inversión de Tikhonov (una pasada A^T · I_out por el lote)...")
+        inicio_lote = time.time()
+        b_tikhonov = Inversion_Tikhonov.correlacion(I_out[indices_activos] if Usar_Mascara else I_out)
+        del I_out
+        if Lambdas_Barrido:
+            # Barrido de λ: una sola descomposición de G, sin pasadas extra por disco
+            coeficientes = Inversion_Tikhonov.barrido(b_tikhonov, Lambdas_Barrido)
+            resultados = [(f'reconstruida_lambda{lam:g}_', Inversion_Tikhonov.imagen(a))
+                          for lam, a in zip(Lambdas_Barrido, coeficientes)]
+        else:
+            resultados = [('reconstruida_', Inversion_Tikhonov.imagen(
+                Inversion_Tikhonov.coeficientes(b_tikhonov, Lambda_Tikhonov)))]
+        del b_tikhonov
+        if pixeles_seleccion is not None:
+            # Tikhonov resuelve los coeficientes globales: la selección solo recorta la imagen
+            resultados = [(prefijo, I_rec[pixeles_seleccion]) for prefijo, I_rec in resultados]
+        tiempo_lote = time.time() - inicio_lote
+        print(f"Inversión del lote completada en {tiempo_lote:.1f}s ({tiempo_lote / B:.2f} s/speckle)")
+    else:
+        # ==== PASO 3: CORRELACIÓN C = X^T · I_out (implícita, una FWHT por speckle) =====
+        inicio_hadamard = time.time()
+        try:
+            intermedia = Matriz_Hadamard_T @ I_out  # (2N, B) float32
+        except Exception as e:
+            raise RuntimeError(f"Error en correlación implícita: {e}")
+        tiempo_hadamard = time.time() - inicio_hadamard
+        print(f"Correlación C = X^T @ I_out completada en {tiempo_hadamard*1000:.1f} ms: {intermedia.shape}, dtype={intermedia.dtype}")
+
+        # Validar resultado correlación - solo forma (rápido)
+        if intermedia.shape != (Matriz_Hadamard_T.shape[0], B):
+            raise ValueError(f"Matriz correlación tiene forma incorrecta: {intermedia.shape}")
+
+        del I_out  # La correlación ya resume los speckles del lote
+
+        # === PASO 4: RECONSTRUCCIÓN I_rec = (1/(2N)) * Y @ C (una pasada por Y para todo el lote) ===
+        print("Iniciando reconstrucción I_rec = (1/(2N)) * Y @ C por chunks...")
+        inicio_lote = time.time()
+        if pixeles_seleccion is not None:
+            I_rec = Operador_Intensidad.producto_seleccion(intermedia, filas_seleccion, chunk_size=chunk_size)
+        elif Producto_Paralelo is not None:
+            I_rec = Producto_Paralelo.producto(intermedia)
+        else:
+            I_rec = Operador_Intensidad.producto(intermedia, chunk_size=chunk_size, num_buffers=Num_Buffers_Precarga)
+        I_rec *= factor_escala
+        tiempo_lote = time.time() - inicio_lote
+
+        # Validar resultado
+        if I_rec.shape != (total_filas if pixeles_seleccion is None else len(filas_seleccion), B):
+            raise ValueError(f"I_rec tiene forma incorrecta: {I_rec.shape}")
+        print(f"Reconstrucción del lote completada en {tiempo_lote:.1f}s ({tiempo_lote / B:.2f} s/speckle)")
+        if Producto_Paralelo is None and pixeles_seleccion is None:
+            print(f"Ancho de banda de lectura: {Operador_Intensidad.lector.ancho_banda / (1024**2):.0f} MB/s "
+                  f"(espera por disco: {Operador_Intensidad.lector.tiempo_espera:.1f}s de {tiempo_lote:.1f}s)")
+
+        # Liberación de memoria intermedia (recomendación 3)
+        del intermedia  # Liberar matriz correlación C (ya no se necesita)
+        gc.collect()    # Forzar liberación antes de normalización
+
+        if Usar_Mascara and pixeles_seleccion is not None:
+            I_rec = dispersar(I_rec, activos_seleccion, len(pixeles_seleccion))
+        elif Usar_Mascara:
+            # Filas activas → cuadro completo (píxeles inactivos al mínimo de cada speckle)
+            I_rec = dispersar(I_rec, indices_activos, pixels_imagen)
+
+        resultados = [('reconstruida_', I_rec)]
+        del I_rec
+
+    for prefijo, I_rec in resultados:
+        # === PASO 5: NORMALIZACIÓN Y RESHAPE ===
+        # IMPORTANTE: Usar los valores directos de I_rec (sin corrección DC)
+        for j, ruta in enumerate(rutas_lote):
+            print(f"{os.path.basename(ruta)}: I_rec rango=[{I_rec[:, j].min():.4f}, {I_rec[:, j].max():.4f}], "
+                  f"Media: {I_rec[:, j].mean():.4f}, Std: {I_rec[:, j].std():.4f}")
+        imagenes_rec = normalizar_uint8(I_rec, shape_salida)
+
+        # Liberación de I_rec tras conversión (recomendación 3, 5)
+        del I_rec  # Liberar float32, mantener solo uint8 final
+        gc.collect()
+
+        # Guardar imágenes con validacion
+        for ruta, img_rec in zip(rutas_lote, imagenes_rec):
+            nombre_salida = f'{prefijo}{os.path.basename(ruta)}'
+            ruta_completa = os.path.join(Output_Path, nombre_salida)
+
+            try:
+                resultado_guardado = cv2.imwrite(ruta_completa, img_rec)
+                if not resultado_guardado:
+                    raise RuntimeError("cv2.imwrite devolvio False")
+
+                # Verificar que el archivo se guardo correctamente
+                if os.path.exists(ruta_completa):
+                    tamano_archivo_kb = os.path.getsize(ruta_completa) / 1024
+                    print(f"Imagen guardada exitosamente: {nombre_salida} ({tamano_archivo_kb:.1f} KB)")
+                else:
+                    raise FileNotFoundError("El archivo no se creo correctamente")
+
+            except Exception as e:
+                raise RuntimeError(f"Error al guardar imagen {nombre_salida}: {e}")
+            rutas_guardadas.append(ruta_completa)
+
+        del imagenes_rec
+    del resultados
+
+if Producto_Paralelo is not None:
+    Producto_Paralelo.cerrar()
+
+tiempo_total = time.time() - inicio_total
 print(f"\n=== RESUMEN FINAL ===")
 print(f"Reconstruccion completada exitosamente")
-print(f"Archivo de salida: {ruta_completa}")
-print(f"Imagen original: {shape_img_esperada}")
-print(f"Imagen reconstruida: {img_rec.shape}")
+print(f"Speckles reconstruidos: {len(rutas_guardadas)} en {num_lotes} pasada(s) por Y")
+print(f"Directorio de salida: {Output_Path}")
+print(f"Imagen original: {shape_img_esperada}" + (f", reconstruida: {shape_salida}" if pixeles_seleccion is not None else ""))
 print(f"Rango valores finales: [0, 255]")  # Siempre uint8 tras normalizacion
-print(f"RAM maxima utilizada: ~{memoria_chunk_mb:.1f} MB por chunk")
+print(f"Tiempo total: {tiempo_total:.1f}s ({tiempo_total / len(rutas_guardadas):.2f} s/speckle)")
+print(f"RAM maxima utilizada: ~{memoria_plan_mb:.1f} MB (plan de memoria: chunks + lote)")
@@ -0,0 +1,112 @@
+import numpy as np
+import os
+import time
+from numpy.lib.format import open_memmap
+from Lector_Chunks import LectorChunks
+
+'''
+SVD aleatoria de rango k de la matriz de intensidad almacenada (Y o D), fuera de memoria.
+
+La matriz es muy alta (M = 1310720 filas) y estrecha (n = 4096 u 8192 columnas), así que todo
+el trabajo denso se hace en el espacio de columnas (n × l, l = k + sobremuestreo) y las filas
+solo se recorren por chunks:
+
+1. Iteración de subespacio: Q ← orth(Y^T Y Q), una pasada por Y por iteración
+   (W += Y_c^T (Y_c Q) por chunk; también se acumula ||Y||_F² para medir la energía capturada).
+2. Rayleigh–Ritz: B = Y Q (M × l, a un .npy temporal) y G = B^T B = V_b Λ V_b^T,
+   valores singulares σ = sqrt(λ) y V = Q V_b.
+3. US = B V_b[:, :k] recorriendo B (M × l float32, mucho menor que Y).
+
+Y ≈ US · V^T con US = U·Σ (M × k) y V (n × k), ambos float32.
+'''
+
+
+def _pasadas_filas(operador, chunk_filas):
+    '''Recorre la matriz almacenada del operador como bloques densos float32.'''
+    for inicio, fin, bloques in LectorChunks(operador.matrices, chunk_filas):
+        yield inicio, fin, operador._filas_densas(bloques)
+
+
+def svd_aleatoria(operador, rango, ruta_US, sobremuestreo=16, iteraciones_potencia=2,
+                  chunk_filas=8192, semilla=0, progreso=True):
+    '''
+    SVD aleatoria de rango `rango` de la matriz almacenada por `operador` (Operadores_Intensidad.py).
+
+    Parámetros:
+    - operador: IntensityMatrix, DifferenceMatrix o LazyIntensityMatrix
+    - rango: k, número de valores singulares a conservar
+    - ruta_US: .npy donde se escribe US = U·Σ (M × k float32)
+    - sobremuestreo: columnas extra del subespacio aleatorio (l = k + sobremuestreo)
+    - iteraciones_potencia: pasadas Q ← orth(Y^T Y Q) (≥ 1; 2 suele bastar con espectro que decae)
+    - chunk_filas: filas por chunk en las pasadas sobre Y
+
+    Retorna:
+    - US: memmap (M × k) float32
+    - S: valores singulares (k,) float64, ordenados de mayor a menor
+    - V: array (n × k) float32
+    - energia_total: ||Y||_F² (para medir la energía capturada por cada rango)
+    '''
+    M, n = operador.M, operador.columnas_efectivas
+    l = min(n, rango + sobremuestreo)
+    if not 0 < rango <= l:
+        raise ValueError(f"rango debe estar en [1, {n}], se recibió {rango}")
+    if iteraciones_potencia < 1:
+        raise ValueError("Se necesita al menos una iteración de potencia")
+
+    rng = np.random.default_rng(semilla)
+    Q, _ = np.linalg.qr(rng.standard_normal((n, l)))
+    energia_total = 0.0
+
+    # === 1. Iteración de subespacio en el espacio de columnas ===
+    for iteracion in range(iteraciones_potencia):
+        inicio_tiempo = time.time()
+        Q32 = Q.astype(np.float32)
+        W = np.zeros((n, l), dtype=np.float64)
+        energia = 0.0
+        for inicio, fin, filas in _pasadas_filas(operador, chunk_filas):
+            W += filas.T @ (filas @ Q32)
+            if iteracion == 0:
+                energia += float(np.einsum('ij,ij->', filas, filas, dtype=np.float64))
+        if iteracion == 0:
+            energia_total = energia
+        Q, _ = np.linalg.qr(W)
+        if progreso:
+            print(f"SVD: iteración de potencia {iteracion + 1}/{iteraciones_potencia} - {time.time() - inicio_tiempo:.1f}s")
+
+    # === 2. Rayleigh–Ritz: B = Y Q a disco temporal, G = B^T B ===
+    inicio_tiempo = time.time()
+    ruta_B = ruta_US + '.tmp_B.npy'
+    B = open_memmap(ruta_B, mode='w+', dtype=np.float32, shape=(M, l))
+    Q32 = Q.astype(np.float32)
+    G = np.zeros((l, l), dtype=np.float64)
+    for inicio, fin, filas in _pasadas_filas(operador, chunk_filas):
+        B_chunk = filas @ Q32
+        B[inicio:fin] = B_chunk
+        G += B_chunk.T.astype(np.float64) @ B_chunk
+    B.flush()
+    autovalores, V_b = np.linalg.eigh(G)
+    orden = np.argsort(autovalores)[::-1][:rango]
+    S = np.sqrt(np.maximum(autovalores[orden], 0.0))
+    V_b = V_b[:, orden]
+    V = (Q @ V_b).astype(np.float32)
+    if progreso:
+        print(f"SVD: Rayleigh–Ritz - {time.time() - inicio_tiempo:.1f}s")
+
+    # === 3. US = B V_b (recorre B, M × l float32) ===
+    inicio_tiempo = time.time()
+    US = open_memmap(ruta_US, mode='w+', dtype=np.float32, shape=(M, rango))
+    V_b32 = V_b.astype(np.float32)
+    for inicio, fin, (B_chunk,) in LectorChunks([B], chunk_filas * 4):
+        US[inicio:fin] = B_chunk @ V_b32
+    US.flush()
+    del B
+    os.remove(ruta_B)
+    if progreso:
+        print(f"SVD: US = B·V_b escrito en {ruta_US} - {time.time() - inicio_tiempo:.1f}s")
+
+    return US, S, V, energia_total
+
+
+def energia_capturada(S, energia_total):
+    '''Fracción de ||Y||_F² capturada por los primeros r valores singulares, para cada r.'''
+    return np.cumsum(np.asarray(S, dtype=np.float64) ** 2) / energia_total
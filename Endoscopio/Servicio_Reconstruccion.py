@@ -0,0 +1,148 @@
+import numpy as np
+import json
+import socket
+import struct
+import time
+
+'''
+Protocolo y cliente del servidor de reconstrucción (Servidor_Reconstruccion.py).
+
+El servidor abre la calibración una vez (memmaps, operador Hadamard, diagnósticos, buffers y
+kernels compilados) y atiende peticiones por un socket Unix o TCP en localhost; cada petición
+solo paga la correlación y la pasada por Y:
+
+    with ClienteReconstruccion('/tmp/endoscopio_reconstruccion.sock') as cliente:
+        imagenes, metricas = cliente.reconstruir(frames)          # (B, alto, ancho) uint8
+        imagenes, metricas = cliente.reconstruir(rutas=['a.png'])  # el servidor lee los archivos (Directorio_Rutas)
+        recorte, metricas = cliente.reconstruir(frames, region=(200, 456, 300, 556), paso=2)
+
+Mensaje: longitud de la cabecera (uint64 big-endian) + cabecera JSON + datos binarios opcionales
+(`bytes` en la cabecera). Los arrays viajan en crudo, orden C, con `shape` y `dtype` en la cabecera:
+sin pickle, así que el servidor no ejecuta nada que venga del cliente.
+Operaciones: 'reconstruir', 'estado' y 'detener'. Las respuestas llevan `ok` y, si falla, `error`.
+'''
+
+_LONGITUD = struct.Struct('>Q')
+
+
+def _recibir_exacto(conexion, n):
+    datos = bytearray(n)
+    vista = memoryview(datos)
+    recibidos = 0
+    while recibidos < n:
+        leidos = conexion.recv_into(vista[recibidos:], n - recibidos)
+        if leidos == 0:
+            raise ConnectionError(f"Conexión cerrada tras {recibidos} de {n} bytes")
+        recibidos += leidos
+    return datos
+
+
+def enviar_mensaje(conexion, cabecera, datos=None):
+    '''Envía una cabecera (dict) y, opcionalmente, un array como bloque binario.'''
+    cabecera = dict(cabecera)
+    if datos is not None:
+        datos = np.ascontiguousarray(datos)
+        cabecera.update(shape=list(datos.shape), dtype=datos.dtype.str, bytes=datos.nbytes)
+    texto = json.dumps(cabecera).encode('utf-8')
+    conexion.sendall(_LONGITUD.pack(len(texto)) + texto)
+    if datos is not None:
+        conexion.sendall(memoryview(datos).cast('B'))
+
+
+def recibir_mensaje(conexion):
+    '''
+    Recibe un mensaje.
+
+    Retorna:
+    - (cabecera, array o None); None en lugar de la tupla si el otro extremo cerró la conexión
+    '''
+    try:
+        longitud, = _LONGITUD.unpack(_recibir_exacto(conexion, _LONGITUD.size))
+    except ConnectionError:
+        return None
+    cabecera = json.loads(_recibir_exacto(conexion, longitud).decode('utf-8'))
+    datos = None
+    if cabecera.get('bytes'):
+        datos = np.frombuffer(_recibir_exacto(conexion, cabecera['bytes']),
+                              dtype=np.dtype(cabecera['dtype'])).reshape(cabecera['shape'])
+    return cabecera, datos
+
+
+def conectar(direccion, timeout=None):
+    '''Socket conectado a `direccion`: ruta de socket Unix (str) o (host, puerto) TCP.'''
+    if isinstance(direccion, str):
+        conexion = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    else:
+        conexion = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        conexion.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    conexion.settimeout(timeout)
+    conexion.connect(direccion if isinstance(direccion, str) else tuple(direccion))
+    return conexion
+
+
+class ClienteReconstruccion:
+    '''
+    Cliente de Servidor_Reconstruccion.py sobre una conexión persistente.
+
+    Parámetros:
+    - direccion: ruta del socket Unix o (host, puerto)
+    - timeout: segundos de espera por respuesta (None = sin límite)
+    '''
+
+    def __init__(self, direccion, timeout=None):
+        self.conexion = conectar(direccion, timeout)
+
+    def _pedir(self, cabecera, datos=None):
+        enviar_mensaje(self.conexion, cabecera, datos)
+        respuesta = recibir_mensaje(self.conexion)
+        if respuesta is None:
+            raise ConnectionError("El servidor cerró la conexión")
+        cabecera, datos = respuesta
+        if not cabecera.get('ok'):
+            raise RuntimeError(f"Error del servidor: {cabecera.get('error')}")
+        return cabecera, datos
+
+    def reconstruir(self, frames=None, rutas=None, normalizar=True, region=None, paso=1):
+        '''
+        Reconstruye speckles enviados como array o como rutas legibles por el servidor.
+
+        Parámetros:
+        - frames: array (alto, ancho) o (B, alto, ancho), uint8/uint16/float32
+        - rutas: lista de rutas de imagen (alternativa a frames), dentro del Directorio_Rutas del servidor
+        - normalizar: True → imágenes uint8 [0, 255]; False → I_rec float32 sin normalizar
+        - region, paso: solo una región (fila_inicio, fila_fin, columna_inicio, columna_fin) y/o uno
+          de cada `paso` píxeles; el servidor solo calcula esas filas de Y
+
+        Retorna:
+        - imagenes: array (B, alto, ancho)
+        - metricas: dict con los tiempos del servidor (ms) y la latencia total vista por el cliente
+        '''
+        if (frames is None) == (rutas is None):
+            raise ValueError("Indicar frames o rutas (solo uno de los dos)")
+        inicio = time.perf_counter()
+        peticion = {'op': 'reconstruir', 'normalizar': normalizar, 'region': region, 'paso': paso}
+        if frames is not None:
+            frames = np.asarray(frames)
+            cabecera, imagenes = self._pedir(peticion, frames[None] if frames.ndim == 2 else frames)
+        else:
+            cabecera, imagenes = self._pedir(dict(peticion, rutas=list(rutas)))
+        metricas = dict(cabecera.get('metricas', {}))
+        metricas['latencia_cliente_ms'] = (time.perf_counter() - inicio) * 1000
+        return imagenes, metricas
+
+    def estado(self):
+        '''Configuración y contadores del servidor.'''
+        return self._pedir({'op': 'estado'})[0]
+
+    def detener(self):
+        '''Pide al servidor que termine (después de responder); requiere Permitir_Detener en el servidor.'''
+        self._pedir({'op': 'detener'})
+
+    def cerrar(self):
+        self.conexion.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.cerrar()
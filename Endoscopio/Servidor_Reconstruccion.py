@@ -0,0 +1,212 @@
+import numpy as np
+import os
+import socketserver
+import threading
+import time
+from Reconstruccion import Reconstructor
+from Servicio_Reconstruccion import enviar_mensaje, recibir_mensaje
+
+'''
+Servidor de reconstrucción persistente: la calibración se abre una sola vez.
+
+Reconstruccion_Imagen_Sin_RVITM.py reabre los memmaps, repite los diagnósticos (verificación del
+operador Hadamard, estadísticas de una muestra de Y), planifica y reserva buffers y compila los
+kernels en cada ejecución, aunque sea para un solo speckle. Este script hace todo eso al arrancar y
+queda escuchando en un socket Unix (o TCP en localhost); cada petición solo paga:
+    C = X^T · I_out (FWHT)  →  I_rec = (1/(2N)) · Y @ C  →  normalización
+Cliente y protocolo: Servicio_Reconstruccion.py (ClienteReconstruccion).
+
+La calibración es un Reconstructor (Reconstruccion.py) residente. Residencia de la calibración:
+- Cargar_En_RAM: copia las matrices del operador a RAM si caben en el presupuesto de memoria
+  (Planificador_Memoria.py); típico con los factores de bajo rango (M × k float32) o con D en un
+  servidor grande. 'auto' decide según el tamaño.
+- Precalentar: una pasada de arranque que compila los kernels de numba y, si las matrices se
+  quedan en disco, trae sus páginas a la caché del sistema para las primeras peticiones.
+Las peticiones se atienden de una en una (el operador y sus buffers son compartidos); las conexiones
+son persistentes, así que un cliente no paga la conexión en cada imagen.
+
+Acceso: el socket Unix se crea con permisos 0600 (solo el usuario del servidor). Las peticiones con
+rutas solo leen archivos dentro de Directorio_Rutas y 'detener' solo se acepta con Permitir_Detener;
+ambas están desactivadas por defecto, en especial para TCP, donde cualquier usuario de la máquina conecta.
+'''
+
+print("=== SERVIDOR DE RECONSTRUCCIÓN ===")
+inicio_arranque = time.time()
+
+# === Configuración ===
+Direccion = '/tmp/endoscopio_reconstruccion.sock'  # Socket Unix, o ('127.0.0.1', 5050) para TCP (sin control de acceso)
+Path_Matriz_Intensidad = '/home/manuel/temp_intensity/Matriz_Intensidad.fcm'
+Path_Matriz_Diferencia = '/home/manuel/temp_intensity/Matriz_Diferencia.fcm'
+Path_Speckles_H1 = '/home/manuel/temp_intensity/speckles_H1_vectorizados.fcm'
+Path_Speckles_H2 = '/home/manuel/temp_intensity/speckles_H2_vectorizados.fcm'
+Path_SVD_US = '/home/manuel/temp_intensity/svd_US.npy'
+Path_SVD_V = '/home/manuel/temp_intensity/svd_V.npy'
+Rango_Reconstruccion = None   # Modo 'bajo_rango': r ≤ k columnas de la SVD (None = todas)
+Modo_Matriz = 'diferencia'    # 'diferencia', 'completa', 'perezosa' o 'bajo_rango'
+Usar_Mascara = False
+Path_Mascara = '/home/manuel/temp_intensity/mascara_pixeles.npy'
+pattern_size = 64
+DMD_size = (1280, 1024)       # (ancho, alto) del lienzo vectorizado
+shape_img = (1024, 1280)      # (alto, ancho) de los speckles
+Tamano_Lote = 32              # Speckles por pasada por Y (peticiones más grandes se dividen)
+Num_Procesos = 1              # >1: filas de Y repartidas entre procesos (Producto_Paralelo.py)
+Num_Buffers_Precarga = 2
+Memoria_GB = None             # Presupuesto de RAM (None = según la RAM libre)
+Cargar_En_RAM = 'auto'        # True, False o 'auto' (si las matrices caben en el presupuesto)
+Precalentar = True
+Directorio_Rutas = None       # Peticiones con rutas: solo archivos dentro de este directorio (None = rechazadas)
+Permitir_Detener = False      # True: la operación 'detener' de un cliente apaga el servidor
+
+# === Calibración (una sola vez) ===
+if Modo_Matriz == 'diferencia':
+    rutas = (Path_Matriz_Diferencia,)
+elif Modo_Matriz == 'completa':
+    rutas = (Path_Matriz_Intensidad,)
+elif Modo_Matriz == 'perezosa':
+    rutas = (Path_Speckles_H1, Path_Speckles_H2)
+else:
+    rutas = (Path_SVD_US, Path_SVD_V)
+Reconstructor_Residente = Reconstructor.desde_archivos(
+    Modo_Matriz, rutas, rango=Rango_Reconstruccion, pattern_size=pattern_size, DMD_size=DMD_size,
+    shape_img=shape_img, ruta_mascara=Path_Mascara if Usar_Mascara else None, tamano_lote=Tamano_Lote,
+    num_procesos=Num_Procesos, num_buffers=Num_Buffers_Precarga, memoria_gb=Memoria_GB,
+    cargar_en_ram=Cargar_En_RAM, progreso=True)
+Reconstructor_Residente.progreso = False  # Solo el plan de memoria al arrancar
+operador = Reconstructor_Residente.operador
+print(f"Operador: {type(operador).__name__} {operador.shape}, {operador.nbytes / (1024**3):.2f} GB por pasada "
+      f"({'en RAM' if Reconstructor_Residente.en_ram else 'memmap en disco'})")
+print(f"Operador Hadamard verificado, chunk de {Reconstructor_Residente.chunk_size:,} filas")
+
+if Precalentar:
+    # Compila los kernels y, con las matrices en disco, llena la caché de páginas
+    inicio = time.time()
+    Reconstructor_Residente.precalentar()
+    print(f"Precalentamiento: {time.time() - inicio:.1f}s")
+
+estadisticas = {'peticiones': 0, 'speckles': 0, 'errores': 0, 'tiempo_ms': 0.0}
+cerrojo = threading.Lock()
+
+
+def validar_rutas(rutas):
+    '''Rutas reales de la petición (relativas a Directorio_Rutas); error si alguna sale de ese directorio.'''
+    if Directorio_Rutas is None:
+        raise PermissionError("Peticiones con rutas desactivadas (Directorio_Rutas = None)")
+    base = os.path.realpath(Directorio_Rutas)
+    reales = [os.path.realpath(os.path.join(base, ruta)) for ruta in rutas]
+    for ruta, real in zip(rutas, reales):
+        if os.path.commonpath([base, real]) != base:
+            raise PermissionError(f"{ruta} está fuera de {Directorio_Rutas}")
+    return reales
+
+
+def reconstruir(cabecera, frames):
+    '''Atiende una petición 'reconstruir'. Retorna (cabecera de respuesta, array).'''
+    normalizar = cabecera.get('normalizar', True)
+    # Región de interés / submuestreo: solo se calculan esas filas de Y (JSON trae listas)
+    region = tuple(cabecera['region']) if cabecera.get('region') else None
+    paso = cabecera.get('paso', 1)
+    paso = tuple(paso) if isinstance(paso, list) else paso
+    totales = dict(Reconstructor_Residente.totales)
+    t0 = time.perf_counter()
+    if cabecera.get('rutas'):
+        salida = np.stack([imagen for _, imagen in
+                           Reconstructor_Residente.flujo(validar_rutas(cabecera['rutas']), normalizar, region, paso)])
+    elif frames is not None:
+        salida = Reconstructor_Residente.reconstruir(frames, normalizar, region, paso)
+    else:
+        raise ValueError("La petición no trae frames ni rutas")
+    total_ms = (time.perf_counter() - t0) * 1000
+    metricas = {clave: valor - totales.get(clave, 0) for clave, valor in Reconstructor_Residente.totales.items()
+                if clave.endswith('_ms')}
+    metricas['carga_ms'] = total_ms - sum(metricas.values())  # Lectura de archivos / copia a I_out
+    return {'ok': True, 'metricas': metricas}, salida
+
+
+class ManejadorReconstruccion(socketserver.BaseRequestHandler):
+    '''Una conexión: mensajes en secuencia hasta que el cliente cierra.'''
+
+    def handle(self):
+        while True:
+            operacion = None
+            try:
+                # Un mensaje mal formado (JSON, dtype o forma) también recibe respuesta de error
+                mensaje = recibir_mensaje(self.request)
+                if mensaje is None:
+                    return
+                cabecera, datos = mensaje
+                if not isinstance(cabecera, dict):
+                    raise ValueError("La cabecera no es un objeto JSON")
+            except ConnectionError:
+                return  # Cerrada a mitad de mensaje: no hay a quién responder
+            except Exception as e:
+                self.responder_error(operacion, e)
+                return  # Sin cabecera válida no se sabe dónde empieza el siguiente mensaje
+            operacion = cabecera.get('op')
+            inicio = time.perf_counter()
+            respuesta, salida = {'ok': True}, None
+            try:
+                if operacion == 'reconstruir':
+                    with cerrojo:
+                        espera_ms = (time.perf_counter() - inicio) * 1000
+                        respuesta, salida = reconstruir(cabecera, datos)
+                        respuesta['metricas']['espera_cola_ms'] = espera_ms
+                        respuesta['metricas']['servidor_ms'] = (time.perf_counter() - inicio) * 1000
+                        estadisticas['peticiones'] += 1
+                        estadisticas['speckles'] += len(salida)
+                        estadisticas['tiempo_ms'] += respuesta['metricas']['servidor_ms']
+                        print(f"Petición {estadisticas['peticiones']}: {len(salida)} speckle(s) en "
+                              f"{respuesta['metricas']['servidor_ms']:.1f} ms")
+                elif operacion == 'estado':
+                    with cerrojo:
+                        respuesta.update(estadisticas)
+                    respuesta.update(modo=Modo_Matriz, shape=list(operador.shape), shape_img=list(shape_img),
+                                     chunk_size=Reconstructor_Residente.chunk_size, procesos=max(1, Num_Procesos),
+                                     en_ram=Reconstructor_Residente.en_ram)
+                elif operacion == 'detener':
+                    if not Permitir_Detener:
+                        raise PermissionError("Operación 'detener' desactivada (Permitir_Detener = False)")
+                    threading.Thread(target=self.server.shutdown, daemon=True).start()
+                else:
+                    raise ValueError(f"Operación desconocida: {operacion}")
+            except Exception as e:
+                self.responder_error(operacion, e)
+                continue
+            enviar_mensaje(self.request, respuesta, salida)
+
+    def responder_error(self, operacion, e):
+        with cerrojo:
+            estadisticas['errores'] += 1
+        respuesta = {'ok': False, 'error': f"{type(e).__name__}: {e}"}
+        print(f"Error en petición '{operacion}': {respuesta['error']}")
+        enviar_mensaje(self.request, respuesta)
+
+
+# === Servidor ===
+if isinstance(Direccion, str):
+    if os.path.exists(Direccion):
+        os.remove(Direccion)  # Socket de una ejecución anterior
+    mascara_anterior = os.umask(0o177)  # Socket creado ya con permisos 0600, sin ventana entre bind y chmod
+    try:
+        Servidor = socketserver.ThreadingUnixStreamServer(Direccion, ManejadorReconstruccion)
+    finally:
+        os.umask(mascara_anterior)
+else:
+    socketserver.ThreadingTCPServer.allow_reuse_address = True
+    Servidor = socketserver.ThreadingTCPServer(tuple(Direccion), ManejadorReconstruccion)
+Servidor.daemon_threads = True
+
+print(f"\nCalibración lista en {time.time() - inicio_arranque:.1f}s. Escuchando en {Direccion}")
+try:
+    Servidor.serve_forever()
+except KeyboardInterrupt:
+    pass
+finally:
+    Servidor.server_close()
+    Reconstructor_Residente.cerrar()
+    if isinstance(Direccion, str) and os.path.exists(Direccion):
+        os.remove(Direccion)
+
+print(f"\n=== SERVIDOR DETENIDO ===")
+print(f"Peticiones: {estadisticas['peticiones']}, speckles: {estadisticas['speckles']}, errores: {estadisticas['errores']}")
+if estadisticas['peticiones']:
+    print(f"Latencia media en el servidor: {estadisticas['tiempo_ms'] / estadisticas['peticiones']:.1f} ms por petición")
@@ -0,0 +1,83 @@
+import numpy as np
+import os
+import shutil
+import time
+from Contenedor_Matriz import abrir_matriz, verificar_contenedor
+from Planificador_Memoria import presupuesto_memoria
+from Transposicion import transponer
+
+'''
+Herramienta: convierte una matriz .fcm (o .npy) a la orientación contraria, fuera de memoria.
+
+Caso por defecto: los patrones [H, -H]^T (2N × M, orientados por patrón, de
+Vectorizacion_Patrones_Hadamard.py) pasan a X (M × 2N, orientada por píxel como los speckles),
+de modo que una etapa que recorre bloques de filas de píxeles lee X igual que S_H1/S_H2.
+Sirve igual en sentido inverso (p. ej. speckles M × N → N × M, un speckle por fila).
+
+La transposición se hace por bloques con doble buffer y sub-bloques en caché (Transposicion.py):
+el ancho de banda final se informa para compararlo con una lectura secuencial del disco.
+'''
+
+print("=== TRANSPOSICIÓN FUERA DE MEMORIA ===")
+inicio_tiempo = time.time()
+
+# Configurar paths
+Path_Origen = '/media/manuel/Windows/Archivos_Reconstruccion/Hadamard_H_menosH_transpuesta.fcm'  # X^T (2N × M)
+Path_Destino = '/home/manuel/temp_intensity/Hadamard_H_menosH.fcm'                              # X (M × 2N)
+
+Orden_Salida = 'T'          # 'T' (teselas, sirve filas y columnas) o 'C' (filas contiguas)
+Tesela_Salida = (4096, 512)  # Teselas de la salida en orden 'T'
+Memoria_GB = None            # RAM para los bloques (dos de lectura + uno transpuesto); None = según la RAM libre
+Cache_KB = 256               # Caché L2 por núcleo: tamaño de los sub-bloques de la transposición
+Num_Hilos = os.cpu_count() or 1
+Verificar_Checksums = True   # Recalcular el crc32 de la salida al terminar (una lectura completa)
+
+origen = abrir_matriz(Path_Origen)
+filas, columnas = origen.shape
+tamaño_gb = filas * columnas * np.dtype(origen.dtype).itemsize / (1024**3)
+print(f"Origen: {Path_Origen}")
+print(f"- Forma: {filas} × {columnas} ({origen.dtype}), {tamaño_gb:.2f} GB")
+print(f"Destino: {Path_Destino} ({columnas} × {filas}, orden '{Orden_Salida}')")
+
+# Verificar espacio disponible en disco
+directorio_destino = os.path.dirname(Path_Destino)
+os.makedirs(directorio_destino, exist_ok=True)
+espacio_libre_gb = shutil.disk_usage(directorio_destino).free / (1024**3)
+print(f"\nVerificación de espacio:")
+print(f"- Espacio libre: {espacio_libre_gb:.2f} GB, necesario: {tamaño_gb:.2f} GB")
+if espacio_libre_gb < tamaño_gb * 1.1:  # 10% de margen
+    raise Exception(f"Espacio insuficiente. Necesario: {tamaño_gb:.2f} GB, Disponible: {espacio_libre_gb:.2f} GB")
+
+memoria_bytes, origen_memoria = presupuesto_memoria(Memoria_GB)
+print(f"- Memoria para los bloques: {memoria_bytes / 1024**3:.2f} GB ({origen_memoria})")
+
+print()
+estadisticas = transponer(Path_Origen, Path_Destino, orden=Orden_Salida, tesela=Tesela_Salida,
+                          memoria_bytes=memoria_bytes, bytes_cache=Cache_KB * 1024,
+                          num_hilos=Num_Hilos, parametros={'etapa': 'Transponer_Matriz'})
+
+print(f"\n=== RENDIMIENTO ===")
+print(f"- Lectura (hilo de fondo): {estadisticas['lectura']:.1f}s")
+print(f"- Transposición en RAM:    {estadisticas['transposicion']:.1f}s")
+print(f"- Escritura:               {estadisticas['escritura']:.1f}s")
+print(f"- Total: {estadisticas['tiempo']:.1f}s, {estadisticas['ancho_banda'] / (1024**2):.0f} MB/s "
+      f"(comparar con el ancho de banda secuencial del disco)")
+
+# Verificación por muestreo: elementos aleatorios de la salida contra el origen
+print("\n=== VERIFICACIÓN ===")
+destino = abrir_matriz(Path_Destino)
+rng = np.random.default_rng(0)
+muestras_i = rng.integers(0, filas, 64)
+muestras_j = rng.integers(0, columnas, 64)
+correctas = sum(int(destino[j, i] == origen[i, j]) for i, j in zip(muestras_i, muestras_j))
+print(f"Muestras aleatorias: {correctas}/64 coinciden con el origen")
+if correctas != 64:
+    raise RuntimeError("La matriz transpuesta no coincide con el origen")
+if Verificar_Checksums:
+    corruptos = verificar_contenedor(Path_Destino)
+    print(f"Checksums: {'OK' if not corruptos else f'{len(corruptos)} chunks corruptos'}")
+
+tiempo_total = time.time() - inicio_tiempo
+print(f"\n=== TRANSPOSICIÓN COMPLETADA ===")
+print(f"Archivo: {Path_Destino}")
+print(f"Tiempo total: {tiempo_total:.1f} segundos ({tiempo_total/60:.1f} minutos)")
@@ -3,10 +3,18 @@ import os
 import time
 import shutil
 from scipy.linalg import hadamard
+from Contenedor_Matriz import EscritorContenedor
+from Ordenes_Hadamard import seleccion_patrones
 
 '''
 Vectorización de patrones de Hadamard proyectados en el DMD.
 Genera matriz [H, -H]^T sin compresión, valores int8 directos ±1 para acceso rápido.
+La reconstrucción ya no lee este archivo (usa HadamardOperator de Operadores_Hadamard.py,
+que calcula X^T · I_out con una FWHT); se conserva para las verificaciones de Matrix_Checks.py.
+Se guarda como contenedor .fcm (Contenedor_Matriz.py) con los parámetros de escalado y centrado
+en la cabecera, de modo que Matrix_Checks.py no tiene que deducirlos ni inferir la forma.
+Con Fraccion_Patrones < 1 (adquisición compresiva, Ordenes_Hadamard.py) solo se escriben los
+patrones proyectados por Orquesta.py, en el mismo orden; sus índices quedan en la cabecera ('patrones').
 '''
 
 print("=== GENERACIÓN DE PATRONES HADAMARD ===")
@@ -18,11 +26,14 @@ M = alto * ancho    # 1310720 pixels totales
 
 # Parámetros Hadamard
 pattern_size = 64  # Tamaño base 64x64
-N2 = pattern_size ** 2  # 4096 patrones por conjunto
+Orden_Patrones = 'muñeca_rusa'  # Mismo orden y fracción que en Orquesta.py
+Fraccion_Patrones = 1.0
+patrones = seleccion_patrones(pattern_size, Fraccion_Patrones, Orden_Patrones)
+N2 = len(patrones)  # 4096 patrones por conjunto con la adquisición completa
 N = 2 * N2  # 8192 patrones totales (H1 + H2)
 
 print(f"DMD: {ancho}×{alto} = {M} pixels")
-print(f"Matriz Hadamard: {N2}×{N2}")
+print(f"Matriz Hadamard: {pattern_size**2}×{pattern_size**2}, {N2} columnas proyectadas (orden '{Orden_Patrones}')")
 print(f"Patrón base: {pattern_size}×{pattern_size}")
 print(f"Total patrones: H1({N2}) + H2({N2}) = {N}")
 
@@ -36,9 +47,9 @@ print(f"Escalado: {scale}x (patrón {pattern_size}×{pattern_size} → {scaled_s
 print(f"Centrado: offset_x={offset_x}, offset_y={offset_y}")
 
 # Generar matriz Hadamard completa
-print(f"Generando matriz Hadamard {N2}×{N2}...")
+print(f"Generando matriz Hadamard {pattern_size**2}×{pattern_size**2}...")
 inicio_hadamard = time.time()
-H_full = hadamard(N2, dtype=np.int8)  # Matriz completa 4096×4096
+H_full = hadamard(pattern_size ** 2, dtype=np.int8)  # Matriz completa 4096×4096
 tiempo_hadamard = time.time() - inicio_hadamard
 print(f"Matriz Hadamard generada en {tiempo_hadamard:.2f}s ({H_full.nbytes / (1024**3):.3f} GB)")
 
@@ -78,8 +89,8 @@ def make_hadamard_pattern_optimized(H_full, col_idx, pattern_size, DMD_size, sca
 # Configurar paths de almacenamiento
 temp_dir = '/home/manuel/temp_hadamard'
 os.makedirs(temp_dir, exist_ok=True)
-final_path_ntfs = '/media/manuel/Windows/Archivos_Reconstruccion/Hadamard_H_menosH_transpuesta.dat'
-temp_final_path = os.path.join(temp_dir, 'X_T_final.dat')
+final_path_ntfs = '/media/manuel/Windows/Archivos_Reconstruccion/Hadamard_H_menosH_transpuesta.fcm'
+temp_final_path = os.path.join(temp_dir, 'X_T_final.fcm')
 
 print(f"Directorio temporal: {temp_dir}")
 print(f"Archivo final: {final_path_ntfs}")
@@ -87,8 +98,8 @@ print(f"Tamaño final: {N * M / (1024**3):.2f} GB sin compresión")
 
 # Limpiar archivos previos
 archivos_limpiar = [
-    os.path.join(temp_dir, 'X_T_final.dat'),
-    '/media/manuel/Windows/Archivos_Reconstruccion/Hadamard_H_menosH_transpuesta.dat'
+    os.path.join(temp_dir, 'X_T_final.fcm'),
+    '/media/manuel/Windows/Archivos_Reconstruccion/Hadamard_H_menosH_transpuesta.fcm'
 ]
 
 for archivo in archivos_limpiar:
@@ -103,8 +114,20 @@ for archivo in archivos_limpiar:
 print(f"Creando matriz final {N} × {M} (sin compresión)...")
 tiempo_inicio = time.time()
 
-# Memmap raw con valores ±1
-X = np.memmap(temp_final_path, dtype=np.int8, mode='w+', shape=(N, M))
+# Contenedor .fcm con valores ±1 (cabecera con los parámetros de generación)
+parametros = {
+    'etapa': 'Vectorizacion_Patrones_Hadamard',
+    'pattern_size': pattern_size,
+    'DMD_size': list(DMD_size),
+    'scale': scale,
+    'offset_x': offset_x,
+    'offset_y': offset_y,
+    'filas_H2': N2,  # H2 = -H1 a partir de esta fila
+}
+if Fraccion_Patrones < 1:
+    parametros.update(orden_patrones=Orden_Patrones, patrones=patrones.tolist())
+escritor = EscritorContenedor(temp_final_path, (N, M), np.int8, chunk=512, parametros=parametros)
+X = escritor.datos
 
 print("\n=== GENERANDO MATRIZ [H, -H]^T OPTIMIZADA ===")
 
@@ -115,9 +138,9 @@ print("Generando patrones con optimizaciones de CPU...")
 canvas_buffer = np.zeros(DMD_size[::-1], dtype=np.int8)  # (alto, ancho)
 scale_idxs = np.repeat(np.arange(pattern_size), scale)  # Índices para escalado en C
 
-print("Generando solo patrones H1 (filas 0-4095)...")
-for i in range(N2):
-    X[i, :] = make_hadamard_pattern_optimized(H_full, i, pattern_size, DMD_size, scale, offset_x, offset_y, canvas_buffer, scale_idxs)
+print(f"Generando solo patrones H1 (filas 0-{N2 - 1})...")
+for i, columna in enumerate(patrones):
+    escritor.escribir(i, make_hadamard_pattern_optimized(H_full, columna, pattern_size, DMD_size, scale, offset_x, offset_y, canvas_buffer, scale_idxs)[None, :])
     if (i + 1) % 500 == 0:
         progreso_h1 = (i + 1) / N2 * 100
         tiempo_parcial = time.time() - tiempo_inicio
@@ -130,7 +153,8 @@ X[N2:N, :] = -X[0:N2, :]
 
 print(f"H2 generado por copia vectorizada (evita {N2} cálculos duplicados)")
 
-X.flush()
+X = None
+escritor.cerrar()  # Checksums por chunk y cabecera definitiva
 tiempo_construccion = time.time() - tiempo_inicio
 print(f"Matriz final construida en {tiempo_construccion:.1f}s")
 
@@ -150,7 +174,6 @@ except Exception as e:
 
 # Limpiar archivos temporales
 print("\nLimpiando archivos temporales...")
-X = None
 
 try:
     os.rmdir(temp_dir)
@@ -174,7 +197,7 @@ print(f"Centrado: ({offset_x}, {offset_y})")
 
 print(f"\n=== USO DIRECTO ===")
 print(f"# Cargar matriz")
-print(f"X = np.memmap('{final_path_ntfs}', dtype=np.int8, mode='r', shape=({N}, {M}))")
+print(f"X = abrir_matriz('{final_path_ntfs}')  # Contenedor_Matriz.py, forma ({N}, {M}) int8")
 print(f"# Acceso directo sin descompresión")
 print(f"patron_i = X[i, :]  # Valores directos ±1")
 print(f"# H1: filas 0-{N2-1}, H2: filas {N2}-{N-1}")
\ No newline at end of file
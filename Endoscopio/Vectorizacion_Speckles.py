@@ -1,176 +1,233 @@
 import cv2
+import json
 import numpy as np
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from Contenedor_Matriz import EscritorContenedor, abrir_matriz
+from Mascara import cargar_indices
 
 '''
 Este código realiza la vectorización de los patrones speckle capturados.
-Recibe imágenes PNG de tamaño 1280 x 1024 y genera matrices de tamaño 1310720 x 4096. 
+Recibe imágenes PNG de tamaño 1280 x 1024 y genera matrices de tamaño 1310720 x 4096.
 Estas no se binarizan, sino que se guardan manteniendo los valores de intensidad originales
 (0-255) en formato uint8.
+
+Con Usar_Mascara = True (máscara de Construccion_Mascara.py) solo se guardan las filas de los
+píxeles activos: las matrices pasan a ser M_activos x 4096.
+
+================================ VECTORIZACIÓN EN FLUJO ================================
+
+- Las PNG se decodifican en un pool de hilos (cv2.imread libera el GIL), con una ventana
+  acotada de imágenes en vuelo: la RAM usada es ~Ventana_Imagenes × 1.3 MB, nunca la matriz
+  completa de 5 GB.
+- Cada vector se escribe directamente en un contenedor .fcm (Contenedor_Matriz.py): la cabecera
+  guarda forma, orden, parámetros de captura y un crc32 por chunk, y las etapas siguientes lo
+  abren sin declarar shape ni dtype (abrir_matriz).
+- H1 y H2 se procesan a la vez, compartiendo el pool de decodificación.
+
+Disposición en disco (Orden_Salida):
+- 'F' (columnas contiguas): cada speckle es una escritura secuencial de M bytes. Es la opción
+  más rápida para escribir; las etapas siguientes leen bloques de filas como M/chunk segmentos
+  contiguos por columna (LectorChunks lo admite sin cambios).
+- 'C' (filas contiguas, como el np.save original): se acumulan Columnas_Bloque speckles en un
+  buffer (M × Columnas_Bloque) y se escriben por bloques. Lectura por filas óptima en las
+  etapas siguientes, a cambio de Columnas_Bloque × M bytes de RAM por conjunto; cada bloque de
+  columnas toca todas las páginas del archivo.
+- 'T' (teselas de 4096 × Columnas_Bloque, Contenedor_Matriz.py): mismo buffer que 'C', pero
+  cada bloque de columnas se escribe como M/4096 teselas contiguas y las etapas siguientes leen
+  bandas de filas como rangos contiguos. Sirve bien las dos direcciones de acceso.
+========================================================================================
 '''
 # Rutas locales (Volumen Windows montado en Linux)
 file_H1 = '/media/manuel/Windows/Speckle_H1_1280x1024' # Contiene las 4096 imagenes de los speckles respuesta a H1
 file_H2 = '/media/manuel/Windows/Speckle_H2_1280x1024' # Contiene las 4096 imagenes de los speckles respuesta a H2
-
-######################### Obtención de sub matriz de intensidad Speckles H1 #########################
-
-# Obtener lista ordenada de archivos PNG
-archivos_H1 = sorted([
-    f for f in os.listdir(file_H1) if f.endswith('.png')
-])
+path_salida = '/media/manuel/Windows/Archivos_Reconstruccion'
+Usar_Mascara = False  # True: guardar solo los píxeles activos (Construccion_Mascara.py)
+Path_Mascara = '/home/manuel/temp_intensity/mascara_pixeles.npy'
+# Adquisición compresiva: patrones_hadamard.json de Orquesta.py (None = los N patrones en orden natural).
+# Los índices pasan a la cabecera ('patrones') y de ahí a D e Y (Ordenes_Hadamard.patrones_adquiridos)
+Path_Patrones = None
+# Con el 'programa' de Orquesta.py en Path_Patrones (H1 y H2 intercalados en una sola carpeta), los
+# frame_*.png de esta carpeta se asignan a su conjunto y columna; None = carpetas file_H1 y file_H2
+Carpeta_Captura = None
+
+Orden_Salida = 'T'      # 'T' (teselas), 'F' (escritura secuencial por speckle) o 'C' (filas contiguas, por bloques)
+Columnas_Bloque = 256   # Speckles por bloque de escritura en orden 'C' y ancho de tesela en orden 'T'
+Filas_Tesela = 4096     # Alto de tesela en orden 'T' (divisor de chunk_filas en las etapas siguientes)
+Num_Hilos = min(8, os.cpu_count() or 1)  # Hilos de decodificación compartidos por H1 y H2
+Ventana_Imagenes = 4 * Num_Hilos         # Imágenes decodificadas en vuelo por conjunto
+
+if Orden_Salida not in ('F', 'C', 'T'):
+    raise ValueError(f"Orden_Salida debe ser 'F', 'C' o 'T', se recibió '{Orden_Salida}'")
 
 # Dimensiones de imagen (alto, ancho) según formato OpenCV
 alto, ancho = 1024, 1280  # OpenCV usa (filas, columnas) = (alto, ancho)
 M = alto * ancho    # 1310720
-N_H1 = len(archivos_H1)  # número total de imágenes (deben ser 4096)
-
-'''
-Validaciones para prevenir overflows y asegurar coherencia dimensional
-'''
-print(f"=== PROCESANDO SPECKLES H1 ===")
-print(f"Dimensiones detectadas: {alto}x{ancho}, M={M}, N_H1={N_H1}")
-
-# Calcular memoria requerida para speckles H1
-# Cálculo: 1 matriz de M×N elementos, cada elemento uint8 (1 byte)
-# Fórmula: M * N / (1024³) donde 1024³ = bytes a GB
-memoria_H1_gb = M * N_H1 / (1024**3)
-print(f"Memoria requerida para Submatriz_Intensidad_H1: {memoria_H1_gb:.2f} GB")
-
-# Verificar número de imágenes esperado
-if N_H1 > 2**15:  # Límite práctico para evitar matrices muy grandes
-    print(f"Advertencia: N_H1={N_H1} es muy grande.")
-
-'''
-Genera una matriz de intensidades de tamaño M x N_H1 de variables de tipo uint8.
-Donde cada columna es un vector speckle con valores de intensidad (0-255).
-Se inicializa con ceros.
-'''
-# Inicializar la matriz de salida (cada columna es un vector speckle)
-Submatriz_Intensidad_H1 = np.zeros((M, N_H1), dtype=np.uint8)
-
-'''
-Se hace entonces una iteración para procesar las 4096 imágenes correspondientes a la respuesta (speckle) 
-de la MMF al patrón de Hadamard.
-Cada imagen se carga manteniendo sus valores de intensidad originales y se almacena como una columna vectorizada.
-'''
-# Iterar sobre las imágenes y vectorizarlas
-for idx, archivo in enumerate(archivos_H1):
-    
-    # Se busca la imagen en la ruta
-    ruta_img = os.path.join(file_H1, archivo)
-    
-    # Se carga la imagen del speckle en escala de grises
+if Usar_Mascara:
+    indices_activos = cargar_indices(Path_Mascara)
+    print(f"Máscara: {len(indices_activos):,} píxeles activos de {M:,} ({len(indices_activos) / M * 100:.1f}%)")
+    M = len(indices_activos)
+else:
+    indices_activos = slice(None)  # Todas las filas
+
+patrones_adquisicion = {}
+programa = None
+if Path_Patrones is not None:
+    with open(Path_Patrones) as f:
+        adquisicion = json.load(f)
+    patrones_adquisicion = {'pattern_size': adquisicion['pattern_size'], 'orden_patrones': adquisicion['orden'],
+                            'patrones': adquisicion['patrones']}
+    programa = adquisicion.get('programa')
+    print(f"Adquisición compresiva: {len(adquisicion['patrones'])} de {adquisicion['pattern_size']**2} patrones "
+          f"(orden '{adquisicion['orden']}')")
+
+
+def decodificar(ruta_img):
+    '''
+    Carga un speckle en escala de grises y lo vectoriza fila a fila (order='C').
+    Se ejecuta en el pool de hilos.
+    '''
     img = cv2.imread(ruta_img, cv2.IMREAD_GRAYSCALE)
 
     # Validaciones de carga e integridad de imagen
     if img is None:
-        raise ValueError(f"No se pudo cargar la imagen: {archivo}")
+        raise ValueError(f"No se pudo cargar la imagen: {os.path.basename(ruta_img)}")
     if img.shape != (alto, ancho):
-        raise ValueError(f"Imagen {archivo} tiene dimensiones {img.shape}, se esperaba ({alto}, {ancho})")
-
-    # Verificar que los valores están en el rango esperado para uint8
-    if img.min() < 0 or img.max() > 255:
-        raise ValueError(f"Imagen {archivo} tiene valores fuera del rango uint8: [{img.min()}, {img.max()}]")
-
-    # Se convierte la matriz del speckle a un vector columna
-    # La vectorización se realiza fila a fila (order='C')
-    Vector_Intensidad_Speckle_H1 = img.flatten(order='C')  # fila a fila
-    
-    # Se va almacenando cada vector como una columna de esta submatriz H1
-    Submatriz_Intensidad_H1[:, idx] = Vector_Intensidad_Speckle_H1
-    
-    # Mostrar progreso cada 300 imágenes
-    if (idx + 1) % 300 == 0:
-        print(f"H1: Procesadas {idx + 1}/{N_H1} imágenes")
-
-# Validar matriz final H1
-print(f"Validando matriz H1 final:")
-print(f"Forma: {Submatriz_Intensidad_H1.shape}")
-print(f"Rango de valores: [{Submatriz_Intensidad_H1.min()}, {Submatriz_Intensidad_H1.max()}]")
-print(f"Tipo de dato: {Submatriz_Intensidad_H1.dtype}")
-
-# Guardar la matriz como archivo binario NumPy
-np.save('/media/manuel/Windows/Archivos_Reconstruccion/speckles_H1_vectorizados.npy', Submatriz_Intensidad_H1)
-
-print("Matriz H1 de speckles guardada exitosamente en: /media/manuel/Windows/Archivos_Reconstruccion/speckles_H1_vectorizados.npy")
-
-
-######################### Obtención de sub matriz de intensidad Speckles H2 #########################
-
-# Obtener lista ordenada de archivos PNG
-archivos_H2 = sorted([
-    f for f in os.listdir(file_H2) if f.endswith('.png')
-])
-
-# Dimensiones de imagen (reutilizando las mismas variables)
-N_H2 = len(archivos_H2)  # número total de imágenes (deben ser 4096)
-
-'''
-Validaciones para prevenir overflows H2
-'''
-print(f"\n=== PROCESANDO SPECKLES H2 ===")
-print(f"Dimensiones detectadas: {alto}x{ancho}, M={M}, N_H2={N_H2}")
-
-# Calcular memoria requerida para H2
-memoria_H2_gb = M * N_H2 / (1024**3)
-print(f"Memoria requerida para Submatriz_Intensidad_H2: {memoria_H2_gb:.2f} GB")
+        raise ValueError(f"Imagen {os.path.basename(ruta_img)} tiene dimensiones {img.shape}, se esperaba ({alto}, {ancho})")
+
+    # Se convierte la matriz del speckle a un vector columna (solo píxeles activos)
+    return img.ravel(order='C')[indices_activos]
+
+
+def vectorizar_conjunto(nombre, carpeta, ruta_salida, pool, archivos=None):
+    '''
+    Vectoriza todas las PNG de `carpeta` (o los `archivos` indicados, en orden de columna)
+    en un .fcm (M × N uint8) escrito en flujo.
+
+    Retorna:
+    - (N, mínimo, máximo) del conjunto
+    '''
+    # Obtener lista ordenada de archivos PNG
+    if archivos is None:
+        archivos = sorted([f for f in os.listdir(carpeta) if f.endswith('.png')])
+    N = len(archivos)  # número total de imágenes (deben ser 4096)
+    print(f"{nombre}: {N} imágenes, matriz {M} x {N} ({M * N / (1024**3):.2f} GB en disco, orden '{Orden_Salida}')")
+    if N > 2**15:  # Límite práctico para evitar matrices muy grandes
+        print(f"Advertencia: N_{nombre}={N} es muy grande.")
+
+    # Matriz de salida en disco: nunca se materializa en RAM
+    parametros = dict(patrones_adquisicion)
+    parametros.update({
+        'etapa': 'Vectorizacion_Speckles',
+        'conjunto': nombre,
+        'carpeta': carpeta,
+        'alto': alto,
+        'ancho': ancho,
+        'mascara': Path_Mascara if Usar_Mascara else None,
+    })
+    if 'patrones' in parametros and len(parametros['patrones']) != N:
+        raise ValueError(f"{nombre}: {N} imágenes para {len(parametros['patrones'])} patrones ({Path_Patrones})")
+    escritor = EscritorContenedor(ruta_salida, (M, N), np.uint8, orden=Orden_Salida,
+                                  chunk=Columnas_Bloque if Orden_Salida == 'F' else None, parametros=parametros,
+                                  tesela=(Filas_Tesela, Columnas_Bloque))
+    salida = escritor.datos
+    bloque = np.empty((M, Columnas_Bloque), dtype=np.uint8) if Orden_Salida != 'F' else None
+    valor_min, valor_max = 255, 0
+
+    # Ventana acotada de decodificaciones en vuelo (orden de columnas preservado)
+    rutas = [os.path.join(carpeta, f) for f in archivos]
+    pendientes = [pool.submit(decodificar, ruta) for ruta in rutas[:Ventana_Imagenes]]
+    for idx in range(N):
+        vector = pendientes.pop(0).result()
+        if idx + Ventana_Imagenes < N:
+            pendientes.append(pool.submit(decodificar, rutas[idx + Ventana_Imagenes]))
+        valor_min, valor_max = min(valor_min, int(vector.min())), max(valor_max, int(vector.max()))
+
+        if Orden_Salida == 'F':
+            escritor.escribir(idx, vector[:, None])  # Columna contigua: escritura secuencial
+        else:
+            bloque[:, idx % Columnas_Bloque] = vector
+            if (idx + 1) % Columnas_Bloque == 0 or idx == N - 1:
+                inicio = idx - idx % Columnas_Bloque
+                if Orden_Salida == 'T':
+                    salida.escribir_bloque(0, inicio, bloque[:, :idx + 1 - inicio])  # Una columna de teselas
+                else:
+                    salida[:, inicio:idx + 1] = bloque[:, :idx + 1 - inicio]
+
+        # Mostrar progreso cada 300 imágenes
+        if (idx + 1) % 300 == 0:
+            print(f"{nombre}: Procesadas {idx + 1}/{N} imágenes")
+
+    del salida
+    escritor.cerrar()  # Checksums pendientes y cabecera definitiva
+    return N, valor_min, valor_max
+
+
+print(f"=== VECTORIZACIÓN DE SPECKLES H1 Y H2 ===")
+print(f"Dimensiones detectadas: {alto}x{ancho}, M={M}")
+print(f"Hilos de decodificación: {Num_Hilos}, ventana: {Ventana_Imagenes} imágenes por conjunto")
+inicio_tiempo = time.time()
+
+conjuntos = [
+    ('H1', file_H1, os.path.join(path_salida, 'speckles_H1_vectorizados.fcm'), None),
+    ('H2', file_H2, os.path.join(path_salida, 'speckles_H2_vectorizados.fcm'), None),
+]
+if Carpeta_Captura is not None:
+    if programa is None:
+        raise ValueError(f"Carpeta_Captura requiere el 'programa' de Orquesta.py en Path_Patrones ({Path_Patrones})")
+    # frame_i es el cuadro i del programa: (conjunto, columna)
+    programa = np.asarray(programa)
+    frames = sorted(f for f in os.listdir(Carpeta_Captura) if f.startswith('frame_') and f.endswith('.png'))
+    if len(frames) < len(programa):
+        raise ValueError(f"{Carpeta_Captura}: {len(frames)} frames para un programa de {len(programa)} cuadros")
+    for indice, (nombre, _, ruta_salida, _) in enumerate(conjuntos):
+        cuadros = np.flatnonzero(programa[:, 0] == indice)
+        archivos = [frames[i] for i in cuadros[np.argsort(programa[cuadros, 1])]]
+        conjuntos[indice] = (nombre, Carpeta_Captura, ruta_salida, archivos)
+    print(f"Programa intercalado: {len(programa)} cuadros de {Carpeta_Captura}")
+resultados = {}
+errores = {}
+
+
+def procesar(nombre, carpeta, ruta_salida, archivos, pool):
+    try:
+        resultados[nombre] = vectorizar_conjunto(nombre, carpeta, ruta_salida, pool, archivos)
+    except Exception as e:
+        errores[nombre] = e
+
+
+# H1 y H2 a la vez: cada conjunto tiene su hilo escritor y comparten el pool de decodificación
+with ThreadPoolExecutor(max_workers=Num_Hilos) as pool:
+    hilos = [threading.Thread(target=procesar, args=(nombre, carpeta, ruta, archivos, pool))
+             for nombre, carpeta, ruta, archivos in conjuntos]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+
+if errores:
+    nombre, error = next(iter(errores.items()))
+    raise RuntimeError(f"Error vectorizando speckles {nombre}: {error}")
+
+# Validar matrices finales
+for nombre, carpeta, ruta_salida, _ in conjuntos:
+    N, valor_min, valor_max = resultados[nombre]
+    matriz = abrir_matriz(ruta_salida)
+    print(f"\nValidando matriz {nombre} final:")
+    print(f"Forma: {matriz.shape}")
+    print(f"Rango de valores: [{valor_min}, {valor_max}]")
+    print(f"Tipo de dato: {matriz.dtype}")
+    print(f"Matriz {nombre} de speckles guardada exitosamente en: {ruta_salida}")
 
 # Verificar coherencia entre H1 y H2
-if N_H1 != N_H2:
-    print(f"Advertencia: N_H1={N_H1} y N_H2={N_H2} son diferentes")
-
-if N_H2 > 2**15:  # Límite práctico para evitar matrices muy grandes
-    print(f"Advertencia: N_H2={N_H2} es muy grande.")
-
-# Inicializar la matriz de salida (cada columna es un vector speckle)
-Submatriz_Intensidad_H2 = np.zeros((M, N_H2), dtype=np.uint8)
-
-# Iterar sobre las imágenes y vectorizarlas
-for idx, archivo in enumerate(archivos_H2):
-    
-    # Se busca la imagen en la ruta
-    ruta_img = os.path.join(file_H2, archivo)
-    
-    # Se carga la imagen del speckle en escala de grises
-    img = cv2.imread(ruta_img, cv2.IMREAD_GRAYSCALE)
+if resultados['H1'][0] != resultados['H2'][0]:
+    print(f"Advertencia: N_H1={resultados['H1'][0]} y N_H2={resultados['H2'][0]} son diferentes")
 
-    # Validaciones de carga e integridad de imagen
-    if img is None:
-        raise ValueError(f"No se pudo cargar la imagen: {archivo}")
-    if img.shape != (alto, ancho):
-        raise ValueError(f"Imagen {archivo} tiene dimensiones {img.shape}, se esperaba ({alto}, {ancho})")
-
-    # Verificar que los valores están en el rango esperado para uint8
-    if img.min() < 0 or img.max() > 255:
-        raise ValueError(f"Imagen {archivo} tiene valores fuera del rango uint8: [{img.min()}, {img.max()}]")
-
-    # Se convierte la matriz del speckle a un vector columna
-    # La vectorización se realiza fila a fila (order='C')
-    Vector_Intensidad_Speckle_H2 = img.flatten(order='C')  # fila a fila
-    
-    # Se va almacenando cada vector como una columna de esta submatriz H2
-    Submatriz_Intensidad_H2[:, idx] = Vector_Intensidad_Speckle_H2
-    
-    # Mostrar progreso cada 100 imágenes
-    if (idx + 1) % 100 == 0:
-        print(f"H2: Procesadas {idx + 1}/{N_H2} imágenes")
-
-# Validar matriz final H2
-print(f"Validando matriz H2 final:")
-print(f"Forma: {Submatriz_Intensidad_H2.shape}")
-print(f"Rango de valores: [{Submatriz_Intensidad_H2.min()}, {Submatriz_Intensidad_H2.max()}]")
-print(f"Tipo de dato: {Submatriz_Intensidad_H2.dtype}")
-
-# Calcular memoria total utilizada
-memoria_total_gb = memoria_H1_gb + memoria_H2_gb
+tiempo_total = time.time() - inicio_tiempo
+memoria_total_gb = M * (resultados['H1'][0] + resultados['H2'][0]) / (1024**3)
 print(f"\n=== RESUMEN FINAL ===")
-print(f"Memoria total utilizada: {memoria_total_gb:.2f} GB")
+print(f"Datos escritos en disco: {memoria_total_gb:.2f} GB (RAM: ~{Ventana_Imagenes * 2 * M / (1024**2):.0f} MB de imágenes en vuelo)")
+print(f"Tiempo total: {tiempo_total:.1f} segundos ({(resultados['H1'][0] + resultados['H2'][0]) / tiempo_total:.1f} imágenes/s)")
 print(f"Matrices H1 y H2 procesadas exitosamente")
-
-# Guardar la matriz como archivo binario NumPy
-np.save('/media/manuel/Windows/Archivos_Reconstruccion/speckles_H2_vectorizados.npy', Submatriz_Intensidad_H2)
-
-print("Matriz H2 de speckles guardada exitosamente en: /media/manuel/Windows/Archivos_Reconstruccion/speckles_H2_vectorizados.npy")
-
-
-
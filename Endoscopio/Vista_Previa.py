@@ -0,0 +1,86 @@
+import numpy as np
+from Operadores_Hadamard import fwht
+from Ordenes_Hadamard import niveles_patrones
+
+'''
+Vistas previas de baja resolución mientras se adquieren los speckles de caracterización.
+
+Con el orden 'muñeca_rusa' (Ordenes_Hadamard.py) los primeros 4^k patrones forman la base de las
+imágenes de 2^k × 2^k bloques. Cada speckle de H1 que llega da una columna de la matriz de
+intensidad, Y_j = 2·S_j - I1 (I1 = speckle del patrón 0, todo unos, el primero en llegar), y para
+un speckle de prueba I_out (un objeto conocido capturado antes de la caracterización) basta
+acumular un escalar por patrón:
+
+    u_j = Y_j^T I_out / ||Y_j||²     (filtro adaptado con la diagonal de la Gram)
+
+Sin guardar ningún speckle: O(M) por patrón y por speckle de prueba. Cuando llega el último patrón
+de un nivel, la imagen de 2^k × 2^k es la FWHT de longitud 4^k de los u_j de ese nivel: la columna
+de Sylvester de índice m·(n/2^k) restringida a un representante por bloque es la columna m de H_{2^k}.
+'''
+
+
+class VistaPreviaAdquisicion:
+    '''
+    Acumulador de vistas previas por nivel para una adquisición en curso.
+
+    Parámetros:
+    - I_prueba: array (M,) o (M, B), speckles de prueba (mismas filas que los de caracterización)
+    - patrones: índices de columna de H en orden de adquisición (seleccion_patrones)
+    - pattern_size: n (patrones n × n)
+    '''
+
+    def __init__(self, I_prueba, patrones, pattern_size):
+        self.I_prueba = np.asarray(I_prueba, dtype=np.float32).reshape(len(I_prueba), -1)
+        self.patrones = np.asarray(patrones, dtype=np.int64)
+        if self.patrones[0] != 0:
+            raise ValueError("El primer patrón adquirido debe ser el 0 (todo unos, referencia I1)")
+        self.pattern_size = pattern_size
+        self.nivel = niveles_patrones(pattern_size)[self.patrones]
+        self.nivel_maximo = int(np.log2(pattern_size))
+        self.u = np.zeros((len(self.patrones), self.I_prueba.shape[1]))
+        self.recibidos = 0
+        # Patrones por llegar de cada nivel (con una selección compresiva, los no adquiridos nunca llegan)
+        self._faltan = np.bincount(niveles_patrones(pattern_size))
+        self._I1 = None
+
+    def agregar(self, speckle):
+        '''
+        Incorpora el speckle del siguiente patrón (vector de M valores, en el orden de `patrones`).
+
+        Retorna:
+        - lista de los niveles que quedan completos con este speckle
+        '''
+        j = self.recibidos
+        if j >= len(self.patrones):
+            raise ValueError(f"Ya se recibieron los {len(self.patrones)} patrones")
+        S = np.asarray(speckle, dtype=np.float32).ravel()
+        if self._I1 is None:
+            self._I1 = S.copy()
+        Y = 2 * S - self._I1
+        norma = float(Y @ Y)
+        self.u[j] = (Y @ self.I_prueba) / norma if norma > 0 else 0
+        self.recibidos += 1
+        completos_antes = self.niveles_completos()
+        self._faltan[self.nivel[j]] -= 1
+        return [k for k in self.niveles_completos() if k not in completos_antes]
+
+    def niveles_completos(self):
+        '''Niveles k con todos los patrones de 2^k × 2^k bloques recibidos (en cualquier orden).'''
+        return [k for k in range(self.nivel_maximo + 1) if not self._faltan[:k + 1].any()]
+
+    def imagen(self, nivel):
+        '''
+        Vista previa de 2^k × 2^k bloques (k = nivel) en el plano de los patrones.
+
+        Retorna:
+        - array (2^k, 2^k, B) float64
+        '''
+        if nivel not in self.niveles_completos():
+            raise ValueError(f"Faltan patrones del nivel {nivel} ({2**nivel} × {2**nivel})")
+        n, lado = self.pattern_size, 2 ** nivel
+        recibidos = np.flatnonzero(self.nivel[:self.recibidos] <= nivel)
+        # Índice del patrón en la base de 2^k × 2^k: (j // n, j % n) / (n / 2^k)
+        fila, columna = np.divmod(self.patrones[recibidos], n)
+        coeficientes = np.zeros((lado * lado, self.u.shape[1]))
+        coeficientes[fila // (n // lado) * lado + columna // (n // lado)] = self.u[recibidos]
+        return fwht(coeficientes).reshape(lado, lado, -1)
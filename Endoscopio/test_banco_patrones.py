@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+from scipy.linalg import hadamard
+from Banco_Patrones import crear_banco, BancoPatrones
+from Contenedor_Matriz import verificar_contenedor
+
+'''
+Banco de patrones (Banco_Patrones.py): cada fila desempaquetada debe ser el patrón H1 de su columna
+(o su complemento H2) escalado y en la misma posición que los PNG de save_hadamard_patterns_to_disk.
+'''
+
+n, DMD_size = 4, (40, 32)      # escala 8: región de 32 × 32 centrada con offset (4, 0)
+columnas = np.array([0, 5, 15, 9, 2])
+
+
+@pytest.fixture
+def banco(tmp_path):
+    ruta = str(tmp_path / "banco.fcm")
+    crear_banco(ruta, n, columnas, DMD_size, bloque=2)  # Lotes incompletos: 2 + 2 + 1
+    assert verificar_contenedor(ruta) == []
+    return BancoPatrones(ruta)
+
+
+def test_filas_son_patrones_hadamard(banco):
+    H1 = (hadamard(n * n) + 1) // 2
+    assert len(banco) == len(columnas) and banco.lado == 32
+    assert banco.posicion((320, 0)) == (324, 0)
+    for j in columnas:
+        esperado = np.kron(H1[:, j].reshape(n, n), np.ones((8, 8), dtype=np.int64))
+        np.testing.assert_array_equal(banco.patron(banco.fila(j), 0), esperado)
+        np.testing.assert_array_equal(banco.patron(banco.fila(j), 1), 1 - esperado)
+    with pytest.raises(KeyError):
+        banco.fila(1)
+
+
+def test_coincide_con_pattern_adapt(banco):
+    '''Mismo lienzo que Matrix_Functions (pattern_adapt + embed_in_DMD_frame), que necesita pygame para importarse.'''
+    Matrix_Functions = pytest.importorskip("Matrix_Functions")
+    H = hadamard(n * n)
+    x, y = banco.offset
+    for conjunto, H_conjunto in enumerate(((H + 1) // 2, (1 - H) // 2)):
+        for j in columnas:
+            lienzo = np.zeros(DMD_size[::-1], dtype=np.uint8)
+            lienzo[y:y + banco.lado, x:x + banco.lado] = banco.patron(banco.fila(j), conjunto)
+            esperado = Matrix_Functions.embed_in_DMD_frame(Matrix_Functions.pattern_adapt(H_conjunto, j, DMD_size), DMD_size)
+            np.testing.assert_array_equal(lienzo, esperado)
@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+from Contenedor_Matriz import EscritorContenedor, abrir_matriz, verificar_contenedor, parametros_matriz
+
+'''
+Ida y vuelta de los contenedores .fcm: escritura por bloques → abrir_matriz → verificar_contenedor,
+en los órdenes 'C', 'F' y 'T' (teselas con bordes incompletos).
+'''
+
+
+@pytest.mark.parametrize("orden, opciones", [
+    ('C', {'chunk': 7}),
+    ('F', {'chunk': 5}),
+    ('T', {'tesela': (16, 6)}),
+])
+def test_ida_y_vuelta(tmp_path, orden, opciones):
+    ruta = str(tmp_path / f"matriz_{orden}.fcm")
+    matriz = np.random.default_rng(0).integers(-300, 300, size=(37, 23)).astype(np.int16)
+    with EscritorContenedor(ruta, matriz.shape, np.int16, orden=orden, parametros={'etapa': 'prueba'},
+                            **opciones) as salida:
+        # Bloques del eje mayor en orden secuencial, como las etapas de la cadena
+        mayor = matriz.shape[1] if orden == 'F' else matriz.shape[0]
+        for inicio in range(0, mayor, 4):
+            bloque = matriz[:, inicio:inicio + 4] if orden == 'F' else matriz[inicio:inicio + 4]
+            salida.escribir(inicio, bloque)
+    leida = abrir_matriz(ruta, shape=matriz.shape)
+    np.testing.assert_array_equal(np.asarray(leida), matriz)
+    np.testing.assert_array_equal(leida[3:9, 2:20], matriz[3:9, 2:20])
+    assert verificar_contenedor(ruta) == []
+    assert parametros_matriz(ruta) == {'etapa': 'prueba'}
+
+
+def test_corrupcion_detectada(tmp_path):
+    ruta = str(tmp_path / "matriz.fcm")
+    with EscritorContenedor(ruta, (32, 8), np.int8, chunk=8) as salida:
+        salida.datos[:] = 1
+    datos = abrir_matriz(ruta)
+    desplazamiento = datos.offset + 20 * 8  # Un byte del chunk 2
+    with open(ruta, 'r+b') as f:
+        f.seek(desplazamiento)
+        f.write(b'\x05')
+    assert verificar_contenedor(ruta) == [2]
+
+
+def test_forma_incorrecta(tmp_path):
+    ruta = str(tmp_path / "matriz.fcm")
+    with EscritorContenedor(ruta, (4, 4), np.float32) as salida:
+        salida.datos[:] = 0
+    with pytest.raises(ValueError):
+        abrir_matriz(ruta, shape=(4, 5))
@@ -0,0 +1,41 @@
+import threading
+import numpy as np
+from Kernel_Producto import producto_entero, UMBRAL_COLUMNAS_KERNEL, FILAS_SUBBLOQUE
+
+'''
+producto_entero frente a A.astype(float32) @ C, en el camino del kernel y en el de BLAS, y con
+varios hilos a la vez en el camino BLAS (buffer de conversión por hilo).
+'''
+
+
+def _datos(semilla, m=3 * FILAS_SUBBLOQUE + 17, k=64, B=UMBRAL_COLUMNAS_KERNEL + 4):
+    rng = np.random.default_rng(semilla)
+    return rng.integers(-500, 500, size=(m, k)).astype(np.int16), rng.standard_normal((k, B)).astype(np.float32)
+
+
+def test_producto_y_acumulacion():
+    A, C = _datos(0)
+    for columnas in (1, UMBRAL_COLUMNAS_KERNEL, C.shape[1]):
+        esperado = A.astype(np.float32) @ C[:, :columnas]
+        out = producto_entero(A, C[:, :columnas])
+        np.testing.assert_allclose(out, esperado, rtol=1e-4, atol=1e-2)
+        producto_entero(A, C[:, :columnas], out=out, acumular=True)
+        np.testing.assert_allclose(out, 2 * esperado, rtol=1e-4, atol=1e-2)
+
+
+def test_hilos_concurrentes_camino_blas():
+    errores = []
+
+    def trabajo(semilla):
+        A, C = _datos(semilla)
+        esperado = A.astype(np.float32) @ C
+        for _ in range(5):
+            if not np.allclose(producto_entero(A, C), esperado, rtol=1e-4, atol=1e-2):
+                errores.append(semilla)
+
+    hilos = [threading.Thread(target=trabajo, args=(semilla,)) for semilla in range(4)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    assert errores == []
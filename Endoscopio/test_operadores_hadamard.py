@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+from scipy.linalg import hadamard
+from Operadores_Hadamard import fwht, HadamardOperator
+
+'''
+Comprobaciones de HadamardOperator contra la matriz X = [H, -H] construida explícitamente con
+scipy.linalg.hadamard (columna j → cuadrado n×n en orden C, escalado y centrado en el lienzo).
+'''
+
+
+def _X_explicita(pattern_size, DMD_size):
+    ancho, alto = DMD_size
+    n = pattern_size
+    scale = min(DMD_size) // n
+    lado = n * scale
+    offset_x, offset_y = (ancho - lado) // 2, (alto - lado) // 2
+    H = hadamard(n * n)
+    X_H = np.zeros((alto, ancho, n * n))
+    cuadrados = H.T.reshape(n * n, n, n)
+    escalados = np.repeat(np.repeat(cuadrados, scale, axis=1), scale, axis=2)
+    X_H[offset_y:offset_y + lado, offset_x:offset_x + lado] = escalados.transpose(1, 2, 0)
+    X_H = X_H.reshape(alto * ancho, n * n)
+    return np.hstack([X_H, -X_H])
+
+
+@pytest.mark.parametrize("pattern_size, DMD_size", [(4, (12, 8)), (8, (40, 24)), (2, (6, 6))])
+def test_operador_coincide_con_matriz_explicita(pattern_size, DMD_size):
+    operador = HadamardOperator(pattern_size, DMD_size, dtype=np.float64)
+    X = _X_explicita(pattern_size, DMD_size)
+    rng = np.random.default_rng(0)
+    I = rng.integers(0, 256, size=(operador.M, 3)).astype(np.float64)
+    V = rng.standard_normal((2 * operador.N, 3))
+    np.testing.assert_allclose(operador.rmatmat(I), X.T @ I)
+    np.testing.assert_allclose(operador.matmat(V), X @ V, atol=1e-9)
+    np.testing.assert_allclose(operador.rmatvec(I[:, 0]), X.T @ I[:, 0])
+    np.testing.assert_allclose(operador.matvec(V[:, 0]), X @ V[:, 0], atol=1e-9)
+
+
+def test_patron_es_fila_de_X_transpuesta():
+    operador = HadamardOperator(4, (12, 8))
+    X = _X_explicita(4, (12, 8))
+    for i in (0, 5, 16, 31):
+        np.testing.assert_array_equal(operador.patron(i), X[:, i])
+    assert operador.verificar() < 1e-6
+
+
+def test_fwht_equivale_a_producto_por_hadamard():
+    a = np.random.default_rng(1).standard_normal((64, 2))
+    np.testing.assert_allclose(fwht(a), hadamard(64) @ a, atol=1e-9)
+    with pytest.raises(ValueError):
+        fwht(np.ones(12))
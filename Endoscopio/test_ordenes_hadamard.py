@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+from scipy.linalg import hadamard
+from Ordenes_Hadamard import ORDENES, orden_patrones, programa_proyeccion, volteos_programa, retardos_programa
+
+'''
+Propiedades de los órdenes de adquisición y del programa de proyección H1/H2.
+'''
+
+
+@pytest.mark.parametrize("n", [4, 8, 16])
+@pytest.mark.parametrize("orden", ORDENES)
+def test_orden_es_permutacion_con_patron_0_primero(n, orden):
+    permutacion = orden_patrones(n, orden)
+    np.testing.assert_array_equal(np.sort(permutacion), np.arange(n * n))
+    assert permutacion[0] == 0
+
+
+@pytest.mark.parametrize("n", [8, 16])
+def test_prefijos_muñeca_rusa_son_bases_por_bloques(n):
+    '''Cada prefijo de 4^k patrones genera exactamente las imágenes constantes en bloques de (n/2^k)².'''
+    H = hadamard(n * n)
+    permutacion = orden_patrones(n, 'muñeca_rusa')
+    for k in range(int(np.log2(n)) + 1):
+        lado = 2 ** k
+        prefijo = H[:, permutacion[:lado * lado]]
+        assert np.linalg.matrix_rank(prefijo) == lado * lado
+        # Cada patrón del prefijo es constante dentro de cada bloque de (n/lado)²
+        bloques = prefijo.T.reshape(-1, lado, n // lado, lado, n // lado)
+        assert (bloques == bloques[:, :, :1, :, :1]).all()
+
+
+@pytest.mark.parametrize("K", [1, 2, 3, 10, 64])
+def test_programa_intercalado(K):
+    programa = programa_proyeccion(K, intercalar=True)
+    assert programa.shape == (2 * K, 2)
+    # Cada (conjunto, posición) aparece exactamente una vez y los H1 van en orden
+    assert sorted(map(tuple, programa.tolist())) == [(c, p) for c in (0, 1) for p in range(K)]
+    np.testing.assert_array_equal(programa[programa[:, 0] == 0, 1], np.arange(K))
+    # Nunca un patrón seguido de su complemento
+    if K > 1:
+        mismos = programa[1:, 1] == programa[:-1, 1]
+        assert not mismos.any()
+
+
+def test_volteos_sin_complementos():
+    '''Entre patrones ±1 distintos cambian N/2 bloques; el programa intercalado nunca voltea los N.'''
+    n, K = 8, 20
+    patrones = orden_patrones(n, 'muñeca_rusa')[:K]
+    volteos = volteos_programa(programa_proyeccion(K), patrones, n)
+    assert volteos[0] == n * n
+    assert (volteos[1:] == n * n // 2).all()
+
+
+def test_retardos_mantienen_el_retardo_medido():
+    '''El programa no acorta la espera: todos los cuadros esperan el retardo medido de un cambio.'''
+    n, K = 8, 20
+    patrones = orden_patrones(n, 'muñeca_rusa')[:K]
+    volteos = volteos_programa(programa_proyeccion(K), patrones, n)
+    np.testing.assert_array_equal(retardos_programa(volteos, n * n, 0.05), np.full(2 * K, 0.05))
+    # Un retardo para volteos completos solo afecta al primer cuadro (y a complementos seguidos)
+    retardos = retardos_programa(volteos, n * n, 0.05, retardo_completo=0.08)
+    assert retardos[0] == 0.08 and (retardos[1:] == 0.05).all()
@@ -0,0 +1,48 @@
+import pytest
+from Planificador_Memoria import VARIABLE_ENTORNO, presupuesto_memoria, planificar_filas
+
+'''
+Origen del presupuesto de memoria y redondeo del chunk (Planificador_Memoria.py).
+'''
+
+GB = 1024**3
+
+
+def test_presupuesto_explicito_antes_que_entorno(monkeypatch):
+    monkeypatch.setenv(VARIABLE_ENTORNO, '3')
+    assert presupuesto_memoria(1.5) == (int(1.5 * GB), 'configuración')
+    assert presupuesto_memoria() == (3 * GB, VARIABLE_ENTORNO)
+
+
+def test_presupuesto_entorno_invalido(monkeypatch):
+    monkeypatch.setenv(VARIABLE_ENTORNO, 'mucha')
+    with pytest.raises(ValueError, match=VARIABLE_ENTORNO):
+        presupuesto_memoria()
+
+
+def test_presupuesto_memoria_disponible(monkeypatch):
+    monkeypatch.delenv(VARIABLE_ENTORNO, raising=False)
+    presupuesto, origen = presupuesto_memoria(fraccion=0.25)
+    assert presupuesto > 0 and origen.startswith('25% de')
+
+
+def test_chunk_redondeado_a_multiplo():
+    # 1 GB - 24 MB fijos a 1000 B/fila: 1048576 filas → múltiplo de 4096 por debajo
+    filas = planificar_filas('prueba', 10**7, {'buffer': 1000}, {'Gram': 24 * 1024**2}, multiplo=4096,
+                             memoria_gb=1, progreso=False)
+    assert filas == (GB - 24 * 1024**2) // 1000 // 4096 * 4096
+
+
+def test_chunk_matriz_entera_y_minimo():
+    # Si la matriz cabe entera, el chunk es la matriz aunque no sea múltiplo
+    assert planificar_filas('prueba', 5000, {'buffer': 10}, multiplo=4096, memoria_gb=1, progreso=False) == 5000
+    # Presupuesto agotado por los fijos: el mínimo (por defecto, un múltiplo)
+    assert planificar_filas('prueba', 10**6, {'buffer': 10}, {'Gram': 2 * GB}, multiplo=512,
+                            memoria_gb=1, progreso=False) == 512
+    assert planificar_filas('prueba', 100, {'buffer': 10}, {'Gram': 2 * GB}, multiplo=512,
+                            memoria_gb=1, progreso=False) == 100
+
+
+def test_sin_filas():
+    with pytest.raises(ValueError, match='filas_total'):
+        planificar_filas('prueba', 0, {'buffer': 10}, memoria_gb=1, progreso=False)
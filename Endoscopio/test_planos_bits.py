@@ -0,0 +1,81 @@
+import cv2
+import numpy as np
+import pytest
+from scipy.linalg import hadamard
+from Planos_Bits import (hadamard_binary_patterns, embed_binary_patterns, pack_bitplanes, unpack_bitplanes,
+                         pack_hadamard_frames, bitplane_timing)
+
+'''
+Empaquetado de patrones en planos de bits (Planos_Bits.py): cuadros RGB escritos como PNG con
+cv2, leídos y desempaquetados deben devolver exactamente los patrones originales.
+'''
+
+
+def _ida_y_vuelta_png(frame, ruta):
+    '''Escribe el cuadro RGB como PNG con cv2 (BGR en disco) y lo vuelve a leer en RGB.'''
+    assert cv2.imwrite(str(ruta), frame[..., ::-1])
+    return cv2.imread(str(ruta), cv2.IMREAD_COLOR)[..., ::-1]
+
+
+@pytest.mark.parametrize("K", [24, 1, 7, 23])
+def test_planos_aleatorios_sin_perdidas(tmp_path, K):
+    planos = np.random.default_rng(K).random((K, 40, 56)) > 0.5
+    frame = pack_bitplanes(planos)
+    assert frame.shape == (40, 56, 3) and frame.dtype == np.uint8
+    np.testing.assert_array_equal(pack_bitplanes(planos.astype(np.uint8) * 255), frame)  # Planos 0/255
+    leido = _ida_y_vuelta_png(frame, tmp_path / "cuadro.png")
+    np.testing.assert_array_equal(unpack_bitplanes(leido, K), planos)
+    # Los planos que faltan en un cuadro incompleto quedan a cero
+    assert not unpack_bitplanes(leido)[K:].any()
+
+
+@pytest.mark.parametrize("orden_canales", ['GRB', 'RGB', 'BGR'])
+def test_orden_de_canales(orden_canales):
+    planos = np.random.default_rng(0).random((24, 8, 8)) > 0.5
+    frame = pack_bitplanes(planos, orden_canales)
+    np.testing.assert_array_equal(unpack_bitplanes(frame, channel_order=orden_canales), planos)
+    # Planos 0-7 en el primer canal del orden, bit menos significativo primero
+    canal = frame[..., 'RGB'.index(orden_canales[0])]
+    np.testing.assert_array_equal(canal & 1, planos[0])
+    np.testing.assert_array_equal((canal >> 7) & 1, planos[7])
+
+
+def test_patrones_hadamard_coinciden_con_scipy():
+    n = 8
+    columnas = np.array([0, 1, 9, 37, 63])
+    signos = np.array([1, -1, 1, -1, 1])
+    patrones = hadamard_binary_patterns(n, columnas, signos)
+    H = hadamard(n * n)
+    esperado = np.stack([(s * H[:, j]).reshape(n, n) > 0 for j, s in zip(columnas, signos)])
+    np.testing.assert_array_equal(patrones, esperado)
+
+
+def test_cuadros_hadamard_sin_perdidas(tmp_path):
+    '''Secuencia de 2·29 patrones H1/H2 (dos cuadros completos y uno de 10 planos).'''
+    n, DMD_size = 8, (80, 64)
+    columnas = np.repeat(np.arange(29), 2)
+    signos = np.tile([1, -1], 29)
+    H = hadamard(n * n)
+    escala, lado = 8, 64
+    esperado = np.zeros((len(columnas), 64, 80), dtype=bool)
+    cuadrados = np.stack([(s * H[:, j]).reshape(n, n) > 0 for j, s in zip(columnas, signos)])
+    esperado[:, :, 8:8 + lado] = np.repeat(np.repeat(cuadrados, escala, axis=1), escala, axis=2)
+    np.testing.assert_array_equal(embed_binary_patterns(cuadrados, DMD_size), esperado)
+
+    cuadros = list(pack_hadamard_frames(n, columnas, signos, DMD_size))
+    assert len(cuadros) == 3
+    for k, frame in enumerate(cuadros):
+        leido = _ida_y_vuelta_png(frame, tmp_path / f"frame_{k:05}.png")
+        planos = min(24, len(columnas) - 24 * k)
+        np.testing.assert_array_equal(unpack_bitplanes(leido, planos), esperado[24 * k:24 * k + planos])
+
+
+def test_tiempos_por_plano():
+    tiempos = bitplane_timing(fps=60, planes_per_frame=24, dark_time_us=100)
+    assert tiempos['patterns_per_second'] == 1440
+    assert np.isclose(tiempos['exposure_us'], 1e6 / 1440 - 100)
+    assert np.allclose(np.diff(tiempos['trigger_offsets_us']), 1e6 / 1440)
+    with pytest.raises(ValueError):
+        bitplane_timing(fps=60, planes_per_frame=24, camera_max_fps=500)
+    with pytest.raises(ValueError):
+        bitplane_timing(planes_per_frame=25)
@@ -0,0 +1,35 @@
+import os
+import subprocess
+import sys
+import textwrap
+
+'''
+ProductoParalelo en un intérprete nuevo: los hijos se crean con fork, y el proceso de pytest ya
+puede tener activa la capa de hilos de numba por otras pruebas.
+'''
+
+_SCRIPT = textwrap.dedent('''
+    import numpy as np
+    from Operadores_Intensidad import DifferenceMatrix
+    from Producto_Paralelo import ProductoParalelo
+    D = np.random.default_rng(0).integers(-100, 100, size=(5000, 32)).astype(np.int16)
+    operador = DifferenceMatrix(D)
+    C = np.random.default_rng(1).standard_normal((64, 5)).astype(np.float32)
+    esperado = D.astype(np.float32) @ C[:32]
+    with ProductoParalelo(operador, 3, B_maximo=8) as paralelo:
+        assert np.allclose(paralelo.producto(C, progreso=False), esperado, atol=1e-2)
+        # Kernel de numba con el grupo ya creado: correcto
+        assert np.allclose(operador.producto(C[:, :3], progreso=False), esperado[:, :3], atol=1e-2)
+    try:
+        ProductoParalelo(operador, 3)
+    except RuntimeError as error:
+        print('rechazado:', error)
+    else:
+        raise SystemExit('ProductoParalelo aceptó un fork con la capa de hilos activa')
+''')
+
+
+def test_producto_paralelo_y_orden_de_creacion():
+    entorno = dict(os.environ, PYTHONPATH=os.path.dirname(os.path.abspath(__file__)))
+    salida = subprocess.run([sys.executable, '-c', _SCRIPT], capture_output=True, text=True, timeout=120, env=entorno)
+    assert salida.returncode == 0, salida.stdout + salida.stderr
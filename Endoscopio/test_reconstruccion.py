@@ -0,0 +1,97 @@
+import numpy as np
+from scipy.linalg import hadamard as scipy_hadamard
+from Operadores_Hadamard import HadamardOperator
+from Operadores_Intensidad import DifferenceMatrix
+from Ordenes_Hadamard import orden_patrones
+from Reconstruccion import Reconstructor, InversionTikhonov, InversionCompresiva
+
+'''
+Reconstructor con una calibración pequeña en memoria: los generadores y reconstruir pueden
+intercalarse sin compartir lotes a medio llenar, y escala de la inversión compresiva.
+'''
+
+
+def _reconstructor(tamano_lote=3):
+    rng = np.random.default_rng(0)
+    D = rng.integers(-200, 200, size=(8 * 12, 16)).astype(np.int16)
+    return Reconstructor(DifferenceMatrix(D), pattern_size=4, DMD_size=(12, 8), shape_img=(8, 12),
+                         tamano_lote=tamano_lote, memoria_gb=1)
+
+
+def _frames(cantidad, semilla):
+    return np.random.default_rng(semilla).integers(0, 256, size=(cantidad, 8, 12)).astype(np.uint8)
+
+
+def test_generadores_intercalados():
+    rec = _reconstructor()
+    a, b = _frames(7, 1), _frames(5, 2)
+    esperado_a, esperado_b = rec.reconstruir(a, normalizar=False), rec.reconstruir(b, normalizar=False)
+
+    gen_a = rec.reconstruir_varios(iter(a), normalizar=False)
+    gen_b = rec.reconstruir_varios(iter(b), normalizar=False)
+    salida_a, salida_b = [], []
+    for _ in range(4):
+        salida_a.append(next(gen_a))
+        salida_b.append(next(gen_b))
+        # Llamada síncrona con un lote de gen_a a medio llenar
+        np.testing.assert_allclose(rec.reconstruir(a[0], normalizar=False), esperado_a[0], rtol=1e-5)
+    salida_a += list(gen_a)
+    salida_b += list(gen_b)
+    np.testing.assert_allclose(np.stack(salida_a), esperado_a, rtol=1e-5)
+    np.testing.assert_allclose(np.stack(salida_b), esperado_b, rtol=1e-5)
+    assert not rec._I_out_en_uso
+
+
+def test_reconstruir_mientras_se_llena_un_lote():
+    '''El iterable de entrada llama a reconstruir entre dos speckles del mismo lote.'''
+    rec = _reconstructor(tamano_lote=4)
+    a, b = _frames(6, 4), _frames(6, 5)
+    esperado = rec.reconstruir(a, normalizar=False)
+
+    def entrada():
+        for frame_a, frame_b in zip(a, b):
+            yield frame_a
+            rec.reconstruir(frame_b)
+
+    np.testing.assert_allclose(np.stack(list(rec.reconstruir_varios(entrada(), normalizar=False))), esperado, rtol=1e-5)
+
+
+def test_generador_abandonado_libera_buffers():
+    rec = _reconstructor()
+    generador = rec.reconstruir_varios(iter(_frames(5, 3)))
+    next(generador)
+    assert rec._I_out_en_uso
+    generador.close()
+    assert not rec._I_out_en_uso
+
+
+def test_escala_inversion_compresiva():
+    '''
+    D sintético (transmisión identidad): D[:, k] = expandir(H[:, patrones[k]]). Sin TV, con los N
+    patrones en orden natural InversionCompresiva da lo mismo que InversionTikhonov (X·[a'; -a'] =
+    2·objeto); en orden permutado, y con K < N para un objeto en el subespacio medido, también
+    recupera 2·objeto (√N en y, u = 2a').
+    '''
+    n, DMD_size = 4, (12, 8)
+    hadamard = HadamardOperator(n, DMD_size)
+    H = scipy_hadamard(n * n)
+    objeto = np.random.default_rng(6).normal(size=(n * n, 2))
+
+    def inversion(patrones):
+        operador = DifferenceMatrix(hadamard.expandir(H[:, patrones]).astype(np.int16))
+        return operador, InversionCompresiva(operador, hadamard, patrones, iteraciones=0, progreso=False)
+
+    I_out = hadamard.expandir(objeto).astype(np.float32)
+    operador, compresiva = inversion(np.arange(n * n))
+    lineal = InversionTikhonov(operador, hadamard, progreso=False).reconstruir(I_out, 1e-9)
+    np.testing.assert_allclose(lineal, 2 * I_out, rtol=1e-4, atol=1e-4)
+    np.testing.assert_allclose(compresiva.reconstruir(I_out, 1e-9), lineal, rtol=1e-4, atol=1e-4)
+
+    _, compresiva = inversion(orden_patrones(n, 'corte_pastel')[::-1])
+    np.testing.assert_allclose(compresiva.reconstruir(I_out, 1e-9), 2 * I_out, rtol=1e-4, atol=1e-4)
+
+    patrones = orden_patrones(n, 'corte_pastel')[:6][::-1]
+    en_subespacio = H[:, patrones] @ objeto[:6]
+    I_out = hadamard.expandir(en_subespacio).astype(np.float32)
+    _, compresiva = inversion(patrones)
+    np.testing.assert_allclose(compresiva.reconstruir(I_out, 1e-9), 2 * I_out, rtol=1e-4, atol=1e-3)
@@ -0,0 +1,29 @@
+import numpy as np
+from scipy.linalg import hadamard
+from Ordenes_Hadamard import seleccion_patrones
+from Recuperacion_Dispersa import fista_hadamard
+
+'''
+Recuperación TV (Recuperacion_Dispersa.py) de una imagen constante a trozos con el 25 % de sus
+coeficientes Hadamard, en orden 'corte_pastel', frente al llenado con ceros.
+'''
+
+
+def test_tv_recupera_imagen_constante_a_trozos():
+    n = 32
+    N = n * n
+    x = np.zeros((n, n))
+    x[4:20, 6:14] = 1.0
+    x[10:28, 18:30] = 0.6
+    x[22:30, 2:12] = 0.3
+    patrones = seleccion_patrones(n, 0.25, 'corte_pastel')
+    y = (hadamard(N) @ x.ravel() / np.sqrt(N))[patrones]
+
+    def error(iteraciones):
+        recuperada = fista_hadamard(y, patrones, n, iteraciones=iteraciones)
+        assert recuperada.shape == (N, 1)
+        return np.linalg.norm(recuperada[:, 0] - x.ravel()) / np.linalg.norm(x)
+
+    llenado_ceros, tv = error(0), error(100)
+    assert llenado_ceros > 0.1   # Faltan los bordes que miden los patrones de alta secuencia
+    assert tv < 0.2 * llenado_ceros and tv < 0.02
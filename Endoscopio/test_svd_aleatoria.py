@@ -0,0 +1,32 @@
+import numpy as np
+from Operadores_Intensidad import DifferenceMatrix
+from SVD_Aleatoria import svd_aleatoria, energia_capturada
+
+'''
+SVD aleatoria fuera de memoria (SVD_Aleatoria.py) sobre una D pequeña en memoria, con chunks que
+no dividen el número de filas.
+'''
+
+
+def test_svd_aleatoria_rango_bajo_mas_ruido(tmp_path):
+    rng = np.random.default_rng(0)
+    M, n, k = 1003, 48, 5
+    bajo_rango = rng.normal(size=(M, k)) @ np.diag([400, 300, 200, 120, 80]) @ rng.normal(size=(k, n)) / np.sqrt(n)
+    D = np.round(bajo_rango + rng.normal(size=(M, n))).astype(np.int16)
+    D64 = D.astype(np.float64)
+
+    ruta_US = str(tmp_path / "svd_US.npy")
+    US, S, V, energia_total = svd_aleatoria(DifferenceMatrix(D), k, ruta_US, chunk_filas=100, progreso=False)
+    assert US.shape == (M, k) and V.shape == (n, k) and S.shape == (k,)
+    assert not (tmp_path / "svd_US.npy.tmp_B.npy").exists()
+
+    np.testing.assert_allclose(S, np.linalg.svd(D64, compute_uv=False)[:k], rtol=1e-3)
+    np.testing.assert_allclose(energia_total, np.sum(D64 ** 2), rtol=1e-6)
+    U = np.asarray(US, dtype=np.float64) / S  # US = U·Σ
+    np.testing.assert_allclose(U.T @ U, np.eye(k), atol=1e-4)
+    np.testing.assert_allclose(V.T @ V, np.eye(k), atol=1e-5)
+    # Aproximación de rango k: mismo error que la SVD truncada exacta
+    U_exacta, S_exacta, Vt_exacta = np.linalg.svd(D64, full_matrices=False)
+    optimo = np.linalg.norm(D64 - (U_exacta[:, :k] * S_exacta[:k]) @ Vt_exacta[:k])
+    assert np.linalg.norm(D64 - np.asarray(US, dtype=np.float64) @ V.T) < 1.001 * optimo
+    assert 0.99 < energia_capturada(S, energia_total)[-1] < 1
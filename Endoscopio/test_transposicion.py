@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+from Contenedor_Matriz import EscritorContenedor, abrir_matriz, verificar_contenedor
+from Transposicion import transponer, elegir_bloque
+
+'''
+Transposición fuera de memoria (Transposicion.py) con bloques mucho menores que la matriz: bandas
+parciales en ambos ejes y, con salida teselada, escritura por B.escribir_bloque.
+'''
+
+
+def _origen(tmp_path, orden, matriz):
+    ruta = str(tmp_path / f"origen_{orden}.fcm")
+    opciones = {'tesela': (16, 8)} if orden == 'T' else {'chunk': 11}
+    with EscritorContenedor(ruta, matriz.shape, matriz.dtype, orden=orden, parametros={'etapa': 'prueba'},
+                            **opciones) as salida:
+        for inicio in range(0, matriz.shape[0], 11):
+            salida.escribir(inicio, matriz[inicio:inicio + 11])
+    return ruta
+
+
+@pytest.mark.parametrize("orden_origen", ['C', 'T'])
+@pytest.mark.parametrize("orden_salida", ['C', 'T'])
+@pytest.mark.parametrize("memoria_bytes", [3 * 2 * 24 * 24, 1 << 20])
+def test_ida_y_vuelta(tmp_path, orden_origen, orden_salida, memoria_bytes):
+    matriz = np.random.default_rng(1).integers(-1000, 1000, size=(75, 53)).astype(np.int16)
+    origen = _origen(tmp_path, orden_origen, matriz)
+    destino = str(tmp_path / f"destino_{orden_salida}.fcm")
+    estadisticas = transponer(origen, destino, orden=orden_salida, tesela=(8, 24), memoria_bytes=memoria_bytes,
+                              num_hilos=2, progreso=False)
+    assert estadisticas['bytes'] == matriz.nbytes
+    assert verificar_contenedor(destino) == []
+    np.testing.assert_array_equal(np.asarray(abrir_matriz(destino)[:, :]), matriz.T)
+
+
+@pytest.mark.parametrize("shape, alineacion", [((75, 53), (1, 1)), ((8192, 1000), (1, 1)), ((75, 53), (16, 8))])
+def test_elegir_bloque(shape, alineacion):
+    memoria_bytes = 3 * 2 * 600
+    h, w = elegir_bloque(shape, 2, memoria_bytes, alineacion)
+    assert 1 <= h <= shape[0] and 1 <= w <= shape[1]
+    assert h % alineacion[0] == 0 or h == shape[0]
+    assert w % alineacion[1] == 0 or w == shape[1]
+    if alineacion == (1, 1):
+        assert h * w <= 600